@@ -0,0 +1,106 @@
+"""
+Параллельная обработка обновлений: пропускная способность и целостность данных.
+
+Много пользователей одновременно "нажимают кнопки": каждое нажатие - цепочка
+load_configs -> изменение -> save_configs с сетевым ожиданием посередине, как
+в настоящих обработчиках. Сравниваются три варианта обработки:
+по одному обновлению (как было), параллельно без сериализации и
+PerUserUpdateProcessor. В конце проверяется, что у PerUserUpdateProcessor ни одно
+изменение не потеряно и он быстрее обработки по одному хотя бы в --min-speedup
+раз; иначе скрипт завершается с ошибкой.
+
+    python -m benchmarks.bench_concurrent_updates --users 200 --clicks 10
+"""
+import time
+import random
+import asyncio
+import argparse
+from telegram import Update, CallbackQuery, User
+from telegram.ext import SimpleUpdateProcessor
+
+from bot import storage, storage_async
+from bot.storage import DOCUMENTS, DocumentCache
+from bot.update_processor import PerUserUpdateProcessor
+
+class MemoryBackend:
+    def __init__(self):
+        self.docs = {}
+
+    def load(self, user_id, doc):
+        return self.docs.get((user_id, doc), DOCUMENTS[doc]())
+
+    def save(self, user_id, doc, data):
+        self.docs[(user_id, doc)] = data
+
+    def user_ids(self):
+        return sorted({user_id for user_id, _ in self.docs})
+
+def make_update(update_id: int, user_id: int) -> Update:
+    user = User(id=user_id, first_name='user', is_bot=False)
+    return Update(update_id=update_id, callback_query=CallbackQuery(id=str(update_id), from_user=user, chat_instance='bench'))
+
+async def click(user_id: int, latency: float):
+    """Как move_config_callback: прочитать список, дождаться ответа Telegram, сохранить."""
+    configs = await storage_async.load_configs(user_id)
+    if not configs:
+        configs = [{'name': 'Счетчик', 'track_type': 'latest', 'clicks': 0}]
+    configs[0]['clicks'] += 1
+    await asyncio.sleep(random.uniform(0, latency))
+    await storage_async.save_configs(user_id, configs)
+
+async def run(processor, users: int, clicks: int, latency: float):
+    updates = [(u, c) for c in range(clicks) for u in range(1, users + 1)]
+    random.shuffle(updates)
+    started = time.perf_counter()
+    async with processor:
+        tasks = []
+        for update_id, (user_id, _) in enumerate(updates):
+            tasks.append(asyncio.create_task(processor.process_update(make_update(update_id, user_id), click(user_id, latency))))
+            # Обновления приходят по очереди - сохраняем порядок поступления
+            await asyncio.sleep(0)
+        await asyncio.gather(*tasks)
+    total = time.perf_counter() - started
+    lost = sum(clicks - storage.load_configs(u)[0]['clicks'] for u in range(1, users + 1))
+    return total, len(updates) / total, lost
+
+async def run_sequential(users: int, clicks: int, latency: float):
+    updates = [(u, c) for c in range(clicks) for u in range(1, users + 1)]
+    random.shuffle(updates)
+    started = time.perf_counter()
+    for user_id, _ in updates:
+        await click(user_id, latency)
+    total = time.perf_counter() - started
+    lost = sum(clicks - storage.load_configs(u)[0]['clicks'] for u in range(1, users + 1))
+    return total, len(updates) / total, lost
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--clicks', type=int, default=10, help='нажатий на пользователя')
+    parser.add_argument('--latency', type=float, default=0.02, help='максимальная "сетевая" пауза внутри обработчика, сек')
+    parser.add_argument('--concurrency', type=int, default=256)
+    parser.add_argument('--min-speedup', type=float, default=10, help='во сколько раз PerUserUpdateProcessor должен обгонять обработку по одному')
+    args = parser.parse_args()
+
+    variants = [
+        ('по одному (как было)', lambda: run_sequential(args.users, args.clicks, args.latency)),
+        ('параллельно без блокировок', lambda: run(SimpleUpdateProcessor(args.concurrency), args.users, args.clicks, args.latency)),
+        ('PerUserUpdateProcessor', lambda: run(PerUserUpdateProcessor(args.concurrency), args.users, args.clicks, args.latency)),
+    ]
+    print(f'{args.users} пользователей x {args.clicks} нажатий, пауза до {args.latency * 1000:.0f} мс')
+    print(f'{"вариант":<30}{"всего, с":>10}{"обн./с":>10}{"потеряно":>10}')
+    rates = []
+    for title, variant in variants:
+        storage._cache = DocumentCache(MemoryBackend(), size=args.users * 3)
+        total, rate, lost = asyncio.run(variant())
+        rates.append(rate)
+        print(f'{title:<30}{total:>10.2f}{rate:>10.0f}{lost:>10}')
+    # Проверяется последний вариант; "без блокировок" теряет изменения намеренно - для сравнения
+    if lost:
+        raise SystemExit(f'PerUserUpdateProcessor: потеряно изменений - {lost}')
+    if rate < rates[0] * args.min_speedup:
+        raise SystemExit(f'PerUserUpdateProcessor: {rate:.0f} обн./с - меньше чем в {args.min_speedup:g} раз '
+                         f'быстрее обработки по одному ({rates[0]:.0f} обн./с)')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,121 @@
+"""
+Запросы к Bot API в ежедневной проверке за несколько дней подряд.
+
+Пользователи отслеживают конфигурации из общего списка; каждый день у части
+конфигураций выходит новая версия. Проверка запускается целиком
+(daily_version_check) с поддельным ботом, который считает вызовы и, как
+Telegram, отвечает "message is not modified" на правку без изменений.
+Сравниваются три варианта:
+  - как было: каждый день правится меню у каждого пользователя;
+  - по хешу: правка пропускается, если меню показывает ровно то же самое;
+  - только изменения: у всех включен режим дайджеста.
+
+    python -m benchmarks.bench_daily_delivery
+    python -m benchmarks.bench_daily_delivery --users 2000 --days 30 --release-rate 0.01
+"""
+import random
+import asyncio
+import argparse
+from types import SimpleNamespace
+from collections import Counter
+from telegram.error import BadRequest
+
+from bot import handlers, delivery, storage, storage_async, service_1c_async
+from bot.storage import DocumentCache
+from bot.delivery import DeliveryQueue
+from .bench_concurrent_updates import MemoryBackend
+
+class FakeBot:
+    def __init__(self):
+        self.calls = Counter()
+        self._shown = {}
+        self._next_id = 1
+
+    async def edit_message_text(self, chat_id, message_id, text, reply_markup=None, **kwargs):
+        self.calls['editMessageText'] += 1
+        content = (text, reply_markup.to_json() if reply_markup else '')
+        if self._shown.get((chat_id, message_id)) == content:
+            raise BadRequest('Message is not modified: specified new message content and reply markup are exactly the same')
+        self._shown[(chat_id, message_id)] = content
+
+    async def send_message(self, chat_id, text, reply_markup=None, **kwargs):
+        self.calls['sendMessage'] += 1
+        self._next_id += 1
+        self._shown[(chat_id, self._next_id)] = (text, reply_markup.to_json() if reply_markup else '')
+        return SimpleNamespace(message_id=self._next_id)
+
+    async def delete_message(self, chat_id, message_id, **kwargs):
+        self.calls['deleteMessage'] += 1
+
+def make_catalog(configs: list, versions: dict):
+    return {name: {'latest': (f'3.0.{versions[name]}.1', '01.01.2025'), 'dp': None} for name in configs}
+
+async def run_days(users: int, configs: list, days: int, release_rate: float, variant: str, seed: int):
+    rnd = random.Random(seed)
+    storage._cache = DocumentCache(MemoryBackend(), size=users * 3)
+    for user_id in range(1, users + 1):
+        tracked = rnd.sample(configs, rnd.randint(1, 5))
+        storage.save_configs(user_id, [{'name': name, 'track_type': 'latest', 'last_version': '3.0.1.1'}
+                                       for name in tracked])
+        storage.save_bot_state(user_id, {'digest_mode': variant == 'digest'})
+
+    versions = {name: 1 for name in configs}
+    bot = FakeBot()
+    context = SimpleNamespace(bot=bot)
+    delivery._queue = DeliveryQueue(rate=1e9, chat_rate=1e9)
+
+    # Сеть и разбор каталога подменяются: версии берутся из versions
+    async def get_session(): return object(), None
+    async def get_release_catalog(session): return object(), None
+    service_1c_async.get_session = get_session
+    service_1c_async.get_release_catalog = get_release_catalog
+    handlers.service_1c.extract_current_versions = lambda catalog, names: make_catalog(names, versions)
+
+    per_day = []
+    for day in range(days):
+        if variant == 'legacy':
+            # Прежнее поведение: хеша меню нет, правка уходит всегда
+            for user_id in range(1, users + 1):
+                state = await storage_async.load_bot_state(user_id)
+                state.pop('main_menu_hash', None)
+                await storage_async.save_bot_state(user_id, state)
+        if day:
+            for name in configs:
+                if rnd.random() < release_rate:
+                    versions[name] += 1
+        before = sum(bot.calls.values())
+        await handlers.daily_version_check(context)
+        per_day.append(sum(bot.calls.values()) - before)
+    await delivery._queue.stop()
+    return bot.calls, per_day
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--configs', type=int, default=200, help='различных конфигураций')
+    parser.add_argument('--days', type=int, default=14)
+    parser.add_argument('--release-rate', type=float, default=0.02, help='доля конфигураций с новой версией в день')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    configs = [f'Конфигурация {i}' for i in range(args.configs)]
+    original = (service_1c_async.get_session, service_1c_async.get_release_catalog,
+                handlers.service_1c.extract_current_versions)
+    print(f'{args.users} пользователей, {args.configs} конфигураций, {args.days} дней, '
+          f'новых версий в день: {args.release_rate:.0%}')
+    print(f'{"вариант":<20}{"запросов":>10}{"в день":>9}{"после 1-го дня":>16}{"экономия":>10}')
+    baseline = None
+    try:
+        for variant, title in (('legacy', 'как было'), ('hash', 'по хешу'), ('digest', 'только изменения')):
+            calls, per_day = asyncio.run(run_days(args.users, configs, args.days, args.release_rate, variant, args.seed))
+            total = sum(calls.values())
+            # Первый день одинаков для всех: у пользователей еще нет сохраненного меню
+            steady = sum(per_day[1:])
+            baseline = baseline or steady
+            print(f'{title:<20}{total:>10}{total / args.days:>9.0f}{steady:>16}{1 - steady / baseline:>10.1%}')
+    finally:
+        (service_1c_async.get_session, service_1c_async.get_release_catalog,
+         handlers.service_1c.extract_current_versions) = original
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+"""
+Сравнение разбора страниц портала: полный документ через html.parser (как было)
+против разбора только нужной таблицы (SoupStrainer) на каждом доступном бэкенде.
+
+    python -m benchmarks.bench_parsing
+    python -m benchmarks.bench_parsing --total saved/total.html --versions saved/config.html
+"""
+import argparse
+import time
+import tracemalloc
+from bs4 import BeautifulSoup
+
+from bot.parsing import ACTUAL_TABLE, VERSIONS_TABLE
+from bot.catalog import ReleaseCatalog
+from . import pages
+
+def _available_parsers():
+    parsers = ['html.parser']
+    try:
+        import lxml  # noqa: F401
+        parsers.append('lxml')
+    except ImportError:
+        pass
+    return parsers
+
+def _variants(table_id, strainer):
+    def full(parser):
+        return lambda content: BeautifulSoup(content, parser).find('table', id=table_id)
+    def strained(parser):
+        return lambda content: BeautifulSoup(content, parser, parse_only=strainer).find('table', id=table_id)
+
+    variants = [('html.parser (как было)', full('html.parser'))]
+    for parser in _available_parsers():
+        if parser != 'html.parser':
+            variants.append((f'{parser}', full(parser)))
+        variants.append((f'{parser} + SoupStrainer', strained(parser)))
+    return variants
+
+def measure(func, content, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(content)
+        best = min(best, time.perf_counter() - start)
+
+    tracemalloc.start()
+    func(content)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return best, peak
+
+def run(total: bytes, versions: bytes, repeat: int):
+    results = []
+    for page_name, content, table_id, strainer in (
+        ('/total', total, 'actualTable', ACTUAL_TABLE),
+        ('versionsTable', versions, 'versionsTable', VERSIONS_TABLE),
+    ):
+        for label, func in _variants(table_id, strainer):
+            if func(content) is None:
+                raise SystemExit(f'{label}: таблица {table_id} не найдена на странице {page_name}')
+            seconds, peak = measure(func, content, repeat)
+            results.append({'page': page_name, 'variant': label, 'bytes': len(content),
+                            'seconds': seconds, 'peak_bytes': peak})
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--total', help='сохраненная страница /total (по умолчанию - синтетическая)')
+    parser.add_argument('--versions', help='сохраненная страница конфигурации с versionsTable')
+    parser.add_argument('--configs', type=int, default=400, help='строк в синтетической actualTable')
+    parser.add_argument('--rows', type=int, default=300, help='строк в синтетической versionsTable')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    total = open(args.total, 'rb').read() if args.total else pages.total_page(args.configs).encode()
+    versions = open(args.versions, 'rb').read() if args.versions else pages.versions_page(args.rows).encode()
+
+    # Убеждаемся, что урезанный разбор дает тот же каталог, что и полный
+    full_catalog = ReleaseCatalog.from_soup(BeautifulSoup(total, 'html.parser'))
+    for p in _available_parsers():
+        strained = ReleaseCatalog.from_soup(BeautifulSoup(total, p, parse_only=ACTUAL_TABLE))
+        same = [(e.name, e.href, e.versions) for e in strained.entries] == \
+               [(e.name, e.href, e.versions) for e in full_catalog.entries]
+        if not same:
+            raise SystemExit(f'{p} + SoupStrainer: каталог отличается от полного разбора')
+
+    print(f"{'страница':<15}{'вариант':<28}{'размер, КБ':>12}{'время, мс':>12}{'пик памяти, КБ':>16}")
+    for r in run(total, versions, args.repeat):
+        print(f"{r['page']:<15}{r['variant']:<28}{r['bytes'] / 1024:>12.0f}"
+              f"{r['seconds'] * 1000:>12.1f}{r['peak_bytes'] / 1024:>16.0f}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,151 @@
+"""
+Разбор выгрузки арендаторов: прежний parse_registration_text (склейка всех
+сообщений, re.split и регулярки по каждому куску) против RegistrationStream,
+который разбирает сообщения по мере поступления.
+
+Сначала проверяется, что результаты совпадают (фикстура, синтетика и случайные
+тексты, нарезанные на сообщения в случайных местах), затем - что время растет
+линейно с размером выгрузки.
+
+    python -m benchmarks.bench_registration
+    python -m benchmarks.bench_registration --tenants 1000 4000 16000 --fuzz 2000
+"""
+import re
+import random
+import argparse
+import time
+import tracemalloc
+
+from bot.utils import RegistrationStream, clean_whitespace
+from . import fixtures, pages
+
+# Telegram режет длинную вставку на сообщения до 4096 символов
+MESSAGE_SIZE = 4096
+
+def legacy_parse(text):
+    """parse_registration_text до перехода на потоковый разбор."""
+    tenants_data = []
+    chunks = re.split(r'(?=Арендатор:)', text)
+
+    for chunk in chunks:
+        if not chunk.strip(): continue
+
+        tenant_match = re.search(r'Арендатор:\s*(?P<name>.*?)\s+Арендатор ИНН:\s*(?P<inn>\d+)', chunk, re.DOTALL)
+        if not tenant_match: continue
+
+        name = tenant_match.group('name').strip()
+        inn = tenant_match.group('inn').strip()
+
+        nom_matches = re.finditer(r'Номенклатура:\s*(?P<nom>.*?)\s+Регистрационный номер:\s*(?P<reg>\d+)', chunk, re.DOTALL)
+
+        for match in nom_matches:
+            raw_nom = match.group('nom')
+            cleaned_nom = clean_whitespace(raw_nom)
+
+            tenants_data.append({
+                'name': name,
+                'inn': inn,
+                'nom_raw': cleaned_nom,
+                'reg_num': match.group('reg').strip()
+            })
+    return tenants_data
+
+def legacy(messages):
+    return legacy_parse('\n'.join(messages))
+
+def streaming(messages):
+    stream = RegistrationStream()
+    records = []
+    for message in messages:
+        records.extend(stream.feed(message))
+    return records + stream.close()
+
+def split_messages(text, size=MESSAGE_SIZE):
+    return [text[i:i + size] for i in range(0, len(text), size)] or ['']
+
+# --- ПРОВЕРКА РАВЕНСТВА ---
+
+_FUZZ_TOKENS = [
+    'Арендатор:', 'Арендатор ИНН:', 'Номенклатура:', 'Регистрационный номер:', 'Арендатор',
+    ' ', '  ', '\n', '\t', '\n\n', '123', '5400000001', '0', 'ООО "Ромашка"', '1С:Бухгалтерия 8',
+    'ПРОФ', ':', 'А', 'р', 'ИНН', 'номер',
+]
+
+def _noise(rnd, limit=3):
+    return ''.join(rnd.choice(_FUZZ_TOKENS) for _ in range(rnd.randint(0, limit)))
+
+def fuzz_text(rnd):
+    if rnd.random() < 0.3:
+        return _noise(rnd, 60)
+    # Похоже на выгрузку, но с мусором и неровными пробелами между частями
+    ws = lambda: rnd.choice(['', ' ', '\n', ' \n ', '\t'])
+    parts = []
+    for _ in range(rnd.randint(1, 4)):
+        parts.append(f'Арендатор:{ws()}{_noise(rnd)}{ws()}Арендатор ИНН:{ws()}{rnd.choice(["", "77", "5400000001"])}')
+        for _ in range(rnd.randint(0, 3)):
+            parts.append(f'{_noise(rnd, 1)}Номенклатура:{ws()}{_noise(rnd)}{ws()}'
+                         f'Регистрационный номер:{ws()}{rnd.choice(["", "8", "812345678"])}')
+    return ws().join(parts)
+
+def random_split(rnd, text):
+    # Режем где угодно, в том числе посреди меток 'Арендатор:'
+    cuts = sorted(rnd.sample(range(len(text) + 1), min(len(text) + 1, rnd.randint(0, 6))))
+    return [text[a:b] for a, b in zip([0] + cuts, cuts + [len(text)])]
+
+def check_equivalence(fuzz_cases, seed=1):
+    rnd = random.Random(seed)
+    cases = [('fixture', fixtures.load(fixtures.REGISTRATION).decode('utf-8')),
+             ('synthetic', pages.registration_text(300))]
+    checked = 0
+    for label, text in cases:
+        for messages in ([text], split_messages(text, 97), random_split(rnd, text)):
+            # Склейка сообщений через '\n' - так делал обработчик
+            if streaming(messages) != legacy(messages):
+                raise SystemExit(f'{label}: результаты разбора различаются')
+            checked += 1
+    for i in range(fuzz_cases):
+        messages = [fuzz_text(rnd) for _ in range(rnd.randint(1, 4))]
+        if rnd.random() < 0.5:
+            messages = random_split(rnd, '\n'.join(messages))
+        if streaming(messages) != legacy(messages):
+            raise SystemExit(f'случайный текст #{i}: результаты разбора различаются\n{messages!r}')
+        checked += 1
+    return checked
+
+# --- ЗАМЕРЫ ---
+
+def measure(func, messages, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(messages)
+        best = min(best, time.perf_counter() - start)
+
+    tracemalloc.start()
+    func(messages)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return best, peak
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--tenants', type=int, nargs='+', default=[500, 1000, 2000, 4000, 8000, 16000])
+    parser.add_argument('--fuzz', type=int, default=5000, help='случайных текстов для проверки равенства')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    print(f'Проверено совпадение результатов: {check_equivalence(args.fuzz)} вариантов')
+
+    print(f"{'арендаторов':>12}{'размер, КБ':>12}{'вариант':>12}{'время, мс':>12}"
+          f"{'мкс/КБ':>10}{'пик памяти, КБ':>16}")
+    for tenants in args.tenants:
+        text = pages.registration_text(tenants)
+        messages = split_messages(text)
+        kb = len(text) / 1024
+        for label, func in (('прежний', legacy), ('поток', streaming)):
+            seconds, peak = measure(func, messages, args.repeat)
+            print(f'{tenants:>12}{kb:>12.0f}{label:>12}{seconds * 1000:>12.1f}'
+                  f'{seconds * 1e6 / kb:>10.1f}{peak / 1024:>16.0f}')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+"""
+Задержка обработки обновлений при медленном диске у одного пользователя.
+
+Бэкенд хранилища подменяется на хранилище в памяти, которое на операциях одного
+"медленного" пользователя спит --delay секунд. Кэш отключается, так что каждая
+операция идет в бэкенд. Одновременно остальные пользователи читают и сохраняют
+свои документы. Сравниваются прямые вызовы bot.storage из корутин (как было)
+и асинхронный фасад bot.storage_async. Если у storage_async p95 остальных
+пользователей не ниже --max-p95 (и задержки диска), скрипт завершается с ошибкой.
+
+    python -m benchmarks.bench_storage_latency --users 50 --delay 0.2
+    python -m benchmarks.bench_storage_latency --delay 0.4 --max-p95 0.05
+"""
+import time
+import asyncio
+import argparse
+
+from bot import storage, storage_async
+from bot.storage import DOCUMENTS, DocumentCache
+
+SLOW_USER = 1
+# Пауза между обновлениями одного "быстрого" пользователя, сек
+INTERVAL = 0.01
+
+class SlowMemoryBackend:
+    def __init__(self, delay: float):
+        self.delay = delay
+        self.docs = {}
+
+    def _disk(self, user_id):
+        if user_id == SLOW_USER:
+            time.sleep(self.delay)
+
+    def load(self, user_id, doc):
+        self._disk(user_id)
+        return self.docs.get((user_id, doc), DOCUMENTS[doc]())
+
+    def save(self, user_id, doc, data):
+        self._disk(user_id)
+        self.docs[(user_id, doc)] = data
+
+    def user_ids(self):
+        return sorted({user_id for user_id, _ in self.docs})
+
+async def slow_user(api, rounds):
+    for i in range(rounds):
+        await asyncio.sleep(INTERVAL)
+        state = await api.load_bot_state(SLOW_USER)
+        state['counter'] = i
+        await api.save_bot_state(SLOW_USER, state)
+
+async def fast_user(api, user_id, rounds, latencies):
+    for i in range(rounds):
+        # Обновление "приходит" через INTERVAL; задержка считается от момента прихода,
+        # так что в нее попадает и время, пока event loop был занят чужой операцией
+        arrived = time.perf_counter() + INTERVAL
+        await asyncio.sleep(INTERVAL)
+        state = await api.load_bot_state(user_id)
+        state['counter'] = i
+        await api.save_bot_state(user_id, state)
+        latencies.append(time.perf_counter() - arrived)
+
+class SyncApi:
+    """Прямые синхронные вызовы из корутин - так обработчики работали раньше."""
+    async def load_bot_state(self, user_id): return storage.load_bot_state(user_id)
+    async def save_bot_state(self, user_id, data): storage.save_bot_state(user_id, data)
+
+async def run(api, users, rounds):
+    latencies = []
+    started = time.perf_counter()
+    await asyncio.gather(
+        slow_user(api, rounds),
+        *(fast_user(api, user_id, rounds, latencies) for user_id in range(2, users + 2))
+    )
+    total = time.perf_counter() - started
+    latencies.sort()
+    return total, latencies[len(latencies) // 2], latencies[int(len(latencies) * 0.95)], latencies[-1]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=50, help='число "быстрых" пользователей')
+    parser.add_argument('--rounds', type=int, default=5)
+    parser.add_argument('--delay', type=float, default=0.2, help='задержка диска медленного пользователя, сек')
+    parser.add_argument('--max-p95', type=float, default=0.05, help='допустимый p95 остальных пользователей у storage_async, сек')
+    args = parser.parse_args()
+    limit = min(args.max_p95, args.delay)
+
+    print(f'{args.users} пользователей, {args.rounds} операций, задержка диска {args.delay} с у одного пользователя')
+    print(f'{"вариант":<26}{"всего, с":>10}{"p50, мс":>10}{"p95, мс":>10}{"max, мс":>10}')
+    for title, api in (('storage (синхронно)', SyncApi()), ('storage_async', storage_async)):
+        # Кэш на один документ с записью насквозь - каждая операция идет в бэкенд
+        storage._cache = DocumentCache(SlowMemoryBackend(args.delay), size=1, write_through=True)
+        total, p50, p95, worst = asyncio.run(run(api, args.users, args.rounds))
+        print(f'{title:<26}{total:>10.2f}{p50 * 1000:>10.1f}{p95 * 1000:>10.1f}{worst * 1000:>10.1f}')
+    # Проверяется последний вариант: медленный диск одного пользователя не должен задерживать остальных
+    if p95 >= limit:
+        raise SystemExit(f'storage_async: p95 {p95 * 1000:.1f} мс не ниже {limit * 1000:.0f} мс - '
+                         f'операции с диском снова задерживают остальных пользователей')
+
+if __name__ == '__main__':
+    main()
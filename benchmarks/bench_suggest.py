@@ -0,0 +1,72 @@
+"""
+Подсказки для неизвестной номенклатуры: построение индекса триграмм и время
+поиска на словарях замен разного размера. Качество: доля правильных подсказок
+для искаженных строк (другой регистр и пробелы, опечатка, без артикула) и доля
+совпадений с полным перебором всех ключей по тому же коэффициенту Дайса.
+
+    python -m benchmarks.bench_suggest
+    python -m benchmarks.bench_suggest --sizes 1000 50000 --queries 2000
+"""
+import random
+import argparse
+import time
+
+from bot.suggest import NgramIndex, ngrams
+from . import pages
+
+def distort(rnd, key):
+    kind = rnd.randrange(3)
+    if kind == 0:
+        return '  ' + key.upper().replace(' ', '\n', 1)
+    if kind == 1:
+        pos = rnd.randrange(3, len(key))
+        return key[:pos] + rnd.choice('абвгде') + key[pos + 1:]
+    return key.rsplit(' (', 1)[0]
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q))]
+
+def best_score(index, query):
+    """Лучшее сходство полным перебором - эталон для индекса."""
+    grams = ngrams(query)
+    return max(2 * len(grams & other) / (len(grams) + len(other)) for other in index._grams.values())
+
+def run(size, queries, exact, seed=1):
+    keys = pages.nomenclature_variants(size, seed)
+    start = time.perf_counter()
+    index = NgramIndex(keys)
+    build = time.perf_counter() - start
+
+    rnd = random.Random(seed)
+    timings, correct, found, agree = [], 0, 0, 0
+    for n, key in enumerate(rnd.sample(keys, min(queries, len(keys)))):
+        query = distort(rnd, key)
+        start = time.perf_counter()
+        result = index.search(query)
+        timings.append(time.perf_counter() - start)
+        if result:
+            found += 1
+            # Без артикула подходят все строки, отличающиеся только им - засчитываем любую такую
+            correct += result[0][1] == key or result[0][1].rsplit(' (', 1)[0] == key.rsplit(' (', 1)[0]
+        if n < exact:
+            agree += bool(result) and abs(result[0][0] - best_score(index, query)) < 1e-9
+    return {'size': size, 'build': build, 'p50': percentile(timings, 0.5), 'p99': percentile(timings, 0.99),
+            'found': found / len(timings), 'correct': correct / len(timings),
+            'exact': agree / min(exact, len(timings))}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100, 1000, 10000, 50000])
+    parser.add_argument('--queries', type=int, default=1000)
+    parser.add_argument('--exact', type=int, default=200, help='сколько запросов сверять с полным перебором')
+    args = parser.parse_args()
+
+    print(f"{'ключей':>8}{'индекс, мс':>12}{'поиск p50, мкс':>16}{'p99, мкс':>10}{'найдено':>10}{'верно':>8}{'как перебор':>13}")
+    for size in args.sizes:
+        r = run(size, args.queries, args.exact)
+        print(f"{r['size']:>8}{r['build'] * 1000:>12.0f}{r['p50'] * 1e6:>16.0f}{r['p99'] * 1e6:>10.0f}"
+              f"{r['found']:>10.0%}{r['correct']:>8.0%}{r['exact']:>13.0%}")
+
+if __name__ == '__main__':
+    main()
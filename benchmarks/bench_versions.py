@@ -0,0 +1,130 @@
+"""
+Сравнение прежнего version_tuple (re.sub + split на каждый вызов) с Version
+и кэшем parse_version на полной таблице versionsTable: разбор всех строк
+версий, выбор самой новой, сортировка и построение таблицы расстояний
+(прежде - по строкам, теперь - по графу с ключами Version).
+
+    python -m benchmarks.bench_versions
+    python -m benchmarks.bench_versions --page saved/config_all_updates.html
+"""
+import re
+import argparse
+import time
+import tracemalloc
+from collections import deque
+from bs4 import BeautifulSoup
+
+from bot import utils
+from bot.utils import parse_version, latest_version
+from bot.update_graph import DistanceTable, UpdateGraph, parse_versions_table
+from . import pages
+
+def legacy_version_tuple(v):
+    """version_tuple до перехода на Version."""
+    try:
+        clean_v = re.sub(r'[^\d.]', '', str(v))
+        return tuple(map(int, clean_v.split('.')))
+    except ValueError:
+        return (0,)
+
+def legacy_newer(a, b):
+    return legacy_version_tuple(a) > legacy_version_tuple(b)
+
+def legacy_distance_table(target, predecessors):
+    """Обратный BFS DistanceTable до перехода на Version: граф по строкам."""
+    table = {target: (0, None)}
+    queue = deque([target])
+    while queue:
+        curr = queue.popleft()
+        steps = table[curr][0] + 1
+        for prev in predecessors.get(curr, ()):
+            known = table.get(prev)
+            if known is None:
+                table[prev] = (steps, curr)
+                queue.append(prev)
+            elif known[0] == steps and legacy_newer(curr, known[1]):
+                table[prev] = (steps, curr)
+    return table
+
+def measure(func, repeat, number=20):
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for _ in range(number):
+            func()
+        best = min(best, (time.perf_counter() - started) / number)
+    return best
+
+def cold(func):
+    # Каждый вызов - с пустым кэшем, как при первом обращении к странице
+    def run():
+        utils._VERSION_CACHE.clear()
+        return func()
+    return run
+
+def check(versions):
+    for v in versions:
+        if parse_version(v).parts != legacy_version_tuple(v):
+            raise SystemExit(f'{v}: Version {parse_version(v).parts} != {legacy_version_tuple(v)}')
+    if sorted(versions, key=parse_version) != sorted(versions, key=legacy_version_tuple):
+        raise SystemExit('порядок версий отличается')
+    # Нераспознанные строки раньше молча становились версией (0,)
+    for bad in ('', 'н/д', '3.0..1', '3.0.1.'):
+        if parse_version(bad) is not None:
+            raise SystemExit(f'{bad!r} разобрана как версия')
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--page', help='сохраненная страница конфигурации с versionsTable')
+    parser.add_argument('--rows', type=int, default=1500, help='строк в синтетической versionsTable')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    content = open(args.page, 'rb').read() if args.page else pages.versions_page(args.rows).encode()
+    rows = parse_versions_table(BeautifulSoup(content, 'html.parser'))
+    if not rows:
+        raise SystemExit('На странице нет versionsTable')
+    # Все строки версий в порядке таблицы, как они приходят в расчет (с повторами)
+    texts = [v for to_version, from_versions, _ in rows for v in [to_version, *from_versions] if v]
+    unique = list(dict.fromkeys(texts))
+    check(unique)
+
+    graph = UpdateGraph('bench', rows)
+    target = max(graph.predecessors)
+    legacy_predecessors = {to_version: from_versions for to_version, from_versions, _ in rows}
+    # Таблицы по строкам и по Version должны совпадать
+    legacy_table = legacy_distance_table(str(target), legacy_predecessors)
+    table = DistanceTable(target, graph.predecessors).table
+    if {str(k): (n, str(v) if v else None) for k, (n, v) in table.items()} != \
+            {k: v for k, v in legacy_table.items() if parse_version(k) is not None}:
+        raise SystemExit('таблицы расстояний различаются')
+
+    cases = [
+        ('разбор всех строк', lambda: [legacy_version_tuple(v) for v in texts],
+         cold(lambda: [parse_version(v) for v in texts]), lambda: [parse_version(v) for v in texts]),
+        ('самая новая', lambda: max(texts, key=legacy_version_tuple),
+         cold(lambda: latest_version(texts)), lambda: latest_version(texts)),
+        ('сортировка', lambda: sorted(unique, key=legacy_version_tuple),
+         cold(lambda: sorted(unique, key=parse_version)), lambda: sorted(unique, key=parse_version)),
+    ]
+    # Граф по Version строится один раз при загрузке, дальше BFS идет без разбора строк
+    cases.append(('таблица расстояний', lambda: legacy_distance_table(str(target), legacy_predecessors),
+                  cold(lambda: UpdateGraph('bench', rows).distance_table(str(target))),
+                  lambda: DistanceTable(target, graph.predecessors)))
+
+    print(f'Строк versionsTable: {len(rows)}, строк версий: {len(texts)}, различных: {len(unique)}')
+    print(f"{'операция':<22}{'version_tuple, мс':>19}{'Version, мс':>13}{'из кэша, мс':>13}{'ускорение':>11}")
+    for label, legacy, first, warm in cases:
+        t_legacy, t_first, t_warm = (measure(f, args.repeat) for f in (legacy, first, warm))
+        print(f'{label:<22}{t_legacy * 1000:>19.2f}{t_first * 1000:>13.2f}{t_warm * 1000:>13.2f}'
+              f'{t_legacy / t_warm:>10.1f}x')
+
+    utils._VERSION_CACHE.clear()
+    tracemalloc.start()
+    cached = [parse_version(v) for v in unique]
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f'Кэш версий: {len(cached)} записей, {size / len(cached):.0f} байт на версию')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,46 @@
+"""
+Страницы releases.1c.ru и текст регистрации, на которых гоняется benchmarks.run.
+
+Файлы лежат в benchmarks/fixtures и повторяют разметку портала: /total
+(actualTable), страница конфигурации со ссылкой "все обновления" и страница
+?allUpdates=true (versionsTable). Их можно заменить страницами, сохраненными
+с портала (под теми же именами), - замеры станут ближе к реальности.
+Пересоздать синтетические файлы:
+
+    python -m benchmarks.fixtures
+"""
+from pathlib import Path
+
+from . import pages
+
+FIXTURES_DIR = Path(__file__).resolve().parent / 'fixtures'
+
+TOTAL = 'total.html'
+CONFIG = 'config.html'
+ALL_UPDATES = 'config_all_updates.html'
+REGISTRATION = 'registration.txt'
+
+# Сколько конфигураций в /total и версий в истории у синтетических файлов
+TOTAL_CONFIGS = 150
+HISTORY_VERSIONS = 300
+
+def path(name: str) -> Path:
+    return FIXTURES_DIR / name
+
+def load(name: str) -> bytes:
+    return path(name).read_bytes()
+
+def generate():
+    FIXTURES_DIR.mkdir(exist_ok=True)
+    files = {
+        TOTAL: pages.total_page(TOTAL_CONFIGS, versions=HISTORY_VERSIONS),
+        CONFIG: pages.versions_page(HISTORY_VERSIONS, all_updates_link=True, shown=40),
+        ALL_UPDATES: pages.versions_page(HISTORY_VERSIONS),
+        REGISTRATION: pages.registration_text(20),
+    }
+    for name, content in files.items():
+        path(name).write_text(content, encoding='utf-8')
+        print(f'{path(name)}: {len(content.encode()) // 1024} КБ')
+
+if __name__ == '__main__':
+    generate()
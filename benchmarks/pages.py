@@ -0,0 +1,117 @@
+"""
+Генераторы страниц, повторяющих разметку releases.1c.ru (таблицы actualTable и
+versionsTable), и текстов для помощника регистрации. Нужны, чтобы гонять замеры
+на любых размерах без доступа к порталу.
+"""
+import random
+
+# Меню, скрипты и прочее окружение настоящей страницы, которое парсеру приходится пропускать
+_PAGE_CHROME = (
+    '<head><title>1С:Обновление программ</title>'
+    + ''.join(f'<script src="/static/js/chunk{i}.js"></script>' for i in range(20))
+    + '</head><body><div id="header"><ul class="menu">'
+    + ''.join(f'<li><a href="/section/{i}">Раздел {i}</a></li>' for i in range(60))
+    + '</ul></div>'
+)
+_PAGE_FOOTER = '<div id="footer">' + '<p>© ООО «1С-Софт»</p>' * 30 + '</div></body>'
+
+DP_SUP = '<sup><abbr title="Длительная поддержка">ДП</abbr></sup>'
+
+def config_name(i: int) -> str:
+    return f'Бухгалтерия предприятия {i}, редакция 3.0'
+
+def config_href(i: int) -> str:
+    return f'/project/Config{i}'
+
+def total_page(configs: int = 400, seed: int = 1, versions: int = 300) -> str:
+    """
+    Страница /total с таблицей actualTable на заданное число конфигураций.
+    Версии в строках берутся из version_chain(versions), так что они совпадают
+    с историей на versions_page(versions).
+    """
+    rnd = random.Random(seed)
+    chain = version_chain(versions)
+    last_dp = (versions - 1) // 10 * 10
+    rows = ['<tr><th>Конфигурация</th><th>Версия</th><th>Дата</th></tr>']
+    for i in range(configs):
+        # Самая новая, иногда еще одна свежая и последняя версия на ДП
+        picks = [(chain[-1], False)]
+        if rnd.random() < 0.5 and versions > 2:
+            picks.append((chain[-2], False))
+        if last_dp < versions - 2:
+            picks.append((chain[last_dp], True))
+        links, dates = [], []
+        for v, is_dp in picks:
+            dp = DP_SUP if is_dp else ''
+            links.append(f'<a href="/version_files?nick=Config{i}&amp;ver={v}">{v}</a>{dp}<br/>')
+            dates.append(f'{rnd.randint(1, 28):02d}.{rnd.randint(1, 12):02d}.25<br/>')
+        rows.append(
+            f'<tr><td class="nameColumn"><a href="{config_href(i)}">{config_name(i)}</a></td>'
+            f'<td class="versionColumn">{"".join(links)}</td><td class="dateColumn">{"".join(dates)}</td></tr>'
+        )
+    return f'<html>{_PAGE_CHROME}<table id="actualTable">{"".join(rows)}</table>{_PAGE_FOOTER}</html>'
+
+def version_chain(versions: int = 300) -> list:
+    """Версии конфигурации от самой старой к самой новой."""
+    return [f'3.0.{100 + n // 40}.{n % 40 + 1}' for n in range(versions)]
+
+def versions_page(versions: int = 300, seed: int = 1, all_updates_link: bool = False, shown: int = None) -> str:
+    """
+    Страница конфигурации с таблицей versionsTable. Каждая версия обновляется
+    с нескольких предыдущих, каждая десятая помечена как ДП. shown - сколько
+    последних версий выводить (как на странице со ссылкой "все обновления").
+    """
+    rnd = random.Random(seed)
+    chain = version_chain(versions)
+    rows = ['<tr><th>Версия</th><th>Дата</th><th>Обновление версий</th></tr>']
+    oldest = max(0, versions - shown) if shown else 0
+    for n in range(versions - 1, oldest - 1, -1):
+        froms = chain[max(0, n - rnd.randint(1, 4)):n]
+        dp = ' <small>ДП</small>' if n % 10 == 0 else ''
+        rows.append(
+            f'<tr><td><a href="/version_files?ver={chain[n]}">{chain[n]}</a></td>'
+            f'<td>{rnd.randint(1, 28):02d}.03.24{dp}</td><td>{", ".join(froms)}</td></tr>'
+        )
+    link = '<a href="?allUpdates=true">Все обновления</a>' if all_updates_link else ''
+    return f'<html>{_PAGE_CHROME}{link}<table id="versionsTable">{"".join(rows)}</table>{_PAGE_FOOTER}</html>'
+
+NOMENCLATURES = [
+    '1С:Бухгалтерия 8 ПРОФ',
+    '1С:Зарплата и управление персоналом 8 ПРОФ',
+    '1С:Управление торговлей 8 ПРОФ',
+    '1С:Бухгалтерия 8 КОРП. Дополнительная лицензия на 5 пользователей',
+    '1С:Комплексная автоматизация 8',
+]
+
+_PRODUCTS = ['Бухгалтерия', 'Зарплата и управление персоналом', 'Управление торговлей', 'Комплексная автоматизация',
+             'ERP Управление предприятием', 'Документооборот', 'Розница', 'Управление нашей фирмой', 'Бухгалтерия государственного учреждения']
+_EDITIONS = ['', ' ПРОФ', ' КОРП', ' Базовая']
+_LICENSES = ['', '. Электронная поставка', '. Клиентская лицензия', '. Дополнительная лицензия', '. Лицензия на сервер']
+
+def nomenclature_variants(count: int, seed: int = 1) -> list:
+    """Различные строки номенклатуры в духе выгрузок поставщиков (ключи словаря замен)."""
+    rnd = random.Random(seed)
+    result, seen = [], set()
+    while len(result) < count:
+        name = f'1С:{rnd.choice(_PRODUCTS)} 8{rnd.choice(_EDITIONS)}{rnd.choice(_LICENSES)}'
+        if rnd.random() < 0.7:
+            name += f' на {rnd.choice([1, 5, 10, 20, 50, 100, 300, 500])} пользователей'
+        name += f' ({rnd.randint(4601546000000, 4601546999999)})'
+        if name not in seen:
+            seen.add(name)
+            result.append(name)
+    return result
+
+def registration_text(tenants: int = 20, per_tenant: int = 3, seed: int = 1) -> str:
+    """Выгрузка для помощника регистрации: блоки "Арендатор: ..." с номенклатурой."""
+    rnd = random.Random(seed)
+    blocks = []
+    for i in range(tenants):
+        lines = [f'Арендатор: ООО "Ромашка {i}"', f'Арендатор ИНН: {5400000000 + i}']
+        for _ in range(per_tenant):
+            # Как в реальных выгрузках: номенклатура бывает разбита переносом строки
+            nom = rnd.choice(NOMENCLATURES).replace(' 8 ', '\n8 ', rnd.random() < 0.3)
+            lines.append(f'Номенклатура: {nom}')
+            lines.append(f'Регистрационный номер: {rnd.randint(800000000, 899999999)}')
+        blocks.append('\n'.join(lines))
+    return '\n\n'.join(blocks)
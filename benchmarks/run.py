@@ -0,0 +1,301 @@
+"""
+Набор замеров горячих путей бота: время и пик памяти, результат - в JSON.
+
+    python -m benchmarks.run                        # все замеры
+    python -m benchmarks.run --only storage --storage-users 1000,10000
+    python -m benchmarks.run --compare benchmarks/results/abc1234.json
+
+Страницы портала берутся из benchmarks/fixtures (см. benchmarks.fixtures) и из
+синтетических генераторов большего размера; сеть не используется. Результаты
+пишутся в benchmarks/results/<коммит>.json (или в --output); с --compare
+печатается изменение относительно прошлого прогона.
+"""
+import gc
+import sys
+import json
+import time
+import random
+import shutil
+import platform
+import argparse
+import tempfile
+import subprocess
+import tracemalloc
+from pathlib import Path
+from datetime import datetime
+
+from bot import service_1c, storage, render
+from bot.config import RELEASES_CACHE_TTL
+from bot.catalog import ReleaseCatalog
+from bot.parsing import make_soup, get_parser, ACTUAL_TABLE
+from bot.update_graph import GraphStore
+from bot.utils import parse_registration_text, parse_version, latest_version, escape_markdown
+from . import fixtures, pages
+
+RESULTS_DIR = Path(__file__).resolve().parent / 'results'
+
+# --- ИЗМЕРЕНИЕ ---
+
+def measure(func, repeat: int = 5, number: int = 1) -> dict:
+    """Лучшее время одного вызова из repeat серий по number вызовов и пик памяти одного вызова."""
+    func()  # прогрев: ленивые импорты, кэши регулярных выражений
+    best = float('inf')
+    for _ in range(repeat):
+        gc.collect()
+        started = time.perf_counter()
+        for _ in range(number):
+            func()
+        best = min(best, (time.perf_counter() - started) / number)
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {'seconds': best, 'peak_bytes': peak}
+
+# --- ПОДМЕНА ПОРТАЛА ---
+
+class FixtureResponse:
+    def __init__(self, url: str, content: bytes):
+        self.url = url
+        self.content = content
+        self.status_code = 200
+        self.headers = {}
+
+    def raise_for_status(self):
+        pass
+
+class FixtureSession:
+    """Вместо requests.Session: отдает сохраненные страницы по адресу запроса."""
+
+    def __init__(self, total: bytes, config: bytes, all_updates: bytes):
+        self.total = total
+        self.config = config
+        self.all_updates = all_updates
+
+    def get(self, url, **kwargs):
+        if url == service_1c.RELEASES_TOTAL_URL:
+            return FixtureResponse(url, self.total)
+        if 'allUpdates=true' in url:
+            return FixtureResponse(url, self.all_updates)
+        return FixtureResponse(url, self.config)
+
+def reset_releases_cache():
+    service_1c._releases_snapshot = service_1c.ReleasesSnapshot(RELEASES_CACHE_TTL)
+
+def tracked_configs(count: int) -> list:
+    track_types = ('latest', 'dp', 'both')
+    return [{'name': pages.config_name(i), 'track_type': track_types[i % 3]} for i in range(count)]
+
+# --- ЗАМЕРЫ ---
+
+CASES = {}
+
+def case(name):
+    def register(func):
+        CASES[name] = func
+        return func
+    return register
+
+@case('parse_versions')
+def bench_parse_versions(args):
+    sources = [('fixture', fixtures.load(fixtures.TOTAL))]
+    sources += [(f'synthetic-{n}', pages.total_page(n).encode()) for n in args.total_sizes]
+    for source, content in sources:
+        soup = make_soup(content, ACTUAL_TABLE)
+        configs = tracked_configs(20)
+        yield {'source': source, 'bytes': len(content), 'configs': len(configs)}, \
+            measure(lambda: service_1c.parse_versions_from_soup(soup, [dict(c) for c in configs]), args.repeat)
+
+@case('get_target_versions')
+def bench_get_target_versions(args):
+    session = FixtureSession(fixtures.load(fixtures.TOTAL), b'', b'')
+    name = pages.config_name(fixtures.TOTAL_CONFIGS // 2)
+
+    def cold():
+        reset_releases_cache()
+        return service_1c.get_target_versions(session, name)
+
+    yield {'cache': 'cold'}, measure(cold, args.repeat)
+    reset_releases_cache()
+    yield {'cache': 'warm'}, measure(lambda: service_1c.get_target_versions(session, name), args.repeat, number=1000)
+
+@case('find_update_path')
+def bench_find_update_path(args):
+    session = FixtureSession(
+        fixtures.load(fixtures.TOTAL), fixtures.load(fixtures.CONFIG), fixtures.load(fixtures.ALL_UPDATES)
+    )
+    name = pages.config_name(0)
+    chain = pages.version_chain(fixtures.HISTORY_VERSIONS)
+    reset_releases_cache()
+    # Цели - как у обработчика: версии на ДП и не на ДП из строки каталога
+    targets, error = service_1c.get_target_versions(session, name)
+    if error:
+        raise RuntimeError(f'find_update_path: нет целевых версий: {error}')
+    graph_dir = Path(tempfile.mkdtemp(prefix='bench-graphs-'))
+    try:
+        def find(start):
+            return service_1c.find_update_path(session, name, start, targets['dp'], targets['non_dp'])
+
+        def cold():
+            # Пустой кэш графов: скачать обе страницы, разобрать историю, построить путь
+            shutil.rmtree(graph_dir, ignore_errors=True)
+            service_1c._graph_store = GraphStore(graph_dir)
+            return find(chain[0])
+
+        # Замер пути ошибки ничего не говорит - убеждаемся, что путь находится
+        if 'необходимо выполнить' not in cold():
+            raise RuntimeError('find_update_path: путь обновления не найден')
+        reset_releases_cache()
+        yield {'graph': 'cold', 'history': len(chain)}, measure(cold, args.repeat)
+        starts = [random.Random(i).choice(chain[:-1]) for i in range(100)]
+        cycle = iter(starts * 1000)
+        yield {'graph': 'warm', 'history': len(chain)}, \
+            measure(lambda: find(next(cycle)), args.repeat, number=100)
+    finally:
+        shutil.rmtree(graph_dir, ignore_errors=True)
+
+@case('parse_registration_text')
+def bench_parse_registration(args):
+    sources = [('fixture', fixtures.load(fixtures.REGISTRATION).decode('utf-8'))]
+    sources += [(f'synthetic-{n}', pages.registration_text(n)) for n in args.tenants]
+    for source, text in sources:
+        yield {'source': source, 'chars': len(text)}, measure(lambda: parse_registration_text(text), args.repeat)
+
+@case('utils')
+def bench_utils(args):
+    versions = pages.version_chain(1000)
+    texts = [pages.config_name(i) + f' ({v})' for i, v in enumerate(versions)]
+    yield {'func': 'parse_version', 'calls': len(versions)}, \
+        measure(lambda: [parse_version(v) for v in versions], args.repeat)
+    yield {'func': 'latest_version', 'calls': 1}, \
+        measure(lambda: latest_version(versions), args.repeat)
+    yield {'func': 'escape_markdown', 'calls': len(texts)}, \
+        measure(lambda: [escape_markdown(t) for t in texts], args.repeat)
+
+@case('render_versions')
+def bench_render_versions(args):
+    catalog = ReleaseCatalog.from_soup(make_soup(pages.total_page(400).encode(), ACTUAL_TABLE))
+    rnd = random.Random(1)
+    # Пользователи отслеживают по 10 конфигураций из 40 популярных - блоки повторяются
+    popular = tracked_configs(40)
+    users = [rnd.sample(popular, 10) for _ in range(args.render_users)]
+    current = service_1c.extract_current_versions(catalog, (c['name'] for c in popular))
+    # Версии уже сохранены - как при открытии меню и ежедневной проверке без изменений
+    _, saved = service_1c.render_versions(current, popular)
+    saved = {c['name']: c for c in saved}
+    users = [[dict(saved[c['name']]) for c in configs] for configs in users]
+
+    def render_all():
+        for configs in users:
+            service_1c.render_versions(current, configs)
+
+    cached = {name: getattr(render, name) for name in ('version_line', 'config_block', 'not_found_block')}
+    # Без кэша: те же функции render, но каждый фрагмент собирается заново
+    for name, func in cached.items():
+        setattr(render, name, func.__wrapped__)
+    try:
+        yield {'users': len(users), 'cache': 'off'}, measure(render_all, args.repeat)
+    finally:
+        for name, func in cached.items():
+            setattr(render, name, func)
+    yield {'users': len(users), 'cache': 'on'}, measure(render_all, args.repeat)
+
+def _storage_backend(kind: str, directory: Path):
+    if kind == 'sqlite':
+        return storage.SqliteBackend(directory / 'bot.sqlite3')
+    return storage.JsonBackend(directory / 'user_data')
+
+@case('storage')
+def bench_storage(args):
+    configs = tracked_configs(5)
+    state = {'main_menu_message_id': 12345, 'extra_message_ids': []}
+    for users in args.storage_users:
+        for kind in args.storage_backends:
+            directory = Path(tempfile.mkdtemp(prefix=f'bench-storage-{kind}-'))
+            try:
+                backend = _storage_backend(kind, directory)
+                started = time.perf_counter()
+                for user_id in range(1, users + 1):
+                    backend.save(user_id, 'configs', configs)
+                    backend.save(user_id, 'state', state)
+                populate = time.perf_counter() - started
+
+                sample = random.Random(users).sample(range(1, users + 1), min(1000, users))
+                params = {'backend': kind, 'users': users}
+                yield {**params, 'op': 'populate'}, {'seconds': populate / users, 'peak_bytes': None}
+                # load и save - время на пачку из len(sample) разных пользователей
+                yield {**params, 'op': 'load', 'ops': len(sample)}, measure(
+                    lambda: [backend.load(u, 'configs') for u in sample], args.repeat)
+                yield {**params, 'op': 'save', 'ops': len(sample)}, measure(
+                    lambda: [backend.save(u, 'state', {**state, 'main_menu_message_id': i}) for i, u in enumerate(sample)],
+                    args.repeat)
+                yield {**params, 'op': 'list_user_ids'}, measure(backend.user_ids, args.repeat)
+            finally:
+                shutil.rmtree(directory, ignore_errors=True)
+
+# --- ЗАПУСК ---
+
+def _commit() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=Path(__file__).resolve().parent).stdout.strip() or 'unknown'
+    except OSError:
+        return 'unknown'
+
+def _key(result) -> tuple:
+    return (result['case'], json.dumps(result['params'], sort_keys=True))
+
+def _ints(value: str) -> list:
+    return [int(v) for v in value.split(',') if v]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--only', help='через запятую: ' + ', '.join(CASES))
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--total-sizes', type=_ints, default=[400, 2000], help='строк в синтетических /total')
+    parser.add_argument('--tenants', type=_ints, default=[500], help='арендаторов в синтетических текстах')
+    parser.add_argument('--storage-users', type=_ints, default=[1000, 10000, 100000])
+    parser.add_argument('--render-users', type=int, default=1000, help='пользователей при сборке списков версий')
+    parser.add_argument('--storage-backends', default='json,sqlite')
+    parser.add_argument('--output', help='файл результатов (по умолчанию benchmarks/results/<коммит>.json)')
+    parser.add_argument('--compare', help='JSON прошлого прогона для сравнения')
+    args = parser.parse_args()
+    args.storage_backends = args.storage_backends.split(',')
+
+    selected = args.only.split(',') if args.only else list(CASES)
+    commit = _commit()
+    results = []
+    for name in selected:
+        for params, metrics in CASES[name](args):
+            result = {'case': name, 'params': params, **metrics}
+            results.append(result)
+            peak = f"{metrics['peak_bytes'] / 1024:>10.0f} КБ" if metrics['peak_bytes'] is not None else ''
+            print(f"{name:<24}{json.dumps(params, ensure_ascii=False):<60}{metrics['seconds'] * 1000:>12.3f} мс{peak}")
+            sys.stdout.flush()
+
+    report = {
+        'commit': commit,
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'html_parser': get_parser(),
+        'results': results,
+    }
+    output = Path(args.output) if args.output else RESULTS_DIR / f'{commit}.json'
+    output.parent.mkdir(exist_ok=True, parents=True)
+    output.write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding='utf-8')
+    print(f'Результаты: {output}')
+
+    if args.compare:
+        baseline = json.loads(Path(args.compare).read_text(encoding='utf-8'))
+        old = {_key(r): r for r in baseline['results']}
+        print(f"\nСравнение с {baseline['commit']} (время, + медленнее / - быстрее):")
+        for result in results:
+            before = old.get(_key(result))
+            if not before or not before['seconds']:
+                continue
+            change = (result['seconds'] / before['seconds'] - 1) * 100
+            print(f"{result['case']:<24}{json.dumps(result['params'], ensure_ascii=False):<60}{change:>+10.1f} %")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+import re
+from .utils import normalize_text
+
+# Разница в длине названий, при которой конфигурация с сайта еще считается "той самой"
+# (например, пользователь ввел название без редакции в конце).
+FUZZY_LENGTH_DIFF = 5
+
+DP_TITLE_RE = re.compile('Длительная')
+
+class CatalogEntry:
+    """Одна строка таблицы actualTable: название, ссылка на страницу конфигурации и версии."""
+    __slots__ = ('name', 'norm_name', 'href', 'versions')
+
+    def __init__(self, name, href, versions):
+        self.name = name
+        self.norm_name = normalize_text(name)
+        self.href = href
+        # Список {'ver', 'date', 'is_dp'} в порядке таблицы (первая - самая новая)
+        # или None, если в строке нет ячейки с версиями.
+        self.versions = versions
+
+def _parse_row_versions(row):
+    ver_cell = row.find('td', class_='versionColumn')
+    if not ver_cell:
+        return None
+    date_cell = ver_cell.find_next_sibling('td')
+    all_a = ver_cell.find_all('a')
+    all_dates = list(date_cell.stripped_strings) if date_cell else []
+
+    if not all_a:
+        v_text = ver_cell.get_text(strip=True)
+        d_text = date_cell.get_text(strip=True) if date_cell else ''
+        return [{'ver': v_text, 'date': d_text, 'is_dp': False}]
+
+    versions = []
+    for idx, a_tag in enumerate(all_a):
+        v_text = a_tag.get_text(strip=True)
+        d_text = all_dates[idx] if idx < len(all_dates) else "н/д"
+
+        is_dp = False
+        nxt = a_tag.find_next_sibling()
+        if nxt and nxt.name == 'sup' and nxt.find('abbr', title=DP_TITLE_RE):
+            is_dp = True
+
+        versions.append({'ver': v_text, 'date': d_text, 'is_dp': is_dp})
+    return versions
+
+class ReleaseCatalog:
+    """
+    Индекс по таблице actualTable, который строится один раз на снимок /total.
+    Точное совпадение ищется по словарю, а нечеткое правило "название сайта содержит
+    введенное и длиннее не более чем на 4 символа" - по заранее построенному словарю
+    всех подходящих подстрок.
+    """
+
+    def __init__(self, entries):
+        self.entries = entries
+        self._exact = {}
+        for entry in entries:
+            # Как и раньше, при дублях побеждает последняя строка таблицы
+            self._exact[entry.norm_name] = entry
+
+        self._fuzzy = {}
+        for key in self._exact:
+            for length in range(max(0, len(key) - FUZZY_LENGTH_DIFF + 1), len(key) + 1):
+                for start in range(len(key) - length + 1):
+                    self._fuzzy.setdefault(key[start:start + length], key)
+
+    @classmethod
+    def from_soup(cls, soup):
+        table = soup.find('table', id='actualTable')
+        if not table:
+            return None
+        entries = []
+        for row in table.find_all('tr'):
+            name_cell = row.find('td', class_='nameColumn')
+            if not name_cell:
+                continue
+            link = name_cell.find('a', href=True)
+            entries.append(CatalogEntry(
+                name_cell.get_text(separator=' ', strip=True),
+                link['href'] if link else None,
+                _parse_row_versions(row)
+            ))
+        return cls(entries)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def lookup(self, config_name: str):
+        """Ищет конфигурацию по названию пользователя: сначала точно, затем нечетко."""
+        norm_name = normalize_text(config_name)
+        entry = self._exact.get(norm_name)
+        if entry is None:
+            key = self._fuzzy.get(norm_name)
+            if key is not None:
+                entry = self._exact[key]
+        return entry
+
+    def search(self, config_name: str):
+        """Первая конфигурация, в названии которой встречается строка (без учета регистра)."""
+        needle = config_name.lower()
+        return next((e for e in self.entries if needle in e.name.lower()), None)
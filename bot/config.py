@@ -18,11 +18,18 @@ LOG_DIR = os.path.join(BASE_PATH, 'logs')
 os.makedirs(LOG_DIR, exist_ok=True)
 
 USER_DATA_DIR = Path(BASE_PATH) / 'data' / 'user_data'
+# Куки авторизованной сессии портала 1С (чтобы после рестарта не логиниться заново)
+SESSION_FILE = Path(BASE_PATH) / 'data' / 'session_1c.json'
+# Кэш истории обновлений конфигураций (versionsTable), по файлу на конфигурацию
+GRAPH_CACHE_DIR = Path(BASE_PATH) / 'data' / 'update_graphs'
+# База пользовательских данных для STORAGE_BACKEND = 'sqlite'
+STORAGE_DB_FILE = Path(BASE_PATH) / 'data' / 'bot.sqlite3'
 
 # --- КОНСТАНТЫ СОСТОЯНИЙ ---
 # Добавлено GET_CONFIG_TYPE
 GET_CONFIG_NAME, GET_CONFIG_TYPE, SELECT_CONFIG, GET_MANUAL_CONFIG, GET_CURRENT_VERSION = range(5)
 GET_REG_TEXT = 5
+GET_BATCH_TEXT = 6
 
 # --- ЛОГИРОВАНИЕ ---
 def setup_logging():
@@ -62,7 +69,29 @@ def load_settings():
             'ADMIN_USER_ID': 0,
             'TIMEZONE': 'Asia/Novosibirsk',
             'SCHEDULE_HOUR': 9,
-            'SCHEDULE_MINUTE': 0
+            'SCHEDULE_MINUTE': 0,
+            'RELEASES_CACHE_TTL': 300,
+            'HTML_PARSER': 'auto',
+            'HTTP_TIMEOUT': 60,
+            'HTTP_CONCURRENCY': 8,
+            'BROADCAST_RATE': 25,
+            'BROADCAST_CHAT_RATE': 1,
+            'BROADCAST_WORKERS': 8,
+            'STORAGE_BACKEND': 'json',
+            'STORAGE_CACHE_SIZE': 1000,
+            'STORAGE_FLUSH_INTERVAL': 5,
+            'STORAGE_IO_WORKERS': 4,
+            'UPDATE_CONCURRENCY': 256,
+            'UPDATE_MODE': 'polling',
+            'WEBHOOK_LISTEN': '0.0.0.0',
+            'WEBHOOK_PORT': 8443,
+            'WEBHOOK_PATH': 'telegram',
+            'WEBHOOK_URL': '',
+            'WEBHOOK_SECRET': '',
+            'LOGIN_BASE_URL': 'https://login.1c.ru',
+            'RELEASES_BASE_URL': 'https://releases.1c.ru',
+            'METRICS_LISTEN': '127.0.0.1',
+            'METRICS_PORT': 0
         }
         with open(SETTINGS_FILE, 'w', encoding='utf-8') as f:
             json.dump(default_settings, f, ensure_ascii=False, indent=4)
@@ -76,4 +105,39 @@ PASSWORD_1C = settings.get('PASSWORD_1C')
 ADMIN_USER_ID = int(settings.get('ADMIN_USER_ID', 0))
 TIMEZONE = settings.get('TIMEZONE', 'Asia/Novosibirsk')
 SCHEDULE_HOUR = settings.get('SCHEDULE_HOUR', 9)
-SCHEDULE_MINUTE = settings.get('SCHEDULE_MINUTE', 0)
\ No newline at end of file
+SCHEDULE_MINUTE = settings.get('SCHEDULE_MINUTE', 0)
+# Сколько секунд разобранная страница releases.1c.ru/total считается свежей
+RELEASES_CACHE_TTL = settings.get('RELEASES_CACHE_TTL', 300)
+# Бэкенд BeautifulSoup: 'auto' (lxml, если установлен), 'lxml' или 'html.parser'
+HTML_PARSER = settings.get('HTML_PARSER', 'auto')
+# Запросы к порталу 1С: таймаут одного запроса (сек) и сколько запросов одновременно
+HTTP_TIMEOUT = settings.get('HTTP_TIMEOUT', 60)
+HTTP_CONCURRENCY = settings.get('HTTP_CONCURRENCY', 8)
+# Рассылка ежедневной проверки: сообщений в секунду всего и в один чат, число параллельных отправок
+BROADCAST_RATE = settings.get('BROADCAST_RATE', 25)
+BROADCAST_CHAT_RATE = settings.get('BROADCAST_CHAT_RATE', 1)
+BROADCAST_WORKERS = settings.get('BROADCAST_WORKERS', 8)
+# Где хранятся данные пользователей: 'json' (файлы в data/user_data) или 'sqlite' (data/bot.sqlite3)
+STORAGE_BACKEND = settings.get('STORAGE_BACKEND', 'json')
+# Кэш документов пользователей: сколько держать в памяти и как часто (сек) сбрасывать изменения на диск
+STORAGE_CACHE_SIZE = settings.get('STORAGE_CACHE_SIZE', 1000)
+STORAGE_FLUSH_INTERVAL = settings.get('STORAGE_FLUSH_INTERVAL', 5)
+# Потоков для файловых операций хранилища (чтобы диск не тормозил event loop)
+STORAGE_IO_WORKERS = settings.get('STORAGE_IO_WORKERS', 4)
+# Сколько обновлений (разных пользователей) обрабатывается одновременно
+UPDATE_CONCURRENCY = settings.get('UPDATE_CONCURRENCY', 256)
+# Получение обновлений: 'polling' или 'webhook' (встроенный HTTP-сервер, обычно за reverse proxy).
+# WEBHOOK_URL - внешний адрес, по которому Telegram достучится до сервера (без пути),
+# WEBHOOK_SECRET - секрет, который Telegram присылает в заголовке каждого запроса (обязателен для webhook)
+UPDATE_MODE = settings.get('UPDATE_MODE', 'polling')
+WEBHOOK_LISTEN = settings.get('WEBHOOK_LISTEN', '0.0.0.0')
+WEBHOOK_PORT = int(settings.get('WEBHOOK_PORT', 8443))
+WEBHOOK_PATH = settings.get('WEBHOOK_PATH', 'telegram')
+WEBHOOK_URL = settings.get('WEBHOOK_URL', '')
+WEBHOOK_SECRET = settings.get('WEBHOOK_SECRET', '')
+# Адреса портала 1С. Для отладки без сети можно указать локальный tools/fake_portal.py
+LOGIN_BASE_URL = settings.get('LOGIN_BASE_URL', 'https://login.1c.ru').rstrip('/')
+RELEASES_BASE_URL = settings.get('RELEASES_BASE_URL', 'https://releases.1c.ru').rstrip('/')
+# HTTP-эндпоинт метрик в формате Prometheus (/metrics). Порт 0 - эндпоинт выключен
+METRICS_LISTEN = settings.get('METRICS_LISTEN', '127.0.0.1')
+METRICS_PORT = int(settings.get('METRICS_PORT', 0))
@@ -0,0 +1,180 @@
+import time
+import asyncio
+import logging
+import datetime
+from collections import deque
+from telegram.error import RetryAfter, Forbidden
+
+from telegram.request import HTTPXRequest
+
+from .config import BROADCAST_RATE, BROADCAST_CHAT_RATE, BROADCAST_WORKERS
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+MAX_RETRIES = 3
+# Корзин отдельных чатов больше этого числа не держим - простаивающие полны и не нужны
+MAX_CHAT_BUCKETS = 10000
+
+DELIVERY_LATENCY = metrics.histogram('delivery_latency_seconds', 'Рассылка: от постановки в очередь до отправки', buckets=(0.1, 0.5, 1, 5, 15, 30, 60, 120, 300, 600, 1800))
+DELIVERY_RESULTS = metrics.counter('delivery_messages_total', 'Сообщения рассылки по результату', ['result'])
+TELEGRAM_API = metrics.histogram('telegram_api_seconds', 'Запросы к Bot API', ['method'])
+
+class TokenBucket:
+    """Ограничитель скорости: rate токенов в секунду, не больше capacity в запасе."""
+
+    def __init__(self, rate: float, capacity: float = None):
+        self.rate = rate
+        self.capacity = capacity or max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+def _retry_seconds(error: RetryAfter) -> float:
+    retry_after = error.retry_after
+    if isinstance(retry_after, datetime.timedelta):
+        return retry_after.total_seconds()
+    return float(retry_after)
+
+class _Job:
+    __slots__ = ('chat_id', 'factory', 'submitted')
+
+    def __init__(self, chat_id, factory):
+        self.chat_id = chat_id
+        self.factory = factory
+        self.submitted = time.monotonic()
+
+class DeliveryQueue:
+    """
+    Очередь исходящих сообщений для рассылок. Отправки идут параллельно несколькими
+    воркерами, но не быстрее общего лимита Telegram и лимита на один чат. Ответ
+    RetryAfter (429) приостанавливает всю очередь на указанное время, после чего
+    отправка повторяется. Forbidden (бот заблокирован пользователем) считается
+    отдельно от доставленных и от ошибок.
+    """
+
+    def __init__(self, rate: float = BROADCAST_RATE, chat_rate: float = BROADCAST_CHAT_RATE, workers: int = BROADCAST_WORKERS):
+        self.chat_rate = chat_rate
+        self.workers = workers
+        self._global_bucket = TokenBucket(rate)
+        self._chat_buckets = {}
+        self._queue = asyncio.Queue()
+        self._tasks = []
+        self._resume_at = 0.0
+        self.delivered = 0
+        self.failed = 0
+        self.blocked = 0
+        self.retries = 0
+        self._latencies = deque(maxlen=1000)
+
+    def start(self):
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def submit(self, chat_id: int, factory):
+        """factory - функция без аргументов, возвращающая корутину отправки."""
+        self.start()
+        self._queue.put_nowait(_Job(chat_id, factory))
+
+    async def join(self):
+        await self._queue.join()
+
+    def _chat_bucket(self, chat_id):
+        bucket = self._chat_buckets.get(chat_id)
+        if bucket is None:
+            if len(self._chat_buckets) >= MAX_CHAT_BUCKETS:
+                self._chat_buckets.clear()
+            bucket = self._chat_buckets[chat_id] = TokenBucket(self.chat_rate, 1)
+        return bucket
+
+    async def _worker(self):
+        while True:
+            job = await self._queue.get()
+            try:
+                await self._deliver(job)
+            finally:
+                self._queue.task_done()
+
+    async def _deliver(self, job: _Job):
+        for attempt in range(MAX_RETRIES + 1):
+            await self._chat_bucket(job.chat_id).acquire()
+            pause = self._resume_at - time.monotonic()
+            if pause > 0:
+                await asyncio.sleep(pause)
+            await self._global_bucket.acquire()
+            try:
+                await job.factory()
+            except RetryAfter as e:
+                delay = _retry_seconds(e)
+                self._resume_at = max(self._resume_at, time.monotonic() + delay)
+                self.retries += 1
+                DELIVERY_RESULTS.inc(result='retry')
+                logger.warning(f'Telegram просит подождать {delay} с (чат {job.chat_id}, попытка {attempt + 1})')
+                continue
+            except Forbidden:
+                self.blocked += 1
+                DELIVERY_RESULTS.inc(result='blocked')
+                logger.warning(f'Пользователь {job.chat_id} заблокировал бота. Пропускаем.')
+                return
+            except Exception as e:
+                self.failed += 1
+                DELIVERY_RESULTS.inc(result='failed')
+                logger.error(f'Ошибка отправки в чат {job.chat_id}: {e}')
+                return
+            self.delivered += 1
+            DELIVERY_RESULTS.inc(result='delivered')
+            self._latencies.append(time.monotonic() - job.submitted)
+            DELIVERY_LATENCY.observe(self._latencies[-1])
+            return
+        self.failed += 1
+        DELIVERY_RESULTS.inc(result='failed')
+        logger.error(f'Сообщение в чат {job.chat_id} не отправлено после {MAX_RETRIES} повторов')
+
+    def stats(self) -> dict:
+        """Глубина очереди, счетчики и задержка доставки (от постановки до отправки) в секундах."""
+        latencies = sorted(self._latencies)
+        def percentile(p):
+            return latencies[min(len(latencies) - 1, int(len(latencies) * p))] if latencies else None
+        return {
+            'depth': self._queue.qsize(), 'delivered': self.delivered, 'failed': self.failed,
+            'blocked': self.blocked, 'retries': self.retries, 'latency_p50': percentile(0.5), 'latency_p95': percentile(0.95),
+        }
+
+_queue = None
+
+metrics.gauge('delivery_queue_depth', 'Сообщений рассылки в очереди', function=lambda: _queue.stats()['depth'] if _queue else 0)
+
+class InstrumentedRequest(HTTPXRequest):
+    """HTTPXRequest, замеряющий время каждого запроса к Bot API (метка - метод API)."""
+
+    async def do_request(self, url, method, *args, **kwargs):
+        with TELEGRAM_API.time(method=url.rsplit('/', 1)[-1]):
+            return await super().do_request(url, method, *args, **kwargs)
+
+def get_queue() -> DeliveryQueue:
+    """Общая очередь рассылок процесса."""
+    global _queue
+    if _queue is None:
+        _queue = DeliveryQueue()
+    return _queue
+
+async def shutdown():
+    if _queue is not None:
+        await _queue.stop()
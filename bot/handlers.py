@@ -1,50 +1,114 @@
+import time
 import asyncio
+import csv
+import io
 import html
 import logging
 import hashlib
+import tempfile
+from functools import partial
 from telegram import Update, InlineKeyboardMarkup, InlineKeyboardButton
 from telegram.ext import ContextTypes, ConversationHandler
-from telegram.error import BadRequest, Forbidden
+from telegram.error import BadRequest, Forbidden, RetryAfter
 from .config import *
 from .storage import *
 from .utils import *
 from .keyboards import *
-from . import service_1c
+from . import service_1c, service_1c_async, delivery, storage_async, metrics, suggest, render
+from .update_processor import update_lock
 
 logger = logging.getLogger(__name__)
 
+# Пакетный расчет: до скольких строк отвечаем таблицей в сообщении, дальше - файлом
+BATCH_INLINE_LIMIT = 30
+BATCH_NAME_WIDTH = 28
+# Регистрация: до скольких записей отвечаем сообщениями, дальше - одним файлом
+REG_INLINE_LIMIT = 40
+# Файл собирается в памяти и уходит на диск, только если перерос этот размер
+REG_SPOOL_SIZE = 1024 * 1024
+
+DAILY_CHECK = metrics.histogram('daily_check_seconds', 'Этапы ежедневной проверки', ['stage'], buckets=(1, 5, 15, 30, 60, 120, 300, 600, 1800, 3600))
+DAILY_USERS = metrics.gauge('daily_check_users', 'Пользователей в последней ежедневной проверке')
+DAILY_CONFIGS = metrics.gauge('daily_check_configs', 'Различных конфигураций в последней ежедневной проверке')
+DAILY_LAST_SUCCESS = metrics.gauge('daily_check_last_success_timestamp', 'Время последней завершенной ежедневной проверки (unix)')
+DAILY_SKIPPED = metrics.counter('daily_check_skipped_total', 'Пользователи без сообщения в ежедневной проверке (режим "только изменения")')
+MENU_UPDATES = metrics.counter('menu_updates_total', 'Обновления главного сообщения: edited, sent, unchanged (пропущено), not_modified', ['result'])
+
 # --- ВСПОМОГАТЕЛЬНЫЕ ФУНКЦИИ ---
 
+def _menu_hash(msg_id, text, reply_markup) -> str:
+    markup = reply_markup.to_json() if reply_markup else ''
+    return f"{msg_id}:{hashlib.md5((text + markup).encode('utf-8')).hexdigest()}"
+
 async def send_or_edit_message(context, chat_id, text, reply_markup=None):
-    bot_state = load_bot_state(chat_id)
+    # Состояние читаем без блокировки: запрос к Telegram может ждать долго, а записываем
+    # потом только свои поля (хеш содержит id сообщения, так что чужая правка его не обманет)
+    bot_state = await storage_async.load_bot_state(chat_id)
     msg_id = bot_state.get('main_menu_message_id')
+    # Сообщение уже показывает ровно это - не тратим запрос (хеш сбрасывается при любом
+    # действии пользователя, см. forget_menu_hash, так что прямые правки меню не мешают)
+    if msg_id and bot_state.get('main_menu_hash') == _menu_hash(msg_id, text, reply_markup):
+        MENU_UPDATES.inc(result='unchanged')
+        return
     try:
         if not msg_id: raise ValueError
         await context.bot.edit_message_text(chat_id=chat_id, message_id=msg_id, text=text, parse_mode='MarkdownV2', reply_markup=reply_markup)
+        MENU_UPDATES.inc(result='edited')
+    except (RetryAfter, Forbidden):
+        # Под ограничением частоты новое сообщение только добавит запросов, а заблокировавшему
+        # бота его не отправить - пусть вызывающий код (очередь рассылки) подождет или пропустит
+        raise
+    except BadRequest as e:
+        if 'not modified' not in str(e).lower():
+            return await _resend_menu(context, chat_id, bot_state, text, reply_markup)
+        # Telegram не меняет сообщение с тем же содержимым - это не ошибка
+        MENU_UPDATES.inc(result='not_modified')
     except Exception:
-        if msg_id:
-            try: await context.bot.delete_message(chat_id=chat_id, message_id=msg_id)
-            except: pass
-        sent = await context.bot.send_message(chat_id=chat_id, text=text, parse_mode='MarkdownV2', reply_markup=reply_markup)
-        bot_state['main_menu_message_id'] = sent.message_id
-        save_bot_state(chat_id, bot_state)
+        return await _resend_menu(context, chat_id, bot_state, text, reply_markup)
+    await storage_async.update_bot_state(chat_id, main_menu_hash=_menu_hash(msg_id, text, reply_markup))
+
+async def _resend_menu(context, chat_id, bot_state, text, reply_markup):
+    msg_id = bot_state.get('main_menu_message_id')
+    if msg_id:
+        try: await context.bot.delete_message(chat_id=chat_id, message_id=msg_id)
+        except: pass
+    sent = await context.bot.send_message(chat_id=chat_id, text=text, parse_mode='MarkdownV2', reply_markup=reply_markup)
+    MENU_UPDATES.inc(result='sent')
+    await storage_async.update_bot_state(chat_id, main_menu_message_id=sent.message_id,
+                                         main_menu_hash=_menu_hash(sent.message_id, text, reply_markup))
+
+async def forget_menu_hash(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """
+    Любое действие пользователя может поменять меню в обход send_or_edit_message
+    (query.edit_message_text и т.п.), поэтому запомненный хеш больше не верен.
+    """
+    if not update.effective_user: return
+    user_id = update.effective_user.id
+    # Обычно хеша нет - тогда и блокировка не нужна
+    if 'main_menu_hash' not in await storage_async.load_bot_state(user_id): return
+    async with storage_async.user_lock(user_id):
+        state = await storage_async.load_bot_state(user_id)
+        if state.pop('main_menu_hash', None) is not None:
+            await storage_async.save_bot_state(user_id, state)
 
 async def delete_extra_messages(context, user_id):
-    state = load_bot_state(user_id)
-    for mid in state.get('extra_message_ids', []):
+    deleted = (await storage_async.load_bot_state(user_id)).get('extra_message_ids', [])
+    for mid in deleted:
         try: await context.bot.delete_message(chat_id=user_id, message_id=mid)
         except: pass
-    state['extra_message_ids'] = []
-    save_bot_state(user_id, state)
-
-def format_version_list_from_storage(user_id: int):
-    configs = load_configs(user_id)
+    # Пока удаляли, могли добавиться новые сообщения - их оставляем
+    async with storage_async.user_lock(user_id):
+        state = await storage_async.load_bot_state(user_id)
+        state['extra_message_ids'] = [mid for mid in state.get('extra_message_ids', []) if mid not in deleted]
+        await storage_async.save_bot_state(user_id, state)
+
+async def format_version_list_from_storage(user_id: int):
+    configs = await storage_async.load_configs(user_id)
     if not configs:
         return ('Конфигурации для отслеживания не найдены\\.', configs)
     results_text = []
     for config_obj in configs:
         config_name = config_obj.get('name', 'Неизвестная конфигурация')
-        safe_config_name = escape_markdown(config_name)
         last_version = config_obj.get('last_version')
         last_date = config_obj.get('last_date')
         track_type = config_obj.get('track_type', 'latest')
@@ -68,16 +132,15 @@ def format_version_list_from_storage(user_id: int):
                 v_dp = ver_parts[1] if len(ver_parts) > 1 else "Нет"
                 d_dp = date_parts[1] if len(date_parts) > 1 else "-"
                 
-                display_lines.append(f"🔥 `{escape_markdown(v_new)}` • `{escape_markdown(d_new)}` {status_mark}")
-                display_lines.append(f"🛡 `{escape_markdown(v_dp)}` • `{escape_markdown(d_dp)}` {status_mark}")
+                display_lines.append(render.version_line(render.ICON_LATEST, v_new, d_new, status_mark))
+                display_lines.append(render.version_line(render.ICON_DP, v_dp, d_dp, status_mark))
             else:
                 # Обычный режим
-                icon = "🛡" if track_type == 'dp' else "🔥"
-                display_lines.append(f"{icon} `{escape_markdown(last_version)}` • `{escape_markdown(last_date)}` {status_mark}")
+                icon = render.ICON_DP if track_type == 'dp' else render.ICON_LATEST
+                display_lines.append(render.version_line(icon, last_version, last_date, status_mark))
 
-        # Заголовок БЕЗ иконок
-        block_text = f'*{safe_config_name}*\n' + '\n'.join(display_lines)
-        results_text.append(block_text)
+        # Заголовок БЕЗ иконок; блок целиком берется из кэша render
+        results_text.append(render.config_block(config_name, tuple(display_lines)))
         
     return ('\n\n'.join(results_text), configs)
 
@@ -96,49 +159,91 @@ async def main_menu_callback(update: Update, context: ContextTypes.DEFAULT_TYPE)
     
     await delete_extra_messages(context, user_id)
     
-    configs = load_configs(user_id)
+    configs = await storage_async.load_configs(user_id)
     if not configs:
         header = escape_markdown('👋 *Добро пожаловать!*\n\nЯ бот для отслеживания версий 1С. Ваш список пока пуст. Добавьте конфигурации через меню "Управление списком".\n\n')
     else:
         header = escape_markdown('📋 *Последние известные данные:*\n\n')
     
-    result_text, configs = format_version_list_from_storage(user_id)
+    result_text, configs = await format_version_list_from_storage(user_id)
     full_text = header + result_text
-    await send_or_edit_message(context, user_id, full_text, get_main_keyboard(user_id, configs))
+    await send_or_edit_message(context, user_id, full_text, await get_main_keyboard(user_id, configs))
 
 async def daily_version_check(context: ContextTypes.DEFAULT_TYPE):
     logger.info('ЗАПУСК ежедневной проверки...')
-    if not USER_DATA_DIR.exists():
+    user_ids = await storage_async.list_user_ids()
+    if not user_ids:
         return
 
-    session, error = await asyncio.to_thread(service_1c.login_to_1c)
-    if error or not session:
-        logger.error(f"Ежедневная проверка пропущена: {error}")
-        return
-
-    soup, soup_error = await asyncio.to_thread(service_1c.get_releases_soup, session)
-    if soup_error or not soup:
+    with DAILY_CHECK.time(stage='fetch'):
+        session, error = await service_1c_async.get_session()
+        if error or not session:
+            logger.error(f"Ежедневная проверка пропущена: {error}")
+            return
+        catalog, soup_error = await service_1c_async.get_release_catalog(session)
+    if soup_error or not catalog:
         logger.error(f"Ежедневная проверка пропущена (ошибка получения таблицы): {soup_error}")
         return
-
-    user_ids = [int(p.name) for p in USER_DATA_DIR.iterdir() if p.is_dir() and p.name.isdigit()]
-    
+    logger.info(f"Кэш страницы релизов: {service_1c_async.releases_cache_stats()}")
+
+    # Конфигурации каждого пользователя читаются один раз - под его блокировкой, сразу
+    # для сверки и отрисовки. Актуальные версии считаются один раз на каждое различное
+    # название, сколько бы пользователей ни отслеживали конфигурацию: current пополняется
+    # только новыми названиями. Сами сообщения уходят через очередь рассылки с учетом
+    # лимитов Telegram.
+    header = escape_markdown('🗓️ *Ежедневная проверка:*\n\n')
+    queue = delivery.get_queue()
+    current = {}
+    collect_seconds = 0.0
+    render_started = time.perf_counter()
     for user_id in user_ids:
         try:
-            user_configs = load_configs(user_id)
-            if not user_configs: continue
-            
-            result_text, updated_configs = service_1c.parse_versions_from_soup(soup, user_configs)
-            save_configs(user_id, updated_configs)
+            # Пользователь может в это же время нажимать кнопки - не теряем его изменения.
+            # Его обработчики держат блокировку только на чтение-изменение-запись, так что
+            # долгий расчет у пользователя проверку не задерживает
+            async with storage_async.user_lock(user_id):
+                user_configs = await storage_async.load_configs(user_id)
+                if not user_configs: continue
+
+                new_names = {c['name'] for c in user_configs} - current.keys()
+                if new_names:
+                    started = time.perf_counter()
+                    current.update(service_1c.extract_current_versions(catalog, new_names))
+                    collect_seconds += time.perf_counter() - started
+
+                # render_versions меняет словари конфигураций на месте - запоминаем версии до сверки
+                previous = [c.get('last_version') for c in user_configs]
+                result_text, updated_configs = service_1c.render_versions(current, user_configs)
+                await storage_async.save_configs(user_id, updated_configs)
+                digest_mode = (await storage_async.load_bot_state(user_id)).get('digest_mode', False)
+
+            # Режим "только изменения": пишем, только если у отслеживаемых конфигураций сменилась версия
+            if digest_mode and previous == [c.get('last_version') for c in updated_configs]:
+                DAILY_SKIPPED.inc()
+                continue
             
-            full_text = escape_markdown('🗓️ *Ежедневная проверка:*\n\n') + result_text
-            await send_or_edit_message(context, user_id, full_text, get_main_keyboard(user_id, updated_configs))
+            full_text = header + result_text
+            queue.submit(user_id, partial(_deliver_daily, context, user_id, full_text, await get_main_keyboard(user_id, updated_configs)))
             
-        except Forbidden:
-            logger.warning(f'Пользователь {user_id} заблокировал бота. Пропускаем.')
         except Exception as e:
             logger.error(f'Ошибка проверки для {user_id}: {e}')
 
+    DAILY_CHECK.observe(collect_seconds, stage='collect')
+    DAILY_CHECK.observe(time.perf_counter() - render_started - collect_seconds, stage='render')
+    DAILY_USERS.set(len(user_ids))
+    DAILY_CONFIGS.set(len(current))
+    logger.info(f"Ежедневная проверка: {len(current)} различных конфигураций у {len(user_ids)} пользователей")
+
+    with DAILY_CHECK.time(stage='deliver'):
+        await queue.join()
+    DAILY_LAST_SUCCESS.set(time.time())
+    logger.info(f'Ежедневная проверка разослана: {queue.stats()}')
+
+async def _deliver_daily(context, user_id, text, reply_markup):
+    # Forbidden и RetryAfter обрабатывает очередь рассылки. Блокировку пользователя не берем:
+    # send_or_edit_message записывает состояние сам, и воркер очереди не ждет чужой расчет
+    await send_or_edit_message(context, user_id, text, reply_markup)
+
 async def get_versions_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.effective_user.id
     if update.callback_query:
@@ -147,26 +252,25 @@ async def get_versions_callback(update: Update, context: ContextTypes.DEFAULT_TY
         except: pass
         
         msg = await context.bot.send_message(chat_id=user_id, text='⏳ Идет проверка, пожалуйста, подождите...')
-        bot_state = load_bot_state(user_id)
-        bot_state['main_menu_message_id'] = msg.message_id
-        save_bot_state(user_id, bot_state)
+        await storage_async.update_bot_state(user_id, main_menu_message_id=msg.message_id)
     
-    session, error = await asyncio.to_thread(service_1c.login_to_1c)
+    session, error = await service_1c_async.get_session()
     if error:
-        await send_or_edit_message(context, user_id, f"Ошибка: {escape_markdown(error)}", get_main_keyboard(user_id))
+        await send_or_edit_message(context, user_id, f"Ошибка: {escape_markdown(error)}", await get_main_keyboard(user_id))
         return ConversationHandler.END
 
-    soup, soup_error = await asyncio.to_thread(service_1c.get_releases_soup, session)
+    catalog, soup_error = await service_1c_async.get_release_catalog(session)
     if soup_error:
-        await send_or_edit_message(context, user_id, f"Ошибка: {escape_markdown(soup_error)}", get_main_keyboard(user_id))
+        await send_or_edit_message(context, user_id, f"Ошибка: {escape_markdown(soup_error)}", await get_main_keyboard(user_id))
         return ConversationHandler.END
 
     header = escape_markdown('🔍 *Результаты проверки:*\n\n')
-    result_text, updated_configs = service_1c.parse_versions_from_soup(soup, load_configs(user_id))
-    save_configs(user_id, updated_configs)
+    async with storage_async.user_lock(user_id):
+        result_text, updated_configs = service_1c.parse_versions(catalog, await storage_async.load_configs(user_id))
+        await storage_async.save_configs(user_id, updated_configs)
     
     full_text = header + result_text
-    await send_or_edit_message(context, user_id, full_text, get_main_keyboard(user_id, updated_configs))
+    await send_or_edit_message(context, user_id, full_text, await get_main_keyboard(user_id, updated_configs))
     return ConversationHandler.END
 
 async def acknowledge_all_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -174,10 +278,11 @@ async def acknowledge_all_callback(update: Update, context: ContextTypes.DEFAULT
     user_id = update.effective_user.id
     await query.answer('Все обновления отмечены!')
     
-    configs = load_configs(user_id)
-    for i in range(len(configs)):
-        configs[i]['is_new'] = False
-    save_configs(user_id, configs)
+    async with storage_async.user_lock(user_id):
+        configs = await storage_async.load_configs(user_id)
+        for i in range(len(configs)):
+            configs[i]['is_new'] = False
+        await storage_async.save_configs(user_id, configs)
     
     await main_menu_callback(update, context)
 
@@ -185,7 +290,19 @@ async def manage_list_menu_callback(update: Update, context: ContextTypes.DEFAUL
     query = update.callback_query
     user_id = update.effective_user.id
     await query.answer()
-    await send_or_edit_message(context, user_id, 'Управление списком конфигураций:', get_manage_keyboard())
+    bot_state = await storage_async.load_bot_state(user_id)
+    await send_or_edit_message(context, user_id, 'Управление списком конфигураций:', get_manage_keyboard(bot_state.get('digest_mode', False)))
+
+async def toggle_digest_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Ежедневная проверка: полный список каждый день или сообщение только при изменениях."""
+    query = update.callback_query
+    user_id = update.effective_user.id
+    async with storage_async.user_lock(user_id):
+        bot_state = await storage_async.load_bot_state(user_id)
+        bot_state['digest_mode'] = not bot_state.get('digest_mode', False)
+        await storage_async.save_bot_state(user_id, bot_state)
+    await query.answer('Ежедневно - только при изменениях' if bot_state['digest_mode'] else 'Ежедневно - полный список')
+    await send_or_edit_message(context, user_id, 'Управление списком конфигураций:', get_manage_keyboard(bot_state['digest_mode']))
 
 async def add_config_start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
@@ -235,15 +352,16 @@ async def handle_new_config_type(update: Update, context: ContextTypes.DEFAULT_T
         await context.bot.send_message(chat_id=user_id, text="Ошибка: имя конфигурации потеряно. Попробуйте снова.")
         return ConversationHandler.END
 
-    configs = load_configs(user_id)
-    configs.append({
-        'name': config_name,
-        'track_type': track_type,
-        'last_version': '',
-        'last_date': '',
-        'is_new': False
-    })
-    save_configs(user_id, configs)
+    async with storage_async.user_lock(user_id):
+        configs = await storage_async.load_configs(user_id)
+        configs.append({
+            'name': config_name,
+            'track_type': track_type,
+            'last_version': '',
+            'last_date': '',
+            'is_new': False
+        })
+        await storage_async.save_configs(user_id, configs)
     
     context.user_data.pop('new_config_name', None)
     context.user_data.pop('prompt_message_id', None)
@@ -253,7 +371,7 @@ async def handle_new_config_type(update: Update, context: ContextTypes.DEFAULT_T
     # Экранируем текст, чтобы не было ошибки с плюсом (+)
     success_text = f'✅ Конфигурация *{escape_markdown(config_name)}* добавлена\\!\nТип: {escape_markdown(type_desc)}'
     
-    bot_state = load_bot_state(user_id)
+    bot_state = await storage_async.load_bot_state(user_id)
     main_menu_id = bot_state.get('main_menu_message_id')
     
     # Обновляем главное меню
@@ -264,13 +382,13 @@ async def handle_new_config_type(update: Update, context: ContextTypes.DEFAULT_T
                 message_id=main_menu_id, 
                 text=success_text, 
                 parse_mode='MarkdownV2', 
-                reply_markup=get_main_keyboard(user_id, configs)
+                reply_markup=await get_main_keyboard(user_id, configs)
             )
         except Exception:
             # Если не получилось отредактировать (например, старое меню слишком далеко), шлем новое
-            await send_or_edit_message(context, user_id, success_text, get_main_keyboard(user_id, configs))
+            await send_or_edit_message(context, user_id, success_text, await get_main_keyboard(user_id, configs))
     else:
-        await send_or_edit_message(context, user_id, success_text, get_main_keyboard(user_id, configs))
+        await send_or_edit_message(context, user_id, success_text, await get_main_keyboard(user_id, configs))
 
     return ConversationHandler.END
 
@@ -278,7 +396,7 @@ async def remove_config_menu(update: Update, context: ContextTypes.DEFAULT_TYPE)
     query = update.callback_query
     user_id = update.effective_user.id
     await query.answer()
-    configs = load_configs(user_id)
+    configs = await storage_async.load_configs(user_id)
     if not configs:
         await query.edit_message_text(text='Список уже пуст.', reply_markup=get_manage_keyboard())
     else:
@@ -291,10 +409,11 @@ async def remove_config_callback(update: Update, context: ContextTypes.DEFAULT_T
     user_id = update.effective_user.id
     await query.answer()
     index_to_remove = int(query.data.split('_')[1])
-    configs = load_configs(user_id)
-    if 0 <= index_to_remove < len(configs):
-        configs.pop(index_to_remove)
-        save_configs(user_id, configs)
+    async with storage_async.user_lock(user_id):
+        configs = await storage_async.load_configs(user_id)
+        if 0 <= index_to_remove < len(configs):
+            configs.pop(index_to_remove)
+            await storage_async.save_configs(user_id, configs)
     await remove_config_menu(update, context)
 
 async def change_type_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -302,7 +421,7 @@ async def change_type_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.effective_user.id
     await query.answer()
     
-    configs = load_configs(user_id)
+    configs = await storage_async.load_configs(user_id)
     if not configs:
         await query.edit_message_text(text='Список пуст.', reply_markup=get_manage_keyboard())
         return
@@ -321,7 +440,7 @@ async def change_type_select_callback(update: Update, context: ContextTypes.DEFA
     await query.answer()
     index = int(query.data.split('_')[2])
     context.user_data['edit_config_index'] = index
-    configs = load_configs(update.effective_user.id)
+    configs = await storage_async.load_configs(update.effective_user.id)
     name = configs[index]['name']
     await query.edit_message_text(text=f'Настройка для: *{escape_markdown(name)}*\nВыберите новый режим:', parse_mode='MarkdownV2', reply_markup=get_type_selection_keyboard())
 
@@ -336,12 +455,13 @@ async def change_type_save_callback(update: Update, context: ContextTypes.DEFAUL
         await change_type_menu(update, context)
         return
 
-    configs = load_configs(user_id)
-    if 0 <= index < len(configs):
-        configs[index]['track_type'] = new_type
-        configs[index]['last_version'] = '' 
-        configs[index]['last_date'] = ''
-        save_configs(user_id, configs)
+    async with storage_async.user_lock(user_id):
+        configs = await storage_async.load_configs(user_id)
+        if 0 <= index < len(configs):
+            configs[index]['track_type'] = new_type
+            configs[index]['last_version'] = '' 
+            configs[index]['last_date'] = ''
+            await storage_async.save_configs(user_id, configs)
     
     await change_type_menu(update, context)
 
@@ -349,7 +469,7 @@ async def reorder_config_menu(update: Update, context: ContextTypes.DEFAULT_TYPE
     query = update.callback_query
     user_id = update.effective_user.id
     await query.answer()
-    configs = load_configs(user_id)
+    configs = await storage_async.load_configs(user_id)
     if len(configs) < 2:
         await query.edit_message_text(text='Нужно хотя бы 2 конфигурации для изменения порядка.', reply_markup=get_manage_keyboard())
     else:
@@ -373,12 +493,13 @@ async def move_config_callback(update: Update, context: ContextTypes.DEFAULT_TYP
     await query.answer()
     _, direction, index_str = query.data.split('_')
     index = int(index_str)
-    configs = load_configs(user_id)
-    if direction == 'up' and index > 0:
-        configs[index], configs[index - 1] = (configs[index - 1], configs[index])
-    elif direction == 'down' and index < len(configs) - 1:
-        configs[index], configs[index + 1] = (configs[index + 1], configs[index])
-    save_configs(user_id, configs)
+    async with storage_async.user_lock(user_id):
+        configs = await storage_async.load_configs(user_id)
+        if direction == 'up' and index > 0:
+            configs[index], configs[index - 1] = (configs[index - 1], configs[index])
+        elif direction == 'down' and index < len(configs) - 1:
+            configs[index], configs[index + 1] = (configs[index + 1], configs[index])
+        await storage_async.save_configs(user_id, configs)
     await reorder_config_menu(update, context)
 
 async def noop_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -388,7 +509,7 @@ async def check_updates_start(update: Update, context: ContextTypes.DEFAULT_TYPE
     query = update.callback_query
     user_id = update.effective_user.id
     await query.answer()
-    configs = load_configs(user_id)
+    configs = await storage_async.load_configs(user_id)
     keyboard = []
     if configs:
         for i, config in enumerate(configs):
@@ -403,7 +524,7 @@ async def check_updates_select_config(update: Update, context: ContextTypes.DEFA
     user_id = update.effective_user.id
     await query.answer()
     config_index = int(query.data.split('_')[2])
-    configs = load_configs(user_id)
+    configs = await storage_async.load_configs(user_id)
     selected_config_name = configs[config_index]['name']
     context.user_data['selected_config'] = selected_config_name
     await query.edit_message_text(text=f'Выбрана конфигурация: *{escape_markdown(selected_config_name)}*\n\n' + 'Теперь, пожалуйста, пришлите номер вашей текущей версии \\(например, `3\\.0\\.123\\.45`\\)\\.', parse_mode='MarkdownV2')
@@ -422,7 +543,7 @@ async def check_updates_handle_manual_config(update: Update, context: ContextTyp
     try: await context.bot.delete_message(chat_id=user_id, message_id=update.message.id)
     except: pass
     
-    bot_state = load_bot_state(user_id)
+    bot_state = await storage_async.load_bot_state(user_id)
     main_menu_id = bot_state.get('main_menu_message_id')
     text = f'Выбрана конфигурация: *{escape_markdown(config_name)}*\n\nТеперь пришлите номер вашей текущей версии \\(например, `3\\.0\\.123\\.45`\\)\\.'
     
@@ -442,15 +563,15 @@ async def check_updates_calculate(update: Update, context: ContextTypes.DEFAULT_
     try: await context.bot.delete_message(chat_id=update.effective_chat.id, message_id=update.message.id)
     except: pass
         
-    session, error = await asyncio.to_thread(service_1c.login_to_1c)
+    session, error = await service_1c_async.get_session()
     if error:
-        await send_or_edit_message(context, update.effective_chat.id, text=error, reply_markup=get_main_keyboard(update.effective_user.id))
+        await send_or_edit_message(context, update.effective_chat.id, text=error, reply_markup=await get_main_keyboard(update.effective_user.id))
         context.user_data.clear()
         return ConversationHandler.END
     
-    targets, error = await asyncio.to_thread(service_1c.get_target_versions, session, config_name)
+    targets, error = await service_1c_async.get_target_versions(session, config_name)
     if error:
-        await send_or_edit_message(context, update.effective_chat.id, text=error, reply_markup=get_main_keyboard(update.effective_user.id))
+        await send_or_edit_message(context, update.effective_chat.id, text=error, reply_markup=await get_main_keyboard(update.effective_user.id))
         context.user_data.clear()
         return ConversationHandler.END
     
@@ -462,11 +583,11 @@ async def check_updates_calculate(update: Update, context: ContextTypes.DEFAULT_
         
     await send_or_edit_message(context, update.effective_chat.id, text=f'{status_text}\n\n⏳ Рассчитываю путь обновления от `{escape_markdown(user_version)}`\\. Это может занять некоторое время\\.\\.\\.', reply_markup=None)
     
-    result_text = await asyncio.to_thread(service_1c.find_update_path, session, config_name, user_version, dp_target, non_dp_target)
+    result_text = await service_1c_async.find_update_path(session, config_name, user_version, dp_target, non_dp_target)
     header = escape_markdown('📊 *Результат подсчета обновлений:*\n\n')
     full_text = header + result_text
     
-    await send_or_edit_message(context, update.effective_chat.id, text=full_text, reply_markup=get_main_keyboard(update.effective_user.id))
+    await send_or_edit_message(context, update.effective_chat.id, text=full_text, reply_markup=await get_main_keyboard(update.effective_user.id))
     context.user_data.clear()
     return ConversationHandler.END
 
@@ -477,6 +598,82 @@ async def cancel_update_check(update: Update, context: ContextTypes.DEFAULT_TYPE
     await main_menu_callback(update, context)
     return ConversationHandler.END
 
+def format_batch_table(results: list) -> str:
+    """Компактная моноширинная таблица результатов пакетного расчета."""
+    lines = []
+    for r in results:
+        name = r['config'] if len(r['config']) <= BATCH_NAME_WIDTH else r['config'][:BATCH_NAME_WIDTH - 1] + '…'
+        outcome = f"{r['steps']} → {r['target']}" if r['error'] is None else r['error']
+        lines.append(f"{name:<{BATCH_NAME_WIDTH}} {r['version']:<14} {outcome}")
+    return '\n'.join(lines)
+
+def build_batch_csv(results: list) -> bytes:
+    buf = io.StringIO()
+    writer = csv.writer(buf, delimiter=';')
+    writer.writerow(['Конфигурация', 'Версия', 'Цель', 'Шагов', 'Цепочка', 'Ошибка'])
+    for r in results:
+        writer.writerow([r['config'], r['version'], r['target'] or '', '' if r['steps'] is None else r['steps'],
+                         ' > '.join(r['chain'] or []), r['error'] or ''])
+    # utf-8-sig - чтобы Excel сразу открыл кириллицу
+    return buf.getvalue().encode('utf-8-sig')
+
+async def batch_start(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    await query.answer()
+    await query.edit_message_text(
+        text='Пришлите список баз, по одной на строку, в формате:\n\n'
+             'Конфигурация; версия\n\n'
+             'Например:\nБухгалтерия предприятия, редакция 3.0; 3.0.150.20',
+        reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton('⬅️ Отмена', callback_data='cancel_update_check')]])
+    )
+    return GET_BATCH_TEXT
+
+async def batch_calculate(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    user_id = update.effective_user.id
+    chat_id = update.effective_chat.id
+    pairs, bad_lines = parse_batch_lines(update.message.text)
+
+    try: await context.bot.delete_message(chat_id=chat_id, message_id=update.message.id)
+    except: pass
+
+    if not pairs:
+        await send_or_edit_message(
+            context, chat_id,
+            text='❌ Не найдено ни одной строки вида `Конфигурация; версия`\\. Пришлите список еще раз\\.',
+            reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton('⬅️ Отмена', callback_data='cancel_update_check')]])
+        )
+        return GET_BATCH_TEXT
+
+    await send_or_edit_message(context, chat_id, text=f'⏳ *Считаю обновления для {len(pairs)} баз\\.\\.\\.*', reply_markup=None)
+    await context.bot.send_chat_action(chat_id=chat_id, action='typing')
+
+    session, error = await service_1c_async.get_session()
+    if error:
+        await send_or_edit_message(context, chat_id, text=f"❌ {escape_markdown(error)}", reply_markup=await get_main_keyboard(user_id))
+        return ConversationHandler.END
+
+    results = await service_1c_async.find_update_paths_batch(session, pairs)
+
+    header = '📦 *Пакетный расчет обновлений*\n\n'
+    footer = ''
+    if bad_lines:
+        footer = f'\n\nПропущено нераспознанных строк: {len(bad_lines)}'
+
+    table = format_batch_table(results)
+    if len(results) <= BATCH_INLINE_LIMIT and len(table) <= 3500:
+        # Внутри блока кода MarkdownV2 экранируются только ` и \
+        code = table.replace('\\', '\\\\').replace('`', '\\`')
+        await send_or_edit_message(context, chat_id, text=f'{header}```\n{code}\n```{escape_markdown(footer)}', reply_markup=await get_main_keyboard(user_id))
+    else:
+        await context.bot.send_document(
+            chat_id=chat_id, document=build_batch_csv(results), filename='update_paths.csv',
+            caption=f'Расчет обновлений: {len(results)} баз'
+        )
+        done = sum(1 for r in results if r['error'] is None)
+        summary = f'Результат отправлен файлом: рассчитано {done} из {len(results)}.' + footer
+        await send_or_edit_message(context, chat_id, text=header + escape_markdown(summary), reply_markup=await get_main_keyboard(user_id))
+    return ConversationHandler.END
+
 async def reg_start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     await query.answer()
@@ -503,8 +700,11 @@ async def process_registration_text(update: Update, context: ContextTypes.DEFAUL
     try: await context.bot.delete_message(chat_id=user_id, message_id=update.message.id)
     except: pass
 
-    if 'reg_buffer' not in context.user_data: context.user_data['reg_buffer'] = []
-    context.user_data['reg_buffer'].append(text)
+    # Разбираем каждое сообщение сразу: большая выгрузка приходит многими частями
+    if 'reg_stream' not in context.user_data:
+        context.user_data['reg_stream'] = RegistrationStream()
+        context.user_data['reg_records'] = []
+    context.user_data['reg_records'].extend(context.user_data['reg_stream'].feed(text))
     
     if 'reg_timer_task' in context.user_data: context.user_data['reg_timer_task'].cancel()
     context.user_data['reg_timer_task'] = asyncio.create_task(finalize_registration_processing(update, context))
@@ -514,19 +714,25 @@ async def finalize_registration_processing(update: Update, context: ContextTypes
     try: await asyncio.sleep(1.5)
     except asyncio.CancelledError: return
 
-    full_text = "\n".join(context.user_data.get('reg_buffer', []))
-    context.user_data['reg_buffer'] = []
+    # Задача идет в фоне, вне очереди обновлений пользователя - встаем в нее сами,
+    # чтобы не перемешаться с его следующими сообщениями и кнопками
+    async with update_lock(update.effective_user.id):
+        await _finalize_registration(update, context)
+
+async def _finalize_registration(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    stream = context.user_data.pop('reg_stream', None)
+    parsed_data = context.user_data.pop('reg_records', [])
+    if stream: parsed_data.extend(stream.close())
     context.user_data.pop('reg_timer_task', None)
     
     user_id = update.effective_user.id
-    parsed_data = parse_registration_text(full_text)
     
     if not parsed_data:
         await context.bot.send_message(chat_id=user_id, text='❌ Не удалось найти данные арендаторов в тексте. Проверьте формат.')
         await main_menu_callback(update, context)
         return
 
-    mappings = load_mappings(user_id)
+    mappings = await storage_async.load_mappings(user_id)
     unknown_nomenclatures = set()
     
     for item in parsed_data:
@@ -535,6 +741,7 @@ async def finalize_registration_processing(update: Update, context: ContextTypes
     
     context.user_data['reg_parsed_data'] = parsed_data
     context.user_data['reg_unknowns'] = list(unknown_nomenclatures)
+    context.user_data['reg_suggestions'] = await suggest.suggest_all(user_id, mappings, unknown_nomenclatures)
     
     if unknown_nomenclatures: await ask_next_mapping(update, context)
     else: await send_registration_result(update, context)
@@ -549,10 +756,22 @@ async def ask_next_mapping(update: Update, context: ContextTypes.DEFAULT_TYPE):
     current_unknown = unknowns[0]
     msg_text = (f'⚠️ Обнаружена неизвестная номенклатура:\n\n`{escape_markdown(current_unknown)}`\n\n'
                 f'Пожалуйста, введите правильное название для вывода \\(оно сохранится в словарь\\)\\.')
+
+    suggestions = context.user_data.get('reg_suggestions', {})
+    keyboard = []
+    hint = suggestions.get(current_unknown)
+    if hint:
+        msg_text += (f'\n\n💡 Похоже на `{escape_markdown(hint["key"])}` → *{escape_markdown(hint["name"])}*\n'
+                     f'Нажмите кнопку, чтобы принять подсказку\\.')
+        keyboard.append([InlineKeyboardButton(f'✅ {hint["name"][:40]}', callback_data='reg_accept_one')])
+    pending = sum(1 for raw in unknowns if raw in suggestions)
+    if pending > 1:
+        keyboard.append([InlineKeyboardButton(f'✅ Принять все подсказки ({pending})', callback_data='reg_accept_all')])
+    reply_markup = InlineKeyboardMarkup(keyboard) if keyboard else None
     
     chat_id = update.effective_chat.id if update.message else update.effective_user.id
-    if update.callback_query: sent_msg = await update.callback_query.edit_message_text(text=msg_text, parse_mode='MarkdownV2')
-    else: sent_msg = await context.bot.send_message(chat_id=chat_id, text=msg_text, parse_mode='MarkdownV2')
+    if update.callback_query: sent_msg = await update.callback_query.edit_message_text(text=msg_text, parse_mode='MarkdownV2', reply_markup=reply_markup)
+    else: sent_msg = await context.bot.send_message(chat_id=chat_id, text=msg_text, parse_mode='MarkdownV2', reply_markup=reply_markup)
         
     context.user_data['reg_prompt_id'] = sent_msg.message_id
     context.user_data['awaiting_mapping_name'] = True
@@ -573,18 +792,54 @@ async def save_mapping_name(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if unknowns:
         current_raw = unknowns.pop(0)
         context.user_data['reg_unknowns'] = unknowns
-        mappings = load_mappings(user_id)
-        mappings[current_raw] = new_name
-        save_mappings(user_id, mappings)
+        async with storage_async.user_lock(user_id):
+            mappings = await storage_async.load_mappings(user_id)
+            mappings[current_raw] = new_name
+            await storage_async.save_mappings(user_id, mappings)
+        suggest.mapping_saved(user_id, current_raw)
         return await ask_next_mapping(update, context)
     return GET_REG_TEXT
 
+async def accept_mapping_suggestion(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Кнопки подсказок: принять для текущей номенклатуры (reg_accept_one) или для всех (reg_accept_all)."""
+    query = update.callback_query
+    user_id = update.effective_user.id
+    await query.answer()
+
+    unknowns = context.user_data.get('reg_unknowns', [])
+    suggestions = context.user_data.get('reg_suggestions', {})
+    if query.data == 'reg_accept_all': accepted = [raw for raw in unknowns if raw in suggestions]
+    else: accepted = unknowns[:1] if unknowns and unknowns[0] in suggestions else []
+
+    if accepted:
+        # Все принятые замены - одной записью словаря
+        async with storage_async.user_lock(user_id):
+            mappings = await storage_async.load_mappings(user_id)
+            for raw in accepted:
+                mappings[raw] = suggestions[raw]['name']
+            await storage_async.save_mappings(user_id, mappings)
+        for raw in accepted:
+            suggest.mapping_saved(user_id, raw)
+        accepted = set(accepted)
+        context.user_data['reg_unknowns'] = [raw for raw in unknowns if raw not in accepted]
+
+    if context.user_data.get('reg_unknowns'):
+        await ask_next_mapping(update, context)
+    else:
+        try: await query.delete_message()
+        except: pass
+        context.user_data['awaiting_mapping_name'] = False
+        await send_registration_result(update, context)
+    return GET_REG_TEXT
+
 async def send_registration_result(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.effective_user.id
     await delete_extra_messages(context, user_id)
     
     parsed_data = context.user_data.get('reg_parsed_data', [])
-    mappings = load_mappings(user_id)
+    mappings = await storage_async.load_mappings(user_id)
+    if len(parsed_data) > REG_INLINE_LIMIT:
+        return await send_registration_document(context, user_id, parsed_data, mappings)
     blocks = []
     
     for item in parsed_data:
@@ -611,32 +866,66 @@ async def send_registration_result(update: Update, context: ContextTypes.DEFAULT
         current_length += block_len
     if current_page_blocks: pages.append(current_page_blocks)
 
-    bot_state = load_bot_state(user_id)
-    old_menu_id = bot_state.get('main_menu_message_id')
+    old_menu_id = (await storage_async.load_bot_state(user_id)).get('main_menu_message_id')
     if old_menu_id:
         try: await context.bot.delete_message(chat_id=user_id, message_id=old_menu_id)
         except: pass
 
+    menu_id = old_menu_id
     new_extra_ids = []
     for i, page_blocks in enumerate(pages):
         text_content = "\n\n".join(page_blocks)
         if i == 0: text_content = header + text_content
         
         if i == len(pages) - 1:
-            sent_msg = await context.bot.send_message(chat_id=user_id, text=text_content, parse_mode='HTML', reply_markup=get_main_keyboard(user_id))
-            bot_state['main_menu_message_id'] = sent_msg.message_id
+            sent_msg = await context.bot.send_message(chat_id=user_id, text=text_content, parse_mode='HTML', reply_markup=await get_main_keyboard(user_id))
+            menu_id = sent_msg.message_id
         else:
             sent_msg = await context.bot.send_message(chat_id=user_id, text=text_content, parse_mode='HTML')
             new_extra_ids.append(sent_msg.message_id)
     
-    bot_state['extra_message_ids'] = new_extra_ids
-    save_bot_state(user_id, bot_state)
+    await storage_async.update_bot_state(user_id, main_menu_message_id=menu_id, extra_message_ids=new_extra_ids)
+
+def build_registration_csv(parsed_data: list, mappings: dict):
+    """CSV с данными для регистрации: строки пишутся по одной во временный файл."""
+    spool = tempfile.SpooledTemporaryFile(max_size=REG_SPOOL_SIZE)
+    # utf-8-sig - чтобы Excel сразу открыл кириллицу
+    text = io.TextIOWrapper(spool, encoding='utf-8-sig', newline='')
+    writer = csv.writer(text, delimiter=';')
+    writer.writerow(['Арендатор', 'ИНН', 'Номенклатура', 'Рег. номер'])
+    for item in parsed_data:
+        writer.writerow([item['name'], item['inn'], mappings.get(item['nom_raw'], item['nom_raw']), item['reg_num']])
+    text.flush()
+    text.detach()
+    spool.seek(0)
+    return spool
+
+async def send_registration_document(context, user_id: int, parsed_data: list, mappings: dict):
+    """Большой список - одним файлом и меню под ним вместо десятков сообщений."""
+    old_menu_id = (await storage_async.load_bot_state(user_id)).get('main_menu_message_id')
+    if old_menu_id:
+        try: await context.bot.delete_message(chat_id=user_id, message_id=old_menu_id)
+        except: pass
+
+    tenants = len({(item['name'], item['inn']) for item in parsed_data})
+    with build_registration_csv(parsed_data, mappings) as document:
+        # PTB все равно читает файл целиком в тело запроса - отдаем байты сразу
+        await context.bot.send_document(
+            chat_id=user_id, document=document.read(), filename='registration.csv',
+            caption=f'Данные для регистрации: {tenants} арендаторов, {len(parsed_data)} записей'
+        )
+
+    sent_msg = await context.bot.send_message(
+        chat_id=user_id, text='<b>📝 Данные для регистрации отправлены файлом.</b>',
+        parse_mode='HTML', reply_markup=await get_main_keyboard(user_id)
+    )
+    await storage_async.update_bot_state(user_id, main_menu_message_id=sent_msg.message_id, extra_message_ids=[])
 
 async def manage_mappings_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     user_id = update.effective_user.id
     await query.answer()
-    mappings = load_mappings(user_id)
+    mappings = await storage_async.load_mappings(user_id)
     if not mappings:
         try: await query.edit_message_text(text='Словарь замен пуст.', reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton('⬅️ Назад', callback_data='manage_list_menu')]]))
         except BadRequest: pass
@@ -656,14 +945,17 @@ async def delete_mapping_callback(update: Update, context: ContextTypes.DEFAULT_
     user_id = update.effective_user.id
     await query.answer()
     target_hash = query.data.split('_')[2]
-    mappings = load_mappings(user_id)
     key_to_delete = None
-    for key in mappings.keys():
-        if hashlib.md5(key.encode()).hexdigest() == target_hash:
-            key_to_delete = key; break
+    async with storage_async.user_lock(user_id):
+        mappings = await storage_async.load_mappings(user_id)
+        for key in mappings.keys():
+            if hashlib.md5(key.encode()).hexdigest() == target_hash:
+                key_to_delete = key; break
+        if key_to_delete:
+            del mappings[key_to_delete]
+            await storage_async.save_mappings(user_id, mappings)
     if key_to_delete:
-        del mappings[key_to_delete]
-        save_mappings(user_id, mappings)
+        suggest.mapping_deleted(user_id, key_to_delete)
     await manage_mappings_menu(update, context)
 
 async def delete_stray_text(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -671,7 +963,7 @@ async def delete_stray_text(update: Update, context: ContextTypes.DEFAULT_TYPE):
     except: pass
     
 # 1. Добавьте импорт новой функции
-from .utils import escape_markdown, normalize_text, version_tuple, is_valid_version
+from .utils import escape_markdown, normalize_text, is_valid_version
 
 # 2. Добавьте функцию help_command (где-то в начале обработчиков)
 async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -684,11 +976,39 @@ async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         "*Функции:*\n"
         "🔄 *Проверить версии* — Сверяет ваши конфигурации с сайтом releases.1c.ru\n"
         "📈 *Кол-во обновлений* — Рассчитывает цепочку обновлений (cfu) от вашей версии до актуальной\n"
+        "📦 *Пакетный расчет* — То же для списка баз: по строке «Конфигурация; версия»\n"
         "📝 *Регистрация* — Форматирует данные арендаторов для подачи заявки\n"
         "⚙️ *Управление* — Добавление и удаление конфигураций из списка отслеживания\n\n"
         "_Бот проверяет обновления автоматически раз в сутки._"
     )
-    await send_or_edit_message(context, update.effective_chat.id, escape_markdown(text), get_main_keyboard(update.effective_user.id))
+    await send_or_edit_message(context, update.effective_chat.id, escape_markdown(text), await get_main_keyboard(update.effective_user.id))
+
+async def stats_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Сводка метрик (только для администратора)."""
+    user_id = update.effective_user.id
+    if not ADMIN_USER_ID or user_id != ADMIN_USER_ID:
+        return
+    try: await context.bot.delete_message(chat_id=user_id, message_id=update.message.id)
+    except: pass
+
+    report = metrics.REGISTRY.summary() or 'Метрик пока нет.'
+    # Сообщение Telegram ограничено 4096 символами - режем отчет по строкам
+    chunks, current = [], ''
+    for line in report.splitlines():
+        if len(current) + len(line) + 1 > 3900:
+            chunks.append(current)
+            current = ''
+        current += line + '\n'
+    if current: chunks.append(current)
+
+    sent_ids = []
+    for chunk in chunks:
+        sent = await context.bot.send_message(chat_id=user_id, text=f'<pre>{html.escape(chunk)}</pre>', parse_mode='HTML')
+        sent_ids.append(sent.message_id)
+    async with storage_async.user_lock(user_id):
+        state = await storage_async.load_bot_state(user_id)
+        state.setdefault('extra_message_ids', []).extend(sent_ids)
+        await storage_async.save_bot_state(user_id, state)
 
 # 3. Обновите функцию check_updates_calculate
 async def check_updates_calculate(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -721,9 +1041,9 @@ async def check_updates_calculate(update: Update, context: ContextTypes.DEFAULT_
     # ----------------------------------------------
 
     # 3. Авторизация (может занять время)
-    session, error = await asyncio.to_thread(service_1c.login_to_1c)
+    session, error = await service_1c_async.get_session()
     if error:
-        await send_or_edit_message(context, chat_id, text=f"❌ {escape_markdown(error)}", reply_markup=get_main_keyboard(update.effective_user.id))
+        await send_or_edit_message(context, chat_id, text=f"❌ {escape_markdown(error)}", reply_markup=await get_main_keyboard(update.effective_user.id))
         context.user_data.clear()
         return ConversationHandler.END
     
@@ -737,9 +1057,9 @@ async def check_updates_calculate(update: Update, context: ContextTypes.DEFAULT_
     # ------------------------
     
     # 4. Получение целевых версий
-    targets, error = await asyncio.to_thread(service_1c.get_target_versions, session, config_name)
+    targets, error = await service_1c_async.get_target_versions(session, config_name)
     if error:
-        await send_or_edit_message(context, chat_id, text=f"❌ {error}", reply_markup=get_main_keyboard(update.effective_user.id))
+        await send_or_edit_message(context, chat_id, text=f"❌ {error}", reply_markup=await get_main_keyboard(update.effective_user.id))
         context.user_data.clear()
         return ConversationHandler.END
     
@@ -760,11 +1080,11 @@ async def check_updates_calculate(update: Update, context: ContextTypes.DEFAULT_
     # ----------------------------------------------
     
     # 5. Расчет пути (самая долгая операция)
-    result_text = await asyncio.to_thread(service_1c.find_update_path, session, config_name, user_version, dp_target, non_dp_target)
+    result_text = await service_1c_async.find_update_path(session, config_name, user_version, dp_target, non_dp_target)
     
     header = escape_markdown('📊 *Результат подсчета обновлений:*\n\n')
     full_text = header + result_text
     
-    await send_or_edit_message(context, chat_id, text=full_text, reply_markup=get_main_keyboard(update.effective_user.id))
+    await send_or_edit_message(context, chat_id, text=full_text, reply_markup=await get_main_keyboard(update.effective_user.id))
     context.user_data.clear()
     return ConversationHandler.END
\ No newline at end of file
@@ -1,12 +1,13 @@
 from telegram import InlineKeyboardButton, InlineKeyboardMarkup
-from .storage import load_configs
+from . import storage_async
 
-def get_main_keyboard(user_id: int, configs=None):
+async def get_main_keyboard(user_id: int, configs=None):
     if configs is None:
-        configs = load_configs(user_id)
+        configs = await storage_async.load_configs(user_id)
     keyboard = [
         [InlineKeyboardButton('🔄 Проверить версии', callback_data='get_versions')],
         [InlineKeyboardButton('📈 Узнать кол-во обновлений', callback_data='check_updates_start')],
+        [InlineKeyboardButton('📦 Пакетный расчет обновлений', callback_data='batch_start')],
         [InlineKeyboardButton('📝 Регистрация арендаторов', callback_data='reg_start')]
     ]
     if any((c.get('is_new', False) for c in configs)):
@@ -14,13 +15,15 @@ def get_main_keyboard(user_id: int, configs=None):
     keyboard.append([InlineKeyboardButton('⚙️ Управление списком', callback_data='manage_list_menu')])
     return InlineKeyboardMarkup(keyboard)
 
-def get_manage_keyboard():
+def get_manage_keyboard(digest_mode: bool = False):
+    digest_text = '🔔 Ежедневно: только изменения' if digest_mode else '🔔 Ежедневно: полный список'
     return InlineKeyboardMarkup([
         [InlineKeyboardButton('➕ Добавить', callback_data='add_config_start')],
         [InlineKeyboardButton('➖ Удалить', callback_data='remove_config_menu')],
         [InlineKeyboardButton('🛠 Изменить тип', callback_data='change_type_menu')],
         [InlineKeyboardButton('↕️ Изменить порядок', callback_data='reorder_config_menu')],
         [InlineKeyboardButton('📂 Словарь замен', callback_data='manage_mappings_menu')],
+        [InlineKeyboardButton(digest_text, callback_data='toggle_digest')],
         [InlineKeyboardButton('⬅️ Назад', callback_data='main_menu')]
     ])
 
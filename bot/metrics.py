@@ -0,0 +1,245 @@
+"""
+Легкий реестр метрик: счетчики, значения и гистограммы с метками.
+
+Модули заводят метрики у себя (metrics.histogram(...) и т.п.); повторный вызов
+с тем же именем возвращает уже созданную метрику. Значения отдаются в текстовом
+формате Prometheus (render, start_http_server) и кратким отчетом для /stats.
+"""
+import time
+import bisect
+import logging
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+logger = logging.getLogger(__name__)
+
+# Границы корзин гистограмм по умолчанию, секунды
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+def _format_labels(names, values, extra=None) -> str:
+    pairs = list(zip(names, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ''
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, v in pairs)
+    return '{' + ','.join(f'{n}="{v}"' for (n, _), v in zip(pairs, escaped)) + '}'
+
+def _format_value(value) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class _Metric:
+    kind = 'untyped'
+
+    def __init__(self, name: str, description: str, labels=()):
+        self.name = name
+        self.description = description
+        self.labelnames = tuple(labels)
+        self.lock = threading.Lock()
+        self._values = {}
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(str(labels.get(name, '')) for name in self.labelnames)
+
+    def series(self) -> dict:
+        with self.lock:
+            return dict(self._values)
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self.lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        for key, value in sorted(self.series().items()):
+            yield f'{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}'
+
+class Gauge(_Metric):
+    """Значение, которое выставляют явно или которое считает функция в момент опроса."""
+    kind = 'gauge'
+
+    def __init__(self, name, description, labels=(), function=None):
+        super().__init__(name, description, labels)
+        # function() -> число или {кортеж значений меток: число}
+        self.function = function
+
+    def set(self, value: float, **labels):
+        with self.lock:
+            self._values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self.lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def series(self) -> dict:
+        if self.function is None:
+            return super().series()
+        try:
+            value = self.function()
+        except Exception as e:
+            logger.error(f'Метрика {self.name}: ошибка вычисления: {e}')
+            return {}
+        if isinstance(value, dict):
+            return {k if isinstance(k, tuple) else (k,): v for k, v in value.items() if v is not None}
+        return {(): value} if value is not None else {}
+
+    def render(self):
+        for key, value in sorted(self.series().items()):
+            yield f'{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}'
+
+class _Timer:
+    __slots__ = ('histogram', 'labels', 'started')
+
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.started, **self.labels)
+        return False
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, description, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, description, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            state = self._values.get(key)
+            if state is None:
+                # [счетчики по корзинам (+Inf последней), сумма, количество]
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def time(self, **labels) -> _Timer:
+        """with histogram.time(...): - замер длительности блока (подходит и для async-кода)."""
+        return _Timer(self, labels)
+
+    def series(self) -> dict:
+        with self.lock:
+            return {k: (list(v[0]), v[1], v[2]) for k, v in self._values.items()}
+
+    def quantile(self, q: float, counts, total: int) -> float:
+        """Оценка квантиля по корзинам (верхняя граница корзины, как в Prometheus без интерполяции)."""
+        rank = q * total
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float('inf'),), counts):
+            cumulative += count
+            if cumulative >= rank:
+                return bound
+        return float('inf')
+
+    def render(self):
+        for key, (counts, total_sum, count) in sorted(self.series().items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                labels = _format_labels(self.labelnames, key, ('le', _format_value(bound)))
+                yield f'{self.name}_bucket{labels} {cumulative}'
+            labels = _format_labels(self.labelnames, key)
+            yield f'{self.name}_sum{labels} {_format_value(total_sum)}'
+            yield f'{self.name}_count{labels} {count}'
+
+class Registry:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.metrics = {}
+
+    def _get_or_create(self, cls, name, *args, **kwargs):
+        with self.lock:
+            metric = self.metrics.get(name)
+            if metric is None:
+                metric = self.metrics[name] = cls(name, *args, **kwargs)
+            elif not isinstance(metric, cls):
+                raise ValueError(f'Метрика {name} уже заведена с другим типом')
+            return metric
+
+    def render(self) -> str:
+        """Все метрики в текстовом формате Prometheus."""
+        with self.lock:
+            metrics = sorted(self.metrics.values(), key=lambda m: m.name)
+        lines = []
+        for metric in metrics:
+            lines.append(f'# HELP {metric.name} {metric.description}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+    def summary(self) -> str:
+        """Краткий отчет для /stats: гистограммы - число, среднее и p50/p95, остальное - значения."""
+        with self.lock:
+            metrics = sorted(self.metrics.values(), key=lambda m: m.name)
+        lines = []
+        for metric in metrics:
+            for key, value in sorted(metric.series().items()):
+                label = metric.name + (f"[{','.join(key)}]" if any(key) else '')
+                if isinstance(metric, Histogram):
+                    counts, total_sum, count = value
+                    if not count:
+                        continue
+                    p50 = metric.quantile(0.5, counts, count)
+                    p95 = metric.quantile(0.95, counts, count)
+                    lines.append(f'{label}: n={count} avg={total_sum / count * 1000:.0f}мс '
+                                 f'p50≤{_ms(p50)} p95≤{_ms(p95)}')
+                else:
+                    lines.append(f'{label}: {value:g}' if isinstance(value, (int, float)) else f'{label}: {value}')
+        return '\n'.join(lines)
+
+def _ms(seconds: float) -> str:
+    return '∞' if seconds == float('inf') else f'{seconds * 1000:.0f}мс'
+
+REGISTRY = Registry()
+
+def counter(name: str, description: str, labels=()) -> Counter:
+    return REGISTRY._get_or_create(Counter, name, description, labels)
+
+def gauge(name: str, description: str, labels=(), function=None) -> Gauge:
+    return REGISTRY._get_or_create(Gauge, name, description, labels, function)
+
+def histogram(name: str, description: str, labels=(), buckets=DEFAULT_BUCKETS) -> Histogram:
+    return REGISTRY._get_or_create(Histogram, name, description, labels, buckets)
+
+def ratio(hits, misses):
+    total = hits + misses
+    return hits / total if total else None
+
+# --- HTTP-ЭНДПОИНТ ---
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split('?')[0] not in ('/metrics', '/'):
+            self.send_response(404)
+            self.end_headers()
+            return
+        body = REGISTRY.render().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+def start_http_server(listen: str, port: int):
+    """Отдает /metrics в отдельном фоновом потоке. Возвращает сервер."""
+    server = ThreadingHTTPServer((listen, port), _MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name='metrics-http', daemon=True).start()
+    return server
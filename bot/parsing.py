@@ -0,0 +1,51 @@
+import re
+import html
+import logging
+from bs4 import BeautifulSoup, SoupStrainer
+
+logger = logging.getLogger(__name__)
+
+# Со страниц портала нам нужны только эти таблицы. SoupStrainer строит дерево
+# лишь для них, а остальной документ (меню, скрипты, подвал) пропускается.
+ACTUAL_TABLE = SoupStrainer('table', id='actualTable')
+VERSIONS_TABLE = SoupStrainer('table', id='versionsTable')
+
+# Ссылку "все обновления" ищем прямо в байтах, чтобы не строить дерево ради одного тега
+ALL_UPDATES_HREF_RE = re.compile(rb'href\s*=\s*["\']([^"\']*\?allUpdates=true[^"\']*)["\']')
+
+def resolve_parser(name: str = 'auto') -> str:
+    """'auto' - lxml, если он установлен, иначе встроенный html.parser."""
+    if name and name != 'auto':
+        return name
+    try:
+        import lxml  # noqa: F401
+        return 'lxml'
+    except ImportError:
+        return 'html.parser'
+
+_parser = resolve_parser()
+
+def set_parser(name: str) -> str:
+    """Выбирает бэкенд BeautifulSoup при запуске. Возвращает фактически выбранный."""
+    global _parser
+    parser = resolve_parser(name)
+    try:
+        BeautifulSoup('', parser)
+    except Exception:
+        logger.warning(f"HTML-парсер '{parser}' недоступен, используется html.parser")
+        parser = 'html.parser'
+    _parser = parser
+    return _parser
+
+def get_parser() -> str:
+    return _parser
+
+def make_soup(content, parse_only=None):
+    return BeautifulSoup(content, _parser, parse_only=parse_only)
+
+def find_all_updates_href(content: bytes):
+    """Относительная ссылка на страницу ?allUpdates=true или None."""
+    m = ALL_UPDATES_HREF_RE.search(content)
+    if not m:
+        return None
+    return html.unescape(m.group(1).decode('utf-8', 'replace'))
@@ -0,0 +1,234 @@
+"""
+Профилирование работающего бота по команде администратора.
+
+    /profile updates 50   - cProfile на время обработки следующих 50 обновлений
+    /profile seconds 60   - cProfile на 60 секунд
+    /profile daily        - один запуск ежедневной проверки под cProfile
+    /profile memory 300   - tracemalloc: разница снимков памяти за 300 секунд
+    /profile stop         - досрочно завершить и получить отчет
+
+Отчет приходит документом. Пока профилирование не запущено, ни профилировщик,
+ни tracemalloc, ни обработчик-счетчик обновлений не установлены, так что
+накладных расходов нет. Профилируется поток event loop; работа в пулах потоков
+(разбор HTML, диск) видна только как ожидание.
+"""
+import io
+import time
+import pstats
+import marshal
+import cProfile
+import logging
+import tracemalloc
+from datetime import datetime
+from telegram import Update
+from telegram.ext import ContextTypes, TypeHandler
+
+from .config import ADMIN_USER_ID
+
+logger = logging.getLogger(__name__)
+
+# Группа обработчика-счетчика: последняя, чтобы обновление считалось уже обработанным
+COUNTER_GROUP = 1000
+TOP_FUNCTIONS = 40
+TOP_ALLOCATIONS = 30
+TRACEMALLOC_FRAMES = 10
+
+MAX_UPDATES = 10000
+MAX_SECONDS = 3600
+
+class ProfileSession:
+    def __init__(self, mode: str, chat_id: int, limit: int = 0):
+        self.mode = mode
+        self.chat_id = chat_id
+        self.limit = limit
+        self.started = time.monotonic()
+        self.counted = 0
+        self.profiler = None
+        self.snapshot = None
+        self.handler = None
+        self.job = None
+
+_session = None
+
+def is_active() -> bool:
+    return _session is not None
+
+# --- ОТЧЕТЫ ---
+
+def cpu_report(profiler: cProfile.Profile, title: str) -> str:
+    out = io.StringIO()
+    out.write(f'{title}\n\n')
+    stats = pstats.Stats(profiler, stream=out)
+    stats.strip_dirs()
+    out.write(f'=== Топ {TOP_FUNCTIONS} по накопленному времени (cumulative) ===\n')
+    stats.sort_stats('cumulative').print_stats(TOP_FUNCTIONS)
+    out.write(f'\n=== Топ {TOP_FUNCTIONS} по собственному времени (tottime) ===\n')
+    stats.sort_stats('tottime').print_stats(TOP_FUNCTIONS)
+    return out.getvalue()
+
+def memory_report(before, after, title: str) -> str:
+    out = io.StringIO()
+    out.write(f'{title}\n\n')
+    current, peak = tracemalloc.get_traced_memory()
+    out.write(f'Отслеживается сейчас: {current / 1024:.0f} КБ, пик: {peak / 1024:.0f} КБ\n\n')
+    out.write(f'=== Топ {TOP_ALLOCATIONS} изменений по строкам кода ===\n')
+    for stat in after.compare_to(before, 'lineno')[:TOP_ALLOCATIONS]:
+        out.write(f'{stat}\n')
+    out.write(f'\n=== Топ {TOP_ALLOCATIONS} мест выделения памяти (сейчас) ===\n')
+    for stat in after.statistics('lineno')[:TOP_ALLOCATIONS]:
+        out.write(f'{stat}\n')
+    out.write('\n=== Самое крупное место с трассировкой ===\n')
+    top = after.statistics('traceback')[:1]
+    for stat in top:
+        out.write(f'{stat.count} блоков, {stat.size / 1024:.1f} КБ\n')
+        out.write('\n'.join(stat.traceback.format()) + '\n')
+    return out.getvalue()
+
+async def _send_report(context, chat_id: int, text: str, name: str, caption: str, profiler=None):
+    stamp = datetime.now().strftime('%Y%m%d-%H%M%S')
+    await context.bot.send_document(
+        chat_id=chat_id, document=text.encode('utf-8'), filename=f'{name}-{stamp}.txt', caption=caption
+    )
+    if profiler is not None:
+        # Сырые данные в формате pstats.dump_stats - для snakeviz / pstats
+        raw = marshal.dumps(pstats.Stats(profiler).stats)
+        await context.bot.send_document(chat_id=chat_id, document=raw, filename=f'{name}-{stamp}.prof')
+
+# --- УПРАВЛЕНИЕ СЕССИЕЙ ---
+
+async def _count_update(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    session = _session
+    if session is None or session.mode != 'updates':
+        return
+    session.counted += 1
+    if session.counted >= session.limit:
+        await finish(context)
+
+async def _on_timer(context: ContextTypes.DEFAULT_TYPE):
+    # Разовое задание уже выполняется - снимать его с расписания не нужно
+    if _session is not None:
+        _session.job = None
+    await finish(context)
+
+def _start_cpu(context, session: ProfileSession):
+    session.profiler = cProfile.Profile()
+    session.profiler.enable()
+    if session.mode == 'updates':
+        session.handler = TypeHandler(Update, _count_update)
+        context.application.add_handler(session.handler, group=COUNTER_GROUP)
+    else:
+        session.job = context.job_queue.run_once(_on_timer, session.limit)
+
+def _start_memory(context, session: ProfileSession):
+    tracemalloc.start(TRACEMALLOC_FRAMES)
+    session.snapshot = tracemalloc.take_snapshot()
+    session.job = context.job_queue.run_once(_on_timer, session.limit)
+
+async def finish(context: ContextTypes.DEFAULT_TYPE):
+    """Останавливает текущую сессию и отправляет отчет."""
+    global _session
+    session = _session
+    if session is None:
+        return
+    _session = None
+    if session.handler is not None:
+        context.application.remove_handler(session.handler, group=COUNTER_GROUP)
+    if session.job is not None:
+        session.job.schedule_removal()
+    elapsed = time.monotonic() - session.started
+
+    try:
+        if session.profiler is not None:
+            session.profiler.disable()
+            title = f'cProfile: {session.mode}, {elapsed:.1f} с'
+            if session.mode == 'updates':
+                title += f', обновлений: {session.counted}'
+            await _send_report(context, session.chat_id, cpu_report(session.profiler, title), 'profile',
+                               title, session.profiler)
+        elif session.snapshot is not None:
+            after = tracemalloc.take_snapshot()
+            report = memory_report(session.snapshot, after, f'tracemalloc: {elapsed:.1f} с')
+            tracemalloc.stop()
+            await _send_report(context, session.chat_id, report, 'memory', f'Память за {elapsed:.0f} с')
+    except Exception as e:
+        logger.error(f'Не удалось отправить отчет профилирования: {e}', exc_info=True)
+    finally:
+        if tracemalloc.is_tracing() and session.snapshot is not None:
+            tracemalloc.stop()
+
+async def profile_daily(context: ContextTypes.DEFAULT_TYPE, chat_id: int, daily_check):
+    """Один запуск ежедневной проверки под cProfile."""
+    global _session
+    session = _session = ProfileSession('daily', chat_id)
+    session.profiler = cProfile.Profile()
+    session.profiler.enable()
+    try:
+        await daily_check(context)
+    finally:
+        session.profiler.disable()
+        _session = None
+    title = f'cProfile: ежедневная проверка, {time.monotonic() - session.started:.1f} с'
+    await _send_report(context, chat_id, cpu_report(session.profiler, title), 'profile-daily', title, session.profiler)
+
+# --- КОМАНДА ---
+
+USAGE = (
+    'Использование:\n'
+    '/profile updates N - следующие N обновлений\n'
+    '/profile seconds N - N секунд\n'
+    '/profile daily - один запуск ежедневной проверки\n'
+    '/profile memory N - снимки памяти с интервалом N секунд\n'
+    '/profile stop - завершить и получить отчет'
+)
+
+def _parse_limit(args, maximum: int):
+    try:
+        value = int(args[1])
+    except (IndexError, ValueError):
+        return None
+    return value if 0 < value <= maximum else None
+
+async def profile_command(update: Update, context: ContextTypes.DEFAULT_TYPE, daily_check=None):
+    global _session
+    chat_id = update.effective_chat.id
+    if not ADMIN_USER_ID or update.effective_user.id != ADMIN_USER_ID:
+        return
+
+    args = context.args or []
+    mode = args[0] if args else ''
+
+    async def reply(text):
+        await context.bot.send_message(chat_id=chat_id, text=text)
+
+    if mode == 'stop':
+        if _session is None:
+            return await reply('Профилирование не запущено.')
+        return await finish(context)
+
+    if _session is not None:
+        return await reply(f'Уже идет профилирование ({_session.mode}). Остановить: /profile stop')
+
+    if mode == 'daily':
+        if daily_check is None:
+            return await reply('Профилирование ежедневной проверки недоступно.')
+        await reply('Запускаю ежедневную проверку под профилировщиком...')
+        # Отдельной задачей: проверка берет блокировки пользователей, в том числе
+        # администратора, а она удерживается, пока обрабатывается эта команда
+        context.application.create_task(profile_daily(context, chat_id, daily_check), update=update)
+        return
+
+    if mode in ('updates', 'seconds', 'memory'):
+        limit = _parse_limit(args, MAX_UPDATES if mode == 'updates' else MAX_SECONDS)
+        if limit is None:
+            return await reply(USAGE)
+        session = ProfileSession(mode, chat_id, limit)
+        if mode == 'memory':
+            _start_memory(context, session)
+        else:
+            _start_cpu(context, session)
+        _session = session
+        logger.info(f'Профилирование запущено: {mode} {limit}')
+        unit = {'updates': 'обновлений', 'seconds': 'с', 'memory': 'с'}[mode]
+        return await reply(f'Профилирование запущено: {mode}, {limit} {unit}. Остановить досрочно: /profile stop')
+
+    await reply(USAGE)
@@ -0,0 +1,41 @@
+"""
+Фрагменты MarkdownV2 для списков версий (главное меню, ежедневная проверка).
+
+Одни и те же конфигурации отслеживают многие пользователи, и версии на сайте
+меняются редко, поэтому строка версии и блок конфигурации целиком кэшируются
+по своим входным данным: (значок, версия, дата, отметка) и (название, строки).
+Кэши ограничены по размеру (LRU); сообщение собирается склейкой готовых блоков.
+"""
+from functools import lru_cache
+
+from .utils import escape_markdown
+from . import metrics
+
+LINE_CACHE_SIZE = 8192
+BLOCK_CACHE_SIZE = 8192
+
+ICON_LATEST = '🔥'
+ICON_DP = '🛡'
+
+@lru_cache(maxsize=LINE_CACHE_SIZE)
+def version_line(icon: str, version: str, date: str, mark: str) -> str:
+    return f"{icon} `{escape_markdown(version)}` • `{escape_markdown(date)}` {mark}"
+
+@lru_cache(maxsize=BLOCK_CACHE_SIZE)
+def config_block(name: str, lines: tuple) -> str:
+    """Блок конфигурации: название жирным и строки (уже готовые фрагменты) под ним."""
+    return f'*{escape_markdown(name)}*\n' + '\n'.join(lines)
+
+@lru_cache(maxsize=BLOCK_CACHE_SIZE)
+def not_found_block(name: str) -> str:
+    return f'❌ *{escape_markdown(name)}*\n   └ Не найдено\\!'
+
+def _cache_metrics(field):
+    def collect():
+        return {cache.__name__: getattr(cache.cache_info(), field)
+                for cache in (version_line, config_block, not_found_block)}
+    return collect
+
+metrics.gauge('render_cache_hits', 'Фрагменты MarkdownV2, взятые из кэша', ['fragment'], _cache_metrics('hits'))
+metrics.gauge('render_cache_misses', 'Фрагменты MarkdownV2, собранные заново', ['fragment'], _cache_metrics('misses'))
+metrics.gauge('render_cache_size', 'Фрагментов MarkdownV2 в кэше', ['fragment'], _cache_metrics('currsize'))
@@ -1,29 +1,87 @@
 import requests
-import re
-from bs4 import BeautifulSoup
-from .config import LOGIN_1C, PASSWORD_1C
-from .utils import normalize_text, escape_markdown, version_tuple
+import os
+import json
+import threading
+import time
+from urllib.parse import urlparse
+from requests.adapters import HTTPAdapter
+from .config import (
+    LOGIN_1C, PASSWORD_1C, SESSION_FILE, RELEASES_CACHE_TTL, GRAPH_CACHE_DIR, LOGIN_BASE_URL, RELEASES_BASE_URL
+)
+from .utils import escape_markdown, parse_version, latest_version
+from .catalog import ReleaseCatalog
+from .parsing import make_soup, find_all_updates_href, ACTUAL_TABLE, VERSIONS_TABLE
+from .update_graph import GraphStore, parse_versions_table
+from . import metrics, render
 import logging
 
 logger = logging.getLogger(__name__)
 
-# ... (функции login_to_1c и get_releases_soup без изменений) ...
-def login_to_1c():
+LOGIN_URL = LOGIN_BASE_URL + '/login'
+RELEASES_TOTAL_URL = RELEASES_BASE_URL + '/total'
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
+
+# --- МЕТРИКИ (общие для синхронного и асинхронного клиента) ---
+PORTAL_LOGIN = metrics.histogram('portal_login_seconds', 'Вход на портал 1С')
+PORTAL_LOGINS = metrics.counter('portal_logins_total', 'Попытки входа на портал 1С', ['result'])
+PORTAL_REQUEST = metrics.histogram('portal_request_seconds', 'Скачивание страницы портала (с перелогином)', ['page'])
+PORTAL_ERRORS = metrics.counter('portal_request_errors_total', 'Неудачные запросы к порталу', ['page'])
+HTML_PARSE = metrics.histogram('html_parse_seconds', 'Разбор страниц портала и построение каталога', ['table'])
+UPDATE_GRAPHS = metrics.counter('update_graph_lookups_total', 'Графы обновлений: из кэша или с портала', ['source'])
+UPDATE_PATH = metrics.histogram('update_path_seconds', 'Расчет пути обновления целиком')
+
+def page_label(url) -> str:
+    """Вид страницы портала для меток метрик."""
+    url = str(url)
+    if url.startswith(RELEASES_TOTAL_URL):
+        return 'total'
+    if 'allUpdates=true' in url:
+        return 'all_updates'
+    return 'config'
+
+# --- ОБЩАЯ СЕССИЯ ПОРТАЛА ---
+# Одна авторизованная сессия на весь процесс. Обработчики и ежедневная проверка
+# получают её через get_session(), а fetch() сам перелогинивается, если портал
+# перекинул нас на страницу входа.
+_session = None
+_session_lock = threading.Lock()
+_login_generation = 0
+
+def _new_session():
     session = requests.Session()
-    session.headers.update({'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'})
+    session.headers.update({'User-Agent': USER_AGENT})
+    # Синхронная сессия - для инструментов (tools) и замеров, бот ходит на портал через
+    # service_1c_async. Ее могут делить несколько потоков, поэтому пул соединений побольше
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=16)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+def login_payload(content):
+    """Данные формы входа с токеном execution или None, если токена на странице нет."""
+    soup = make_soup(content)
+    execution = soup.find('input', {'name': 'execution'})
+    if not execution: return None
+    return {
+        'username': LOGIN_1C, 'password': PASSWORD_1C, 
+        'execution': execution.get('value'), '_eventId': 'submit', 'rememberMe': 'on'
+    }
+
+def login_to_1c(session=None):
+    with PORTAL_LOGIN.time():
+        session, error = _login(session)
+    PORTAL_LOGINS.inc(result='error' if error else 'ok')
+    return session, error
+
+def _login(session):
+    if session is None:
+        session = _new_session()
     try:
-        LOGIN_URL = 'https://login.1c.ru/login'
         r = session.get(LOGIN_URL)
         r.raise_for_status()
-        soup = BeautifulSoup(r.content, 'html.parser')
-        
-        execution = soup.find('input', {'name': 'execution'})
-        if not execution: return None, 'Ошибка: Не найден токен входа.'
+        payload = login_payload(r.content)
+        if not payload: return None, 'Ошибка: Не найден токен входа.'
             
-        payload = {
-            'username': LOGIN_1C, 'password': PASSWORD_1C, 
-            'execution': execution.get('value'), '_eventId': 'submit', 'rememberMe': 'on'
-        }
         post = session.post(LOGIN_URL, data=payload)
         post.raise_for_status()
         
@@ -33,68 +91,264 @@ def login_to_1c():
     except Exception as e:
         return None, f'Сетевая ошибка: {e}'
 
+def save_cookie_jar(jar):
+    """Сохраняет куки портала на диск (подходит и для requests, и для httpx)."""
+    cookies = [
+        {'name': c.name, 'value': c.value, 'domain': c.domain, 'path': c.path,
+         'expires': c.expires, 'secure': c.secure}
+        for c in jar
+    ]
+    temp_path = SESSION_FILE.with_suffix('.tmp')
+    try:
+        SESSION_FILE.parent.mkdir(exist_ok=True, parents=True)
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(cookies, f, ensure_ascii=False)
+        os.replace(temp_path, SESSION_FILE)
+    except Exception as e:
+        logger.error(f"Не удалось сохранить куки сессии 1С: {e}")
+
+def load_cookie_records() -> list:
+    if not SESSION_FILE.exists():
+        return []
+    try:
+        with open(SESSION_FILE, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except Exception as e:
+        logger.error(f"Не удалось загрузить куки сессии 1С: {e}")
+        return []
+
+def _save_cookies(session):
+    save_cookie_jar(session.cookies)
+
+def _load_cookies(session) -> bool:
+    cookies = load_cookie_records()
+    for c in cookies:
+        session.cookies.set(
+            c['name'], c['value'], domain=c.get('domain', ''), path=c.get('path', '/'),
+            expires=c.get('expires'), secure=c.get('secure', False)
+        )
+    return bool(cookies)
+
+def get_session():
+    """Возвращает общую сессию портала. Логинится только если сессии ещё нет."""
+    global _session, _login_generation
+    with _session_lock:
+        if _session is not None:
+            return _session, None
+
+        session = _new_session()
+        if _load_cookies(session):
+            # Куки могли протухнуть - это выяснится при первом запросе в fetch()
+            logger.info('Сессия 1С восстановлена из сохраненных куки.')
+            _session = session
+            return _session, None
+
+        session, error = login_to_1c(session)
+        if error:
+            return None, error
+        _login_generation += 1
+        _save_cookies(session)
+        _session = session
+        return _session, None
+
+def _relogin(session, seen_generation):
+    """Перелогинивает сессию на месте, если этого ещё не сделал другой поток."""
+    global _login_generation
+    with _session_lock:
+        if _login_generation != seen_generation:
+            return None
+        logger.info('Сессия 1С истекла, выполняю повторный вход...')
+        session.cookies.clear()
+        _, error = login_to_1c(session)
+        if error:
+            return error
+        _login_generation += 1
+        _save_cookies(session)
+        return None
+
+def is_login_url(url) -> bool:
+    """Адрес страницы входа (портал перекидывает туда при истекшей сессии)."""
+    parsed, login = urlparse(str(url)), urlparse(LOGIN_URL)
+    return parsed.netloc == login.netloc and parsed.path.startswith(login.path)
+
+def _is_login_page(response) -> bool:
+    return is_login_url(response.url)
+
+def fetch(session, url, **kwargs):
+    """GET к порталу с прозрачным перелогином при истекшей сессии."""
+    page = page_label(url)
+    try:
+        with PORTAL_REQUEST.time(page=page):
+            return _fetch(session, url, **kwargs)
+    except Exception:
+        PORTAL_ERRORS.inc(page=page)
+        raise
+
+def _fetch(session, url, **kwargs):
+    generation = _login_generation
+    r = session.get(url, **kwargs)
+    if _is_login_page(r):
+        error = _relogin(session, generation)
+        if error:
+            raise requests.RequestException(error)
+        r = session.get(url, **kwargs)
+        if _is_login_page(r):
+            raise requests.RequestException('Портал 1С не принял авторизацию.')
+    r.raise_for_status()
+    return r
+
+# --- КЭШ СТРАНИЦЫ /total ---
+# Страница весит сотни килобайт, а нужна в нескольких местах одного сценария
+# (список версий, целевые версии, путь обновления). Держим одну разобранную
+# копию на интервал TTL, а по его истечении перепроверяем через ETag /
+# If-Modified-Since - если портал ответит 304, страница не скачивается заново.
+class ReleasesSnapshot:
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self.soup = None
+        self.catalog = None
+        self.etag = None
+        self.last_modified = None
+        self.validated_at = 0.0
+        self.hits = 0
+        self.misses = 0
+        self.revalidations = 0
+        self.lock = threading.Lock()
+
+    def is_fresh(self) -> bool:
+        return self.soup is not None and time.monotonic() - self.validated_at < self.ttl
+
+    def conditional_headers(self) -> dict:
+        if self.soup is None:
+            return {}
+        headers = {}
+        if self.etag: headers['If-None-Match'] = self.etag
+        if self.last_modified: headers['If-Modified-Since'] = self.last_modified
+        return headers
+
+    def store(self, soup, headers, catalog=None):
+        self.soup = soup
+        self.catalog = catalog if catalog is not None else ReleaseCatalog.from_soup(soup)
+        self.etag = headers.get('ETag')
+        self.last_modified = headers.get('Last-Modified')
+        self.validated_at = time.monotonic()
+
+    def touch(self):
+        self.validated_at = time.monotonic()
+
+    def stats(self) -> dict:
+        age = time.monotonic() - self.validated_at if self.soup is not None else None
+        return {'hits': self.hits, 'misses': self.misses, 'revalidations': self.revalidations, 'age': age}
+
+_releases_snapshot = ReleasesSnapshot(RELEASES_CACHE_TTL)
+
 def get_releases_soup(session):
+    snapshot = _releases_snapshot
     try:
-        r = session.get('https://releases.1c.ru/total')
-        r.raise_for_status()
-        return BeautifulSoup(r.content, 'html.parser'), None
+        # Под замком: параллельные запросы дождутся одной загрузки, а не скачают страницу каждый
+        with snapshot.lock:
+            if snapshot.is_fresh():
+                snapshot.hits += 1
+                return snapshot.soup, None
+
+            r = fetch(session, RELEASES_TOTAL_URL, headers=snapshot.conditional_headers())
+            if r.status_code == 304:
+                snapshot.revalidations += 1
+                snapshot.touch()
+                return snapshot.soup, None
+
+            snapshot.misses += 1
+            with HTML_PARSE.time(table='actual'):
+                soup = make_soup(r.content, ACTUAL_TABLE)
+            with HTML_PARSE.time(table='catalog'):
+                catalog = ReleaseCatalog.from_soup(soup)
+            snapshot.store(soup, r.headers, catalog)
+            return snapshot.soup, None
     except Exception as e:
         return None, f'Ошибка получения релизов: {e}'
 
+def releases_cache_stats() -> dict:
+    """Счетчики кэша /total: попадания, загрузки, ответы 304 и возраст копии в секундах."""
+    return _releases_snapshot.stats()
+
+# Клиент ('sync', 'async') -> функция, возвращающая его текущий снимок /total
+_snapshot_sources = {'sync': lambda: _releases_snapshot}
+
+def register_releases_snapshot(client: str, get_snapshot):
+    _snapshot_sources[client] = get_snapshot
+
+def _releases_cache_metrics(field):
+    def collect():
+        values = {}
+        for client, get_snapshot in _snapshot_sources.items():
+            stats = get_snapshot().stats()
+            values[client] = stats[field] if field != 'hit_ratio' else \
+                metrics.ratio(stats['hits'] + stats['revalidations'], stats['misses'])
+        return values
+    return collect
+
+metrics.gauge('releases_cache_hits', 'Ответы из кэша /total без запроса', ['client'], _releases_cache_metrics('hits'))
+metrics.gauge('releases_cache_misses', 'Загрузки /total целиком', ['client'], _releases_cache_metrics('misses'))
+metrics.gauge('releases_cache_revalidations', 'Перепроверки /total с ответом 304', ['client'], _releases_cache_metrics('revalidations'))
+metrics.gauge('releases_cache_hit_ratio', 'Доля запросов /total без скачивания страницы', ['client'], _releases_cache_metrics('hit_ratio'))
+
+def get_release_catalog(session):
+    """Индекс таблицы actualTable для текущего снимка /total (строится один раз на снимок)."""
+    soup, error = get_releases_soup(session)
+    if error:
+        return None, error
+    if _releases_snapshot.catalog is None:
+        return None, 'Не удалось найти таблицу релизов на главной странице.'
+    return _releases_snapshot.catalog, None
+
 def parse_versions_from_soup(soup, configs_data: list):
+    catalog = ReleaseCatalog.from_soup(soup)
+    if catalog is None: return ('Ошибка таблицы.', configs_data.copy())
+    return parse_versions(catalog, configs_data)
+
+def parse_versions(catalog: ReleaseCatalog, configs_data: list):
+    current = extract_current_versions(catalog, (c['name'] for c in configs_data))
+    return render_versions(current, configs_data)
+
+def extract_current_versions(catalog: ReleaseCatalog, config_names) -> dict:
+    """
+    Этап 1 проверки версий: для каждого различного названия один раз находит строку
+    каталога и берет самую новую версию и версию на ДП как (версия, дата).
+    Не найденные на сайте конфигурации получают None.
+    """
+    current = {}
+    for name in config_names:
+        if name in current: continue
+        entry = catalog.lookup(name)
+        if not entry:
+            current[name] = None
+            continue
+
+        found_versions = entry.versions or []
+        latest_obj = found_versions[0] if found_versions else None
+        dp_obj = next((v for v in found_versions if v['is_dp']), None)
+        current[name] = {
+            'latest': (latest_obj['ver'], latest_obj['date']) if latest_obj else None,
+            'dp': (dp_obj['ver'], dp_obj['date']) if dp_obj else None,
+        }
+    return current
+
+def render_versions(current: dict, configs_data: list):
+    """
+    Этап 2: сверяет версии из этапа 1 с сохраненными у пользователя, помечает
+    изменения и собирает текст из кэшированных фрагментов render. Дешевый - ничего
+    не ищет и почти ничего не экранирует.
+    """
     results_text = []
     updated_configs = configs_data.copy()
-    table = soup.find('table', id='actualTable')
-    if not table: return ('Ошибка таблицы.', updated_configs)
-
-    site_configs = {}
-    for row in table.find_all('tr'):
-        name_cell = row.find('td', class_='nameColumn')
-        if name_cell:
-            raw_name = name_cell.get_text(separator=' ', strip=True)
-            site_configs[normalize_text(raw_name)] = row
 
     for i, config in enumerate(updated_configs):
-        norm_name = normalize_text(config['name'])
-        found_row = site_configs.get(norm_name)
+        found = current.get(config['name'])
         
-        if not found_row:
-            for k, v in site_configs.items():
-                if norm_name in k and len(k) - len(norm_name) < 5:
-                    found_row = v; break
-        
-        safe_name = escape_markdown(config['name'])
-        if not found_row:
-            results_text.append(f'❌ *{safe_name}*\n   └ Не найдено\\!')
+        if not found:
+            results_text.append(render.not_found_block(config['name']))
             continue
 
-        ver_cell = found_row.find('td', class_='versionColumn')
-        date_cell = ver_cell.find_next_sibling('td')
-        
-        all_a = ver_cell.find_all('a')
-        all_dates = list(date_cell.stripped_strings)
-        
-        found_versions = [] 
-
-        if not all_a:
-            v_text = ver_cell.get_text(strip=True)
-            d_text = date_cell.get_text(strip=True)
-            found_versions.append({'ver': v_text, 'date': d_text, 'is_dp': False})
-        else:
-            for idx, a_tag in enumerate(all_a):
-                v_text = a_tag.get_text(strip=True)
-                d_text = all_dates[idx] if idx < len(all_dates) else "н/д"
-                
-                is_dp = False
-                nxt = a_tag.find_next_sibling()
-                if nxt and nxt.name == 'sup' and nxt.find('abbr', title=re.compile('Длительная')):
-                    is_dp = True
-                
-                found_versions.append({'ver': v_text, 'date': d_text, 'is_dp': is_dp})
-
-        latest_obj = found_versions[0] if found_versions else None
-        dp_obj = next((v for v in found_versions if v['is_dp']), None)
-
         track_type = config.get('track_type', 'latest')
         last_ver_saved = config.get('last_version', '')
         
@@ -109,8 +363,7 @@ def parse_versions_from_soup(soup, configs_data: list):
             old_dp = old_parts[1] if len(old_parts) > 1 else ''
 
             # --- NEW ---
-            curr_new_ver = latest_obj['ver'] if latest_obj else "Нет"
-            curr_new_date = latest_obj['date'] if latest_obj else "-"
+            curr_new_ver, curr_new_date = found['latest'] or ("Нет", "-")
             
             mark_new = "✅"
             if not old_new: mark_new = "🆕"
@@ -118,11 +371,10 @@ def parse_versions_from_soup(soup, configs_data: list):
                 mark_new = "⚡️"
                 has_changes = True
             
-            display_lines.append(f"🔥 `{escape_markdown(curr_new_ver)}` • `{escape_markdown(curr_new_date)}` {mark_new}")
+            display_lines.append(render.version_line(render.ICON_LATEST, curr_new_ver, curr_new_date, mark_new))
 
             # --- DP ---
-            curr_dp_ver = dp_obj['ver'] if dp_obj else "Нет"
-            curr_dp_date = dp_obj['date'] if dp_obj else "-"
+            curr_dp_ver, curr_dp_date = found['dp'] or ("Нет", "-")
             
             mark_dp = "✅"
             if not old_dp: mark_dp = "🆕"
@@ -130,25 +382,24 @@ def parse_versions_from_soup(soup, configs_data: list):
                 mark_dp = "⚡️"
                 has_changes = True
             
-            display_lines.append(f"🛡 `{escape_markdown(curr_dp_ver)}` • `{escape_markdown(curr_dp_date)}` {mark_dp}")
+            display_lines.append(render.version_line(render.ICON_DP, curr_dp_ver, curr_dp_date, mark_dp))
 
             save_ver = f"{curr_new_ver}|{curr_dp_ver}"
             save_date = f"{curr_new_date}|{curr_dp_date}"
 
         else:
             # --- SINGLE MODE ---
-            target_obj = None
-            icon = "🔥"
+            target = None
+            icon = render.ICON_LATEST
             
             if track_type == 'dp':
-                target_obj = dp_obj if dp_obj else latest_obj
-                icon = "🛡"
+                target = found['dp'] or found['latest']
+                icon = render.ICON_DP
             else:
-                target_obj = latest_obj
-                icon = "🔥"
+                target = found['latest']
+                icon = render.ICON_LATEST
 
-            curr_ver = target_obj['ver'] if target_obj else "Нет данных"
-            curr_date = target_obj['date'] if target_obj else "-"
+            curr_ver, curr_date = target or ("Нет данных", "-")
             
             mark = "✅"
             if not last_ver_saved: mark = "🆕"
@@ -156,7 +407,7 @@ def parse_versions_from_soup(soup, configs_data: list):
                 mark = "⚡️"
                 has_changes = True
             
-            display_lines.append(f"{icon} `{escape_markdown(curr_ver)}` • `{escape_markdown(curr_date)}` {mark}")
+            display_lines.append(render.version_line(icon, curr_ver, curr_date, mark))
             
             save_ver = curr_ver
             save_date = curr_date
@@ -167,179 +418,238 @@ def parse_versions_from_soup(soup, configs_data: list):
         if has_changes:
             updated_configs[i]['is_new'] = True
         
-        block_text = f'*{safe_name}*\n' + '\n'.join(display_lines)
-        results_text.append(block_text)
+        results_text.append(render.config_block(config['name'], tuple(display_lines)))
 
     return ('\n\n'.join(results_text), updated_configs)
 
-# ... (остальные функции без изменений) ...
-def get_target_versions(session: requests.Session, config_name: str) -> tuple:
-    try:
-        RELEASES_URL = 'https://releases.1c.ru/total'
-        releases_response = session.get(RELEASES_URL)
-        releases_response.raise_for_status()
-        releases_soup = BeautifulSoup(releases_response.content, 'html.parser')
-        
-        table = releases_soup.find('table', id='actualTable')
-        if not table:
-            return (None, 'Не удалось найти таблицу релизов на главной странице\\.')
-            
-        normalized_user_name = normalize_text(config_name)
-        all_rows = table.find_all('tr')
+def entry_targets(entry) -> tuple:
+    """
+    Последние версии конфигурации на ДП и не на ДП по строке каталога.
+    Ошибка - обычным текстом, экранирует ее тот, кто собирает сообщение.
+    """
+    if entry.versions is None:
+        return (None, 'Не удалось найти ячейку с версиями для этой конфигурации.')
         
-        found_row = None
-        for row in all_rows:
-            name_cell = row.find('td', class_='nameColumn')
-            if name_cell:
-                site_name = normalize_text(name_cell.get_text(separator=' ', strip=True))
-                if site_name == normalized_user_name:
-                    found_row = row
-                    break
-                if normalized_user_name in site_name and len(site_name) - len(normalized_user_name) < 5:
-                    found_row = row
-                    break
-        
-        if not found_row:
-            return (None, f'Конфигурация \'{escape_markdown(config_name)}\' не найдена на сайте 1С\\. Проверьте название\\.')
-            
-        version_cell = found_row.find('td', class_='versionColumn')
-        if not version_cell:
-            return (None, 'Не удалось найти ячейку с версиями для этой конфигурации\\.')
+    dp_versions = []
+    non_dp_versions = []
+    
+    for v in entry.versions:
+        if not v['ver']: continue
+        if parse_version(v['ver']) is None:
+            # Раньше такая строка считалась версией 0 - теперь просто не участвует в выборе
+            logger.warning(f"Нераспознанная версия '{v['ver']}' у конфигурации '{entry.name}'")
+            continue
+        if v['is_dp']:
+            dp_versions.append(v['ver'])
+        else:
+            non_dp_versions.append(v['ver'])
             
-        all_a_tags = version_cell.find_all('a')
+    latest_dp = latest_version(dp_versions)
+    latest_non_dp = latest_version(non_dp_versions)
+    
+    if not latest_dp and not latest_non_dp:
+        return (None, 'Не удалось определить ни одной актуальной версии.')
         
-        if not all_a_tags:
-            single_version = version_cell.get_text(strip=True)
-            if not single_version:
-                return (None, 'Не удалось извлечь единственную версию.')
-            return ({'dp': single_version, 'non_dp': single_version}, None)
-            
-        dp_versions = []
-        non_dp_versions = []
+    if not latest_dp: latest_dp = latest_non_dp
+    if not latest_non_dp: latest_non_dp = latest_dp
         
-        for a_tag in all_a_tags:
-            v_text = a_tag.get_text(strip=True)
-            next_sibling = a_tag.find_next_sibling()
-            is_dp = False
-            if next_sibling and next_sibling.name == 'sup':
-                if next_sibling.find('abbr', title=re.compile('Длительная поддержка')):
-                    is_dp = True
-            
-            if is_dp:
-                dp_versions.append(v_text)
-            else:
-                non_dp_versions.append(v_text)
-                
-        latest_dp = max(dp_versions, key=version_tuple) if dp_versions else None
-        latest_non_dp = max(non_dp_versions, key=version_tuple) if non_dp_versions else None
-        
-        if not latest_dp and not latest_non_dp:
-            return (None, 'Не удалось определить ни одной актуальной версии.')
+    return ({'dp': latest_dp, 'non_dp': latest_non_dp}, None)
+
+def choose_target(current_version: str, dp_target: str, non_dp_target: str) -> tuple:
+    """Цель расчета: версия на ДП, а если текущая уже новее нее - версия не на ДП."""
+    current, dp = parse_version(current_version), parse_version(dp_target)
+    # Нераспознанная текущая версия не может быть новее ДП - считаем до версии на ДП
+    if current is not None and dp is not None and current > dp:
+        return non_dp_target, True
+    return dp_target, False
+
+def get_target_versions(session: requests.Session, config_name: str) -> tuple:
+    try:
+        catalog, error = get_release_catalog(session)
+        if error:
+            return (None, escape_markdown(error))
             
-        if not latest_dp: latest_dp = latest_non_dp
-        if not latest_non_dp: latest_non_dp = latest_dp
+        entry = catalog.lookup(config_name)
+        if not entry:
+            return (None, f'Конфигурация \'{escape_markdown(config_name)}\' не найдена на сайте 1С\\. Проверьте название\\.')
             
-        return ({'dp': latest_dp, 'non_dp': latest_non_dp}, None)
+        targets, error = entry_targets(entry)
+        return (targets, escape_markdown(error) if error else None)
 
     except Exception as e:
         logger.error(f'Ошибка при получении целевых версий для \'{config_name}\': {e}', exc_info=True)
         return (None, f'Произошла ошибка при получении актуальных версий: {escape_markdown(str(e))}')
 
+_graph_store = GraphStore(GRAPH_CACHE_DIR)
+# Сколько версий цепочки обновлений показывать в ответе
+MAX_CHAIN_SHOWN = 24
+
+VERSIONS_TABLE_MISSING = 'Не удалось найти таблицу с историей обновлений на странице конфигурации.'
+
+def all_updates_page_url(entry, config_page_content: bytes):
+    """Адрес полной истории (?allUpdates=true), если она вынесена на отдельную страницу."""
+    all_updates_href = find_all_updates_href(config_page_content)
+    if not all_updates_href:
+        return None
+    return RELEASES_BASE_URL + entry.href.split('?')[0] + all_updates_href
+
+def graph_if_current(entry):
+    """Граф из кэша, если он покрывает все версии из снимка /total, иначе None."""
+    graph = _graph_store.get(entry.href)
+    if graph is not None and graph.is_current(site_versions(entry)):
+        return graph
+    return None
+
+def site_versions(entry) -> list:
+    return [v['ver'] for v in entry.versions or [] if v['ver']]
+
+def store_graph_rows(entry, rows):
+    """Вливает свежие строки versionsTable в кэш графа конфигурации."""
+    return _graph_store.update(entry.href, rows, site_versions(entry))
+
+def get_update_graph(session: requests.Session, entry):
+    """
+    Граф обновлений конфигурации из кэша. Страницы конфигурации скачиваются,
+    только если в снимке /total появилась версия, которой в графе еще нет.
+    """
+    graph = graph_if_current(entry)
+    if graph is not None:
+        UPDATE_GRAPHS.inc(source='cache')
+        return graph, None
+    UPDATE_GRAPHS.inc(source='portal')
+
+    config_page_url = RELEASES_BASE_URL + entry.href
+    updates_content = fetch(session, config_page_url).content
+    
+    all_updates_url = all_updates_page_url(entry, updates_content)
+    if all_updates_url:
+        updates_content = fetch(session, all_updates_url).content
+
+    with HTML_PARSE.time(table='versions'):
+        rows = parse_versions_table(make_soup(updates_content, VERSIONS_TABLE))
+    if rows is None:
+        return None, VERSIONS_TABLE_MISSING
+
+    return store_graph_rows(entry, rows), None
+
+def update_path_message(start_version: str, dp_target: str, actual_target: str, above_dp: bool, chain) -> str:
+    """Текст ответа о пути обновления (MarkdownV2)."""
+    current_version = start_version.strip()
+    message_prefix = ''
+
+    if above_dp:
+        message_prefix = f'Ваша версия `{escape_markdown(current_version)}` новее версии на ДП `{escape_markdown(dp_target)}`\\. Расчет выполняется до версии не на длительной поддержке\\.\n\n'
+
+    if current_version == actual_target:
+        return message_prefix + f'Ваша версия `{escape_markdown(start_version)}` уже является целевой (`{escape_markdown(actual_target)}`).'
+
+    if chain is None:
+        return message_prefix + f'Не удалось найти ни одного шага обновления с версии `{escape_markdown(start_version)}`\\.'
+
+    count = len(chain) - 1
+    shown = [f'`{escape_markdown(v)}`' for v in chain]
+    if len(shown) > MAX_CHAIN_SHOWN:
+        # Длинную цепочку сокращаем, чтобы не упереться в лимит длины сообщения
+        half = MAX_CHAIN_SHOWN // 2
+        shown = shown[:half] + ['…'] + shown[-half:]
+    chain_text = ' → '.join(shown)
+    return (message_prefix + f'От версии `{escape_markdown(start_version)}` до цели `{escape_markdown(actual_target)}` необходимо выполнить *{count}* обновлений\\.'
+            f'\n\nЦепочка: {chain_text}')
+
+def config_not_found_message(config_name: str) -> str:
+    return f'Не удалось найти конфигурацию с названием "{escape_markdown(config_name)}" на сайте 1С. Проверьте точность названия.'
+
 def find_update_path(session: requests.Session, config_name: str, start_version: str, dp_target: str, non_dp_target: str) -> str:
+    with UPDATE_PATH.time():
+        return _find_update_path(session, config_name, start_version, dp_target, non_dp_target)
+
+def _find_update_path(session, config_name, start_version, dp_target, non_dp_target) -> str:
     try:
-        RELEASES_URL = 'https://releases.1c.ru/total'
-        releases_response = session.get(RELEASES_URL)
-        releases_response.raise_for_status()
-        releases_soup = BeautifulSoup(releases_response.content, 'html.parser')
+        catalog, error = get_release_catalog(session)
+        if error:
+            return escape_markdown(error)
         
-        config_link_tag = releases_soup.find('a', string=re.compile(re.escape(config_name), re.IGNORECASE))
-        if not config_link_tag or not config_link_tag.has_attr('href'):
-            return f'Не удалось найти конфигурацию с названием "{escape_markdown(config_name)}" на сайте 1С. Проверьте точность названия.'
+        entry = catalog.lookup(config_name) or catalog.search(config_name)
+        if not entry or not entry.href:
+            return config_not_found_message(config_name)
 
-        config_page_url = 'https://releases.1c.ru' + config_link_tag['href']
-        config_page_response = session.get(config_page_url)
-        config_page_response.raise_for_status()
-        
-        initial_soup = BeautifulSoup(config_page_response.content, 'html.parser')
-        updates_soup = initial_soup
-        
-        all_updates_link_tag = initial_soup.find('a', href=re.compile(r'\?allUpdates=true'))
-        if all_updates_link_tag:
-            base_url = 'https://releases.1c.ru'
-            relative_url = config_link_tag['href'].split('?')[0] + all_updates_link_tag['href']
-            all_updates_url = base_url + relative_url
-            updates_response = session.get(all_updates_url)
-            updates_response.raise_for_status()
-            updates_soup = BeautifulSoup(updates_response.content, 'html.parser')
-
-        updates_table = updates_soup.find('table', id='versionsTable')
-        if not updates_table:
-            return 'Не удалось найти таблицу с историей обновлений на странице конфигурации.'
-
-        rows = updates_table.find_all('tr')[1:]
         current_version = start_version.strip()
-        actual_target = dp_target
-        message_prefix = ''
-
-        if version_tuple(current_version) > version_tuple(dp_target):
-            actual_target = non_dp_target
-            message_prefix = f'Ваша версия `{escape_markdown(current_version)}` новее версии на ДП `{escape_markdown(dp_target)}`\\. Расчет выполняется до версии не на длительной поддержке\\.\n\n'
-
+        actual_target, above_dp = choose_target(current_version, dp_target, non_dp_target)
         if current_version == actual_target:
-            return message_prefix + f'Ваша версия `{escape_markdown(start_version)}` уже является целевой (`{escape_markdown(actual_target)}`).'
-
-        predecessors = {}
-        transitions = {} 
+            return update_path_message(start_version, dp_target, actual_target, above_dp, None)
 
-        for row in rows:
-            cols = row.find_all('td')
-            if len(cols) < 3: continue
-            to_version = cols[0].get_text(strip=True)
-            from_versions = [v.strip() for v in cols[2].get_text(strip=True).split(',')]
-            is_dp = bool(row.find('small', string='ДП'))
+        graph, error = get_update_graph(session, entry)
+        if error:
+            return error
 
-            predecessors[to_version] = from_versions
-            
-            for fv in from_versions:
-                if fv not in transitions:
-                    transitions[fv] = []
-                transitions[fv].append({'version': to_version, 'is_dp': is_dp})
-
-        reachable_versions = {actual_target}
-        queue = [actual_target]
-        while queue:
-            curr = queue.pop(0)
-            if curr in predecessors:
-                for prev_ver in predecessors[curr]:
-                    if prev_ver not in reachable_versions:
-                        reachable_versions.add(prev_ver)
-                        queue.append(prev_ver)
-
-        count = 0
-        max_steps = 100
-        
-        while current_version != actual_target and count < max_steps:
-            possible_next_steps = transitions.get(current_version, [])
-            valid_steps = [step for step in possible_next_steps if step['version'] in reachable_versions]
-
-            if not valid_steps:
-                if count > 0:
-                    return message_prefix + f'Пройдено *{count}* обновлений до версии `{escape_markdown(current_version)}`\\. Дальнейший шаг обновления не найден\\.'
-                return message_prefix + f'Не удалось найти ни одного шага обновления с версии `{escape_markdown(start_version)}`\\.'
-
-            chosen_step = max(valid_steps, key=lambda x: version_tuple(x['version']))
-
-            current_version = chosen_step['version']
-            count += 1
-
-        if current_version != actual_target:
-             return message_prefix + f'Не удалось построить полный маршрут. Прервано на версии `{escape_markdown(current_version)}`.'
-
-        return message_prefix + f'От версии `{escape_markdown(start_version)}` до цели `{escape_markdown(actual_target)}` необходимо выполнить *{count}* обновлений\\.'
+        chain = graph.distance_table(actual_target).path(current_version)
+        return update_path_message(start_version, dp_target, actual_target, above_dp, chain)
 
     except requests.RequestException as e:
         logger.error(f'Сетевая ошибка при подсчете обновлений: {e}')
         return f'Произошла сетевая ошибка: {escape_markdown(str(e))}'
     except Exception as e:
         logger.error(f'Непредвиденная ошибка при подсчете обновлений: {e}', exc_info=True)
-        return f'Произошла непредвиденная ошибка: {escape_markdown(str(e))}'
\ No newline at end of file
+        return f'Произошла непредвиденная ошибка: {escape_markdown(str(e))}'
+
+def group_batch(catalog, pairs: list) -> tuple:
+    """
+    Заготовка пакетного расчета: по словарю результата на каждую пару и группы
+    {href: (строка каталога, [результаты])} для найденных конфигураций.
+    """
+    results = [{'config': name, 'version': version.strip(), 'target': None, 'steps': None, 'chain': None, 'error': None}
+               for name, version in pairs]
+    groups = {}
+    if catalog is None:
+        return results, groups
+    for r in results:
+        entry = catalog.lookup(r['config']) or catalog.search(r['config'])
+        if not entry or not entry.href:
+            r['error'] = 'Конфигурация не найдена на сайте 1С'
+            continue
+        groups.setdefault(entry.href, (entry, []))[1].append(r)
+    return results, groups
+
+def fill_batch_group(entry, group: list, graph, error):
+    """Считает пути для всех баз одной конфигурации по уже полученному графу."""
+    targets = None
+    if not error:
+        targets, error = entry_targets(entry)
+    if error:
+        for r in group: r['error'] = error
+        return
+
+    for r in group:
+        target, _ = choose_target(r['version'], targets['dp'], targets['non_dp'])
+        r['target'] = target
+        chain = graph.distance_table(target).path(r['version'])
+        if chain is None:
+            r['error'] = 'Путь обновления не найден'
+            continue
+        r['chain'] = chain
+        r['steps'] = len(chain) - 1
+
+def find_update_paths_batch(session: requests.Session, pairs: list) -> list:
+    """
+    Пакетный расчет для списка (конфигурация, установленная версия).
+    Строки группируются по конфигурации: каталог, целевые версии и граф
+    берутся один раз на конфигурацию, а таблица расстояний - один раз на цель.
+    Возвращает по словарю на каждую пару в исходном порядке:
+    {'config', 'version', 'target', 'steps', 'chain', 'error'}; ошибки - обычным текстом.
+    """
+    catalog, error = get_release_catalog(session)
+    results, groups = group_batch(catalog, pairs)
+    if error:
+        for r in results: r['error'] = error
+        return results
+
+    for entry, group in groups.values():
+        graph, error = None, None
+        try:
+            graph, error = get_update_graph(session, entry)
+        except requests.RequestException as e:
+            logger.error(f'Сетевая ошибка при пакетном подсчете для {entry.href}: {e}')
+            error = f'Сетевая ошибка: {e}'
+        fill_batch_group(entry, group, graph, error)
+
+    return results
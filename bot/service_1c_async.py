@@ -0,0 +1,279 @@
+"""
+Асинхронный клиент портала 1С на httpx для обработчиков бота.
+
+Повторяет API service_1c, но не занимает потоки: один AsyncClient с пулом
+keep-alive соединений, ограничение числа одновременных запросов и таймауты.
+Разбор HTML выполняется в отдельном небольшом пуле потоков, а не в общем
+пуле asyncio.to_thread. Кэш графов обновлений общий с service_1c.
+"""
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+import httpx
+
+from .config import RELEASES_CACHE_TTL, HTTP_TIMEOUT, HTTP_CONCURRENCY
+from .utils import escape_markdown
+from .catalog import ReleaseCatalog
+from .parsing import make_soup, ACTUAL_TABLE, VERSIONS_TABLE
+from .update_graph import parse_versions_table
+from . import service_1c
+from .service_1c import (
+    LOGIN_URL, RELEASES_BASE_URL, RELEASES_TOTAL_URL, USER_AGENT, VERSIONS_TABLE_MISSING,
+    ReleasesSnapshot, entry_targets, choose_target, update_path_message, config_not_found_message,
+    group_batch, fill_batch_group, page_label,
+    PORTAL_LOGIN, PORTAL_LOGINS, PORTAL_REQUEST, PORTAL_ERRORS, HTML_PARSE, UPDATE_GRAPHS, UPDATE_PATH
+)
+
+logger = logging.getLogger(__name__)
+
+_worker_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='portal-worker')
+
+_client = None
+_client_lock = asyncio.Lock()
+_request_slots = asyncio.Semaphore(HTTP_CONCURRENCY)
+_login_generation = 0
+
+_releases_snapshot = ReleasesSnapshot(RELEASES_CACHE_TTL)
+_snapshot_lock = asyncio.Lock()
+service_1c.register_releases_snapshot('async', lambda: _releases_snapshot)
+
+async def _in_worker(func, *args):
+    """Разбор HTML и работа с кэшем графов на диске - вне event loop."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_worker_executor, func, *args)
+
+def _new_client():
+    return httpx.AsyncClient(
+        headers={'User-Agent': USER_AGENT},
+        timeout=httpx.Timeout(HTTP_TIMEOUT),
+        limits=httpx.Limits(max_connections=HTTP_CONCURRENCY, max_keepalive_connections=HTTP_CONCURRENCY),
+        follow_redirects=True,
+    )
+
+async def _request(client, method, url, **kwargs):
+    async with _request_slots:
+        return await client.request(method, url, **kwargs)
+
+async def login_to_1c(client=None):
+    with PORTAL_LOGIN.time():
+        client, error = await _login(client)
+    PORTAL_LOGINS.inc(result='error' if error else 'ok')
+    return client, error
+
+async def _login(client):
+    if client is None:
+        client = _new_client()
+    try:
+        r = await _request(client, 'GET', LOGIN_URL)
+        r.raise_for_status()
+        payload = await _in_worker(service_1c.login_payload, r.content)
+        if not payload: return None, 'Ошибка: Не найден токен входа.'
+
+        post = await _request(client, 'POST', LOGIN_URL, data=payload)
+        post.raise_for_status()
+
+        if 'Неверный логин или пароль' in post.text:
+            return None, 'Ошибка: Неверный логин или пароль.'
+        return client, None
+    except Exception as e:
+        return None, f'Сетевая ошибка: {e}'
+
+async def get_session():
+    """Общий авторизованный клиент портала. Логинится только если клиента ещё нет."""
+    global _client, _login_generation
+    async with _client_lock:
+        if _client is not None:
+            return _client, None
+
+        client = _new_client()
+        cookies = service_1c.load_cookie_records()
+        if cookies:
+            for c in cookies:
+                client.cookies.set(c['name'], c['value'], domain=c.get('domain', ''), path=c.get('path', '/'))
+            logger.info('Сессия 1С восстановлена из сохраненных куки.')
+            _client = client
+            return _client, None
+
+        _, error = await login_to_1c(client)
+        if error:
+            await client.aclose()
+            return None, error
+        _login_generation += 1
+        service_1c.save_cookie_jar(client.cookies.jar)
+        _client = client
+        return _client, None
+
+async def _relogin(client, seen_generation):
+    global _login_generation
+    async with _client_lock:
+        if _login_generation != seen_generation:
+            return None
+        logger.info('Сессия 1С истекла, выполняю повторный вход...')
+        client.cookies.clear()
+        _, error = await login_to_1c(client)
+        if error:
+            return error
+        _login_generation += 1
+        service_1c.save_cookie_jar(client.cookies.jar)
+        return None
+
+def _is_login_page(response) -> bool:
+    return service_1c.is_login_url(response.url)
+
+async def fetch(client, url, **kwargs):
+    """GET к порталу с прозрачным перелогином при истекшей сессии."""
+    page = page_label(url)
+    try:
+        with PORTAL_REQUEST.time(page=page):
+            return await _fetch(client, url, **kwargs)
+    except Exception:
+        PORTAL_ERRORS.inc(page=page)
+        raise
+
+async def _fetch(client, url, **kwargs):
+    generation = _login_generation
+    r = await _request(client, 'GET', url, **kwargs)
+    if _is_login_page(r):
+        error = await _relogin(client, generation)
+        if error:
+            raise httpx.HTTPError(error)
+        r = await _request(client, 'GET', url, **kwargs)
+        if _is_login_page(r):
+            raise httpx.HTTPError('Портал 1С не принял авторизацию.')
+    # httpx считает ошибкой любой не-2xx ответ, а 304 для нас - нормальный исход
+    if r.status_code != 304:
+        r.raise_for_status()
+    return r
+
+async def close():
+    """Закрывает клиент при остановке бота, сохранив куки."""
+    global _client
+    if _client is not None:
+        service_1c.save_cookie_jar(_client.cookies.jar)
+        await _client.aclose()
+        _client = None
+
+async def get_releases_soup(client):
+    snapshot = _releases_snapshot
+    try:
+        async with _snapshot_lock:
+            if snapshot.is_fresh():
+                snapshot.hits += 1
+                return snapshot.soup, None
+
+            r = await fetch(client, RELEASES_TOTAL_URL, headers=snapshot.conditional_headers())
+            if r.status_code == 304:
+                snapshot.revalidations += 1
+                snapshot.touch()
+                return snapshot.soup, None
+
+            with HTML_PARSE.time(table='actual'):
+                soup = await _in_worker(make_soup, r.content, ACTUAL_TABLE)
+            with HTML_PARSE.time(table='catalog'):
+                catalog = await _in_worker(ReleaseCatalog.from_soup, soup)
+            snapshot.misses += 1
+            snapshot.store(soup, r.headers, catalog)
+            return snapshot.soup, None
+    except Exception as e:
+        return None, f'Ошибка получения релизов: {e}'
+
+def releases_cache_stats() -> dict:
+    return _releases_snapshot.stats()
+
+async def get_release_catalog(client):
+    soup, error = await get_releases_soup(client)
+    if error:
+        return None, error
+    if _releases_snapshot.catalog is None:
+        return None, 'Не удалось найти таблицу релизов на главной странице.'
+    return _releases_snapshot.catalog, None
+
+async def get_target_versions(client, config_name: str) -> tuple:
+    try:
+        catalog, error = await get_release_catalog(client)
+        if error:
+            return (None, escape_markdown(error))
+
+        entry = catalog.lookup(config_name)
+        if not entry:
+            return (None, f'Конфигурация \'{escape_markdown(config_name)}\' не найдена на сайте 1С\\. Проверьте название\\.')
+
+        targets, error = entry_targets(entry)
+        return (targets, escape_markdown(error) if error else None)
+
+    except Exception as e:
+        logger.error(f'Ошибка при получении целевых версий для \'{config_name}\': {e}', exc_info=True)
+        return (None, f'Произошла ошибка при получении актуальных версий: {escape_markdown(str(e))}')
+
+async def get_update_graph(client, entry):
+    graph = await _in_worker(service_1c.graph_if_current, entry)
+    if graph is not None:
+        UPDATE_GRAPHS.inc(source='cache')
+        return graph, None
+    UPDATE_GRAPHS.inc(source='portal')
+
+    updates_content = (await fetch(client, RELEASES_BASE_URL + entry.href)).content
+
+    all_updates_url = service_1c.all_updates_page_url(entry, updates_content)
+    if all_updates_url:
+        updates_content = (await fetch(client, all_updates_url)).content
+
+    with HTML_PARSE.time(table='versions'):
+        rows = await _in_worker(lambda: parse_versions_table(make_soup(updates_content, VERSIONS_TABLE)))
+    if rows is None:
+        return None, VERSIONS_TABLE_MISSING
+
+    return await _in_worker(service_1c.store_graph_rows, entry, rows), None
+
+async def find_update_path(client, config_name: str, start_version: str, dp_target: str, non_dp_target: str) -> str:
+    with UPDATE_PATH.time():
+        return await _find_update_path(client, config_name, start_version, dp_target, non_dp_target)
+
+async def _find_update_path(client, config_name, start_version, dp_target, non_dp_target) -> str:
+    try:
+        catalog, error = await get_release_catalog(client)
+        if error:
+            return escape_markdown(error)
+
+        entry = catalog.lookup(config_name) or catalog.search(config_name)
+        if not entry or not entry.href:
+            return config_not_found_message(config_name)
+
+        current_version = start_version.strip()
+        actual_target, above_dp = choose_target(current_version, dp_target, non_dp_target)
+        if current_version == actual_target:
+            return update_path_message(start_version, dp_target, actual_target, above_dp, None)
+
+        graph, error = await get_update_graph(client, entry)
+        if error:
+            return error
+
+        table = await _in_worker(graph.distance_table, actual_target)
+        return update_path_message(start_version, dp_target, actual_target, above_dp, table.path(current_version))
+
+    except httpx.HTTPError as e:
+        logger.error(f'Сетевая ошибка при подсчете обновлений: {e}')
+        return f'Произошла сетевая ошибка: {escape_markdown(str(e))}'
+    except Exception as e:
+        logger.error(f'Непредвиденная ошибка при подсчете обновлений: {e}', exc_info=True)
+        return f'Произошла непредвиденная ошибка: {escape_markdown(str(e))}'
+
+async def find_update_paths_batch(client, pairs: list) -> list:
+    """Как service_1c.find_update_paths_batch, но графы разных конфигураций качаются параллельно."""
+    catalog, error = await get_release_catalog(client)
+    results, groups = group_batch(catalog, pairs)
+    if error:
+        for r in results: r['error'] = error
+        return results
+
+    async def load_group(entry, group):
+        graph, error = None, None
+        try:
+            graph, error = await get_update_graph(client, entry)
+        except httpx.HTTPError as e:
+            logger.error(f'Сетевая ошибка при пакетном подсчете для {entry.href}: {e}')
+            error = f'Сетевая ошибка: {e}'
+        await _in_worker(fill_batch_group, entry, group, graph, error)
+
+    await asyncio.gather(*(load_group(entry, group) for entry, group in groups.values()))
+    return results
@@ -2,19 +2,31 @@ import json
 import os
 import logging
 import shutil
+import sqlite3
+import tempfile
+import threading
+import weakref
+from copy import deepcopy
+from collections import OrderedDict
 from pathlib import Path
-from .config import USER_DATA_DIR
+from . import metrics
+from .config import USER_DATA_DIR, STORAGE_BACKEND, STORAGE_DB_FILE, STORAGE_CACHE_SIZE, STORAGE_FLUSH_INTERVAL
 
 logger = logging.getLogger(__name__)
 
-def get_user_file_path(user_id: int, filename: str) -> Path:
-    user_dir = USER_DATA_DIR / str(user_id)
+# Документы пользователя и их значения по умолчанию
+DOCUMENTS = {'configs': list, 'state': dict, 'mappings': dict}
+
+STORAGE_IO = metrics.histogram('storage_io_seconds', 'Чтение и запись документов пользователей на диск', ['op', 'doc'])
+
+def get_user_file_path(user_id: int, filename: str, base_dir: Path = None) -> Path:
+    user_dir = (base_dir or USER_DATA_DIR) / str(user_id)
     user_dir.mkdir(exist_ok=True, parents=True)
     return user_dir / filename
 
-def _load_json(user_id: int, filename: str, default=None):
+def _load_json(user_id: int, filename: str, default=None, base_dir: Path = None):
     if default is None: default = {}
-    fpath = get_user_file_path(user_id, filename)
+    fpath = get_user_file_path(user_id, filename, base_dir)
     
     if not fpath.exists():
         return default
@@ -37,26 +49,341 @@ def _load_json(user_id: int, filename: str, default=None):
         logger.error(f"Ошибка чтения файла {filename}: {e}")
         return default
 
-def _save_json(user_id: int, filename: str, data):
-    fpath = get_user_file_path(user_id, filename)
+def _save_json(user_id: int, filename: str, data, base_dir: Path = None):
+    fpath = get_user_file_path(user_id, filename, base_dir)
     # Создаем временный файл, пишем в него, потом переименовываем.
     # Это предотвращает потерю данных, если бот упадет прямо во время записи.
-    temp_path = fpath.with_suffix('.tmp')
+    # Имя временного файла уникально: один документ могут писать сразу два потока.
+    temp_path = None
     
     try:
-        with open(temp_path, 'w', encoding='utf-8') as f:
+        with tempfile.NamedTemporaryFile('w', encoding='utf-8', dir=fpath.parent, prefix=f'{fpath.stem}.',
+                                         suffix='.tmp', delete=False) as f:
+            temp_path = Path(f.name)
             json.dump(data, f, ensure_ascii=False, indent=4)
         
         # Атомарная замена файла (безопасно)
         os.replace(temp_path, fpath)
     except Exception as e:
         logger.error(f"Ошибка записи файла {filename}: {e}")
-        if temp_path.exists():
+        if temp_path and temp_path.exists():
             try: os.remove(temp_path)
             except: pass
 
+# --- БЭКЕНДЫ ХРАНЕНИЯ ---
+
+class JsonBackend:
+    """Исходный формат: data/user_data/<id>/<документ>.json."""
+
+    def __init__(self, directory: Path = None):
+        self.directory = Path(directory) if directory else None
+
+    def load(self, user_id: int, doc: str):
+        return _load_json(user_id, f'{doc}.json', DOCUMENTS[doc](), self.directory)
+
+    def save(self, user_id: int, doc: str, data):
+        _save_json(user_id, f'{doc}.json', data, self.directory)
+
+    def user_ids(self) -> list:
+        directory = self.directory or USER_DATA_DIR
+        if not directory.exists():
+            return []
+        return [int(p.name) for p in directory.iterdir() if p.is_dir() and p.name.isdigit()]
+
+class SqliteBackend:
+    """
+    Одна база SQLite в режиме WAL. Документы разложены по строкам (конфигурация,
+    ключ состояния, замена из словаря), и сохранение пишет только изменившиеся
+    строки, а не переписывает документ целиком.
+    """
+
+    SCHEMA = '''
+        CREATE TABLE IF NOT EXISTS users (user_id INTEGER PRIMARY KEY);
+        CREATE TABLE IF NOT EXISTS configs (
+            user_id INTEGER NOT NULL, position INTEGER NOT NULL, data TEXT NOT NULL,
+            PRIMARY KEY (user_id, position)
+        );
+        CREATE TABLE IF NOT EXISTS state (
+            user_id INTEGER NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL,
+            PRIMARY KEY (user_id, key)
+        );
+        CREATE TABLE IF NOT EXISTS mappings (
+            user_id INTEGER NOT NULL, raw TEXT NOT NULL, fixed TEXT NOT NULL,
+            PRIMARY KEY (user_id, raw)
+        );
+    '''
+
+    # Документ -> (таблица, колонка ключа, колонка значения)
+    TABLES = {
+        'configs': ('configs', 'position', 'data'),
+        'state': ('state', 'key', 'value'),
+        'mappings': ('mappings', 'raw', 'fixed'),
+    }
+
+    def __init__(self, db_path: Path):
+        Path(db_path).parent.mkdir(exist_ok=True, parents=True)
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(str(db_path), check_same_thread=False, isolation_level=None)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.executescript(self.SCHEMA)
+
+    @staticmethod
+    def _to_rows(doc: str, data) -> dict:
+        """Документ -> {ключ строки: значение в том виде, в каком оно лежит в базе}."""
+        if doc == 'configs':
+            return {i: json.dumps(c, ensure_ascii=False) for i, c in enumerate(data)}
+        if doc == 'state':
+            return {k: json.dumps(v, ensure_ascii=False) for k, v in data.items()}
+        return dict(data)
+
+    @staticmethod
+    def _from_rows(doc: str, rows):
+        if doc == 'configs':
+            return [json.loads(v) for _, v in rows]
+        if doc == 'state':
+            return {k: json.loads(v) for k, v in rows}
+        return {k: v for k, v in rows}
+
+    def _select(self, user_id: int, doc: str):
+        table, key_col, value_col = self.TABLES[doc]
+        order = key_col if doc == 'configs' else 'rowid'
+        return self.conn.execute(
+            f'SELECT {key_col}, {value_col} FROM {table} WHERE user_id = ? ORDER BY {order}', (user_id,)
+        ).fetchall()
+
+    def load(self, user_id: int, doc: str):
+        try:
+            with self.lock:
+                return self._from_rows(doc, self._select(user_id, doc))
+        except Exception as e:
+            logger.error(f"Ошибка чтения {doc} пользователя {user_id} из базы: {e}")
+            return DOCUMENTS[doc]()
+
+    def save(self, user_id: int, doc: str, data):
+        table, key_col, value_col = self.TABLES[doc]
+        try:
+            new_rows = self._to_rows(doc, data)
+            with self.lock:
+                old_rows = dict(self._select(user_id, doc))
+                changed = [(user_id, k, v) for k, v in new_rows.items() if old_rows.get(k) != v]
+                removed = [(user_id, k) for k in old_rows if k not in new_rows]
+                if not changed and not removed:
+                    return
+                self.conn.execute('BEGIN')
+                try:
+                    self.conn.execute('INSERT OR IGNORE INTO users (user_id) VALUES (?)', (user_id,))
+                    self.conn.executemany(
+                        f'INSERT INTO {table} (user_id, {key_col}, {value_col}) VALUES (?, ?, ?) '
+                        f'ON CONFLICT (user_id, {key_col}) DO UPDATE SET {value_col} = excluded.{value_col}',
+                        changed
+                    )
+                    self.conn.executemany(f'DELETE FROM {table} WHERE user_id = ? AND {key_col} = ?', removed)
+                    self.conn.execute('COMMIT')
+                except Exception:
+                    self.conn.execute('ROLLBACK')
+                    raise
+        except Exception as e:
+            logger.error(f"Ошибка записи {doc} пользователя {user_id} в базу: {e}")
+
+    def user_ids(self) -> list:
+        with self.lock:
+            return [row[0] for row in self.conn.execute('SELECT user_id FROM users ORDER BY user_id')]
+
+def _create_backend():
+    if STORAGE_BACKEND == 'sqlite':
+        return SqliteBackend(STORAGE_DB_FILE)
+    return JsonBackend()
+
+# --- КЭШ С ОТЛОЖЕННОЙ ЗАПИСЬЮ ---
+
+class DocumentCache:
+    """
+    Документы активных пользователей в памяти (LRU). Сохранение только помечает
+    документ измененным, а на диск измененные документы пишутся пачкой - по таймеру
+    (flush) и при остановке бота. Вытесняемый измененный документ записывается сразу.
+    Сама запись идет через бэкенд, так что атомарность (временный файл + os.replace
+    или транзакция SQLite) сохраняется.
+
+    Один документ могут писать одновременно flush и вытеснение из другого потока.
+    Поэтому каждое сохранение получает номер, запись одного документа идет под его
+    блокировкой, а снимок старше уже записанного на диск пропускается.
+    """
+
+    def __init__(self, backend, size: int = 1000, write_through: bool = False):
+        self.backend = backend
+        self.size = size
+        self.write_through = write_through
+        self.lock = threading.RLock()
+        self._docs = OrderedDict()
+        # Измененные документы: ключ -> номер последнего сохранения
+        self._dirty = {}
+        # Снятые для записи, но еще не записанные: ключ -> (номер, данные)
+        self._pending = {}
+        # Номер последней записанной на диск версии документа
+        self._written = {}
+        self._write_locks = weakref.WeakValueDictionary()
+        self._seq = 0
+        self.hits = 0
+        self.misses = 0
+        self.flushed = 0
+
+    def load(self, user_id: int, doc: str):
+        key = (user_id, doc)
+        with self.lock:
+            if key in self._docs:
+                self._docs.move_to_end(key)
+                self.hits += 1
+                return deepcopy(self._docs[key])
+            self.misses += 1
+            pending = self._pending.get(key)
+        if pending:
+            # Документ вытеснен, но еще пишется на диск - на диске пока старая версия
+            data = pending[1]
+        else:
+            # Диск читаем без общей блокировки, чтобы медленная операция одного
+            # пользователя не останавливала остальных
+            with STORAGE_IO.time(op='load', doc=doc):
+                data = self.backend.load(user_id, doc)
+        evicted = []
+        with self.lock:
+            # Пока читали, документ могли сохранить - тогда в кэше уже более свежая версия
+            if key in self._docs:
+                data = self._docs[key]
+            else:
+                evicted = self._put(key, data)
+            result = deepcopy(data)
+        self._write_evicted(evicted)
+        # Вызывающий код меняет результат на месте - отдаем копию
+        return result
+
+    def save(self, user_id: int, doc: str, data):
+        key = (user_id, doc)
+        with self.lock:
+            self._seq += 1
+            seq = self._seq
+            evicted = self._put(key, deepcopy(data))
+            if not self.write_through:
+                self._dirty[key] = seq
+        if self.write_through:
+            self._write(key, seq, data)
+        self._write_evicted(evicted)
+
+    def _put(self, key, data) -> list:
+        """Кладет документ в кэш. Возвращает вытесненные измененные документы - их надо записать."""
+        self._docs[key] = data
+        self._docs.move_to_end(key)
+        evicted = []
+        while len(self._docs) > self.size:
+            old_key, old_data = self._docs.popitem(last=False)
+            if old_key in self._dirty:
+                seq = self._dirty.pop(old_key)
+                self._pending[old_key] = (seq, old_data)
+                evicted.append((old_key, seq, old_data))
+        return evicted
+
+    def _write_evicted(self, evicted):
+        for key, seq, data in evicted:
+            self._write(key, seq, data)
+
+    def _write_lock(self, key) -> threading.Lock:
+        with self.lock:
+            lock = self._write_locks.get(key)
+            if lock is None:
+                lock = self._write_locks[key] = threading.Lock()
+            return lock
+
+    def _write(self, key, seq: int, data) -> bool:
+        try:
+            with self._write_lock(key):
+                # Более новую версию уже записал другой поток - старый снимок ее не затирает
+                if self._written.get(key, 0) >= seq:
+                    return True
+                with STORAGE_IO.time(op='save', doc=key[1]):
+                    self.backend.save(key[0], key[1], data)
+                self._written[key] = seq
+            self.flushed += 1
+            return True
+        except Exception as e:
+            logger.error(f"Ошибка записи {key[1]} пользователя {key[0]}: {e}")
+            return False
+        finally:
+            with self.lock:
+                if self._pending.get(key, (None,))[0] == seq:
+                    del self._pending[key]
+
+    def flush(self) -> int:
+        """Записывает все измененные документы. Возвращает их число."""
+        with self.lock:
+            pending = []
+            for key, seq in self._dirty.items():
+                data = deepcopy(self._docs[key])
+                self._pending[key] = (seq, data)
+                pending.append((key, seq, data))
+            self._dirty.clear()
+        written = 0
+        for key, seq, data in pending:
+            if self._write(key, seq, data):
+                written += 1
+            else:
+                # Не записали - попробуем в следующий раз, если документ еще в кэше и не сохранен заново
+                with self.lock:
+                    if key in self._docs: self._dirty.setdefault(key, seq)
+        if written:
+            logger.debug(f"Кэш хранилища: записано документов - {written}")
+        return written
+
+    def in_memory(self, user_id: int, doc: str, write: bool = False) -> bool:
+        """True, если операция обойдется без диска: документ в кэше (а для записи - и без вытеснения)."""
+        with self.lock:
+            if not write:
+                return (user_id, doc) in self._docs
+            if self.write_through:
+                return False
+            return (user_id, doc) in self._docs or len(self._docs) < self.size
+
+    def user_ids(self) -> list:
+        with self.lock:
+            cached = {user_id for user_id, _ in self._docs}
+        return sorted(set(self.backend.user_ids()) | cached)
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {
+                'size': len(self._docs), 'dirty': len(self._dirty),
+                'hits': self.hits, 'misses': self.misses, 'flushed': self.flushed,
+            }
+
+# Интервал 0 - запись сразу при сохранении (кэш только для чтения)
+_cache = DocumentCache(_create_backend(), STORAGE_CACHE_SIZE, write_through=not STORAGE_FLUSH_INTERVAL)
+
+def flush():
+    """Сбрасывает на диск отложенные изменения. Вызывается по таймеру и при остановке."""
+    return _cache.flush()
+
+def in_memory(user_id: int, doc: str, write: bool = False) -> bool:
+    return _cache.in_memory(user_id, doc, write)
+
+def cache_stats() -> dict:
+    return _cache.stats()
+
+def _cache_metric(field):
+    def collect():
+        stats = _cache.stats()
+        return metrics.ratio(stats['hits'], stats['misses']) if field == 'hit_ratio' else stats[field]
+    return collect
+
+metrics.gauge('storage_cache_documents', 'Документов пользователей в кэше', function=_cache_metric('size'))
+metrics.gauge('storage_cache_dirty', 'Измененных документов, ожидающих записи', function=_cache_metric('dirty'))
+metrics.gauge('storage_cache_hits', 'Чтения документов из кэша', function=_cache_metric('hits'))
+metrics.gauge('storage_cache_misses', 'Чтения документов с диска', function=_cache_metric('misses'))
+metrics.gauge('storage_cache_hit_ratio', 'Доля чтений документов из кэша', function=_cache_metric('hit_ratio'))
+
+def list_user_ids() -> list:
+    return _cache.user_ids()
+
 def load_configs(user_id: int):
-    data = _load_json(user_id, 'configs.json', [])
+    data = _cache.load(user_id, 'configs')
     
     # Миграция данных (на случай старых файлов)
     is_changed = False
@@ -70,10 +397,10 @@ def load_configs(user_id: int):
     
     return data
 
-def save_configs(user_id: int, data): _save_json(user_id, 'configs.json', data)
+def save_configs(user_id: int, data): _cache.save(user_id, 'configs', data)
 
-def load_bot_state(user_id: int): return _load_json(user_id, 'state.json', {})
-def save_bot_state(user_id: int, data): _save_json(user_id, 'state.json', data)
+def load_bot_state(user_id: int): return _cache.load(user_id, 'state')
+def save_bot_state(user_id: int, data): _cache.save(user_id, 'state', data)
 
-def load_mappings(user_id: int): return _load_json(user_id, 'mappings.json', {})
-def save_mappings(user_id: int, data): _save_json(user_id, 'mappings.json', data)
\ No newline at end of file
+def load_mappings(user_id: int): return _cache.load(user_id, 'mappings')
+def save_mappings(user_id: int, data): _cache.save(user_id, 'mappings', data)
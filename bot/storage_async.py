@@ -0,0 +1,87 @@
+"""
+Асинхронный фасад bot.storage для обработчиков.
+
+Чтение и запись файлов выполняются в отдельном ограниченном пуле потоков, а не
+в event loop, поэтому медленный диск у одного пользователя не задерживает
+обработку обновлений остальных. Операции с одним документом пользователя
+выполняются строго по очереди. Если документ уже в кэше, операция выполняется
+сразу, без перехода в пул.
+"""
+import asyncio
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+
+from .config import STORAGE_IO_WORKERS
+from . import storage
+
+_io_executor = ThreadPoolExecutor(max_workers=STORAGE_IO_WORKERS, thread_name_prefix='storage-io')
+
+# Блокировка на документ пользователя; исчезает, когда ее никто не держит
+_locks = weakref.WeakValueDictionary()
+# Блокировка на пользователя целиком - для цепочек "прочитать -> изменить -> сохранить"
+_user_locks = weakref.WeakValueDictionary()
+
+def _lock(user_id: int, doc: str) -> asyncio.Lock:
+    lock = _locks.get((user_id, doc))
+    if lock is None:
+        lock = _locks[(user_id, doc)] = asyncio.Lock()
+    return lock
+
+def user_lock(user_id: int) -> asyncio.Lock:
+    """
+    Блокировка данных пользователя. Ее держат только короткие цепочки "прочитать ->
+    изменить -> сохранить" в обработчиках и фоновых задачах - без сетевых запросов
+    внутри, поэтому медленный запрос пользователя не задерживает ежедневную проверку
+    и рассылку. Блокировка не реентерабельна: внутри такой цепочки брать ее повторно
+    (в том числе через update_bot_state) нельзя.
+    """
+    lock = _user_locks.get(user_id)
+    if lock is None:
+        lock = _user_locks[user_id] = asyncio.Lock()
+    return lock
+
+async def _in_io(func, *args):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_io_executor, func, *args)
+
+async def _call(user_id: int, doc: str, write: bool, func, *args):
+    async with _lock(user_id, doc):
+        if storage.in_memory(user_id, doc, write):
+            return func(*args)
+        return await _in_io(func, *args)
+
+async def load_configs(user_id: int):
+    return await _call(user_id, 'configs', False, storage.load_configs, user_id)
+
+async def save_configs(user_id: int, data):
+    await _call(user_id, 'configs', True, storage.save_configs, user_id, data)
+
+async def load_bot_state(user_id: int):
+    return await _call(user_id, 'state', False, storage.load_bot_state, user_id)
+
+async def save_bot_state(user_id: int, data):
+    await _call(user_id, 'state', True, storage.save_bot_state, user_id, data)
+
+async def update_bot_state(user_id: int, **values):
+    """Записывает поля состояния под блокировкой пользователя, не трогая остальные."""
+    async with user_lock(user_id):
+        state = await load_bot_state(user_id)
+        state.update(values)
+        await save_bot_state(user_id, state)
+
+async def load_mappings(user_id: int):
+    return await _call(user_id, 'mappings', False, storage.load_mappings, user_id)
+
+async def save_mappings(user_id: int, data):
+    await _call(user_id, 'mappings', True, storage.save_mappings, user_id, data)
+
+async def list_user_ids() -> list:
+    return await _in_io(storage.list_user_ids)
+
+async def flush() -> int:
+    return await _in_io(storage.flush)
+
+def shutdown():
+    """Сбрасывает отложенные изменения и останавливает пул (при остановке бота)."""
+    storage.flush()
+    _io_executor.shutdown(wait=True)
@@ -0,0 +1,235 @@
+"""
+Подсказки для неизвестной номенклатуры в помощнике регистрации.
+
+По ключам словаря замен пользователя (mappings) строится индекс символьных
+триграмм: триграмма -> множество ключей. Для неизвестной строки кандидаты
+отбираются пересечением этих множеств, начиная с самых редких слов (частые
+вроде "1с:" есть почти в каждом ключе и ничего не различают), затем оставшиеся
+оцениваются точно - коэффициентом Дайса по множествам триграмм.
+
+Если даже самое редкое слово запроса есть в тысячах ключей (название без
+артикула), пересечение множеств таких размеров стоит миллисекунды. Поэтому для
+длинных списков индекс держит еще и битовую карту (int, бит - номер ключа):
+пересечение - одно "&" над целыми. Номера выдаются по возрастанию длины ключа,
+так что младшие биты результата - самые короткие ключи.
+
+Индексы держатся в памяти для последних активных пользователей и обновляются
+по одной записи при сохранении и удалении замен.
+"""
+import heapq
+import asyncio
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from .utils import normalize_text
+from . import metrics
+
+NGRAM = 3
+# Ниже этого сходства подсказку не показываем
+MIN_SCORE = 0.5
+# Со скольких самых редких слов запроса начинаем отбор кандидатов
+SEEDS = 3
+# До скольких кандидатов сужаем перед точной оценкой (на каждую стартовую триграмму)
+RESCORE_TOP = 20
+# Для списков длиннее этого держим битовую карту
+LARGE_POSTING = 1000
+# Сколько самых коротких ключей достаем из битовой карты для отбора
+MAX_DECODE = 200
+# Для скольких пользователей держим индекс в памяти
+INDEX_CACHE_SIZE = 64
+
+SUGGEST_LOOKUP = metrics.histogram('mapping_suggest_seconds', 'Поиск подсказки по словарю замен',
+                                   buckets=(0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.05))
+SUGGEST_INDEX_BUILDS = metrics.counter('mapping_suggest_index_builds_total', 'Полных построений индекса подсказок')
+
+def ngrams(text: str) -> frozenset:
+    # Пробелы по краям - чтобы начало и конец слов тоже давали триграммы
+    norm = f' {normalize_text(text)} '
+    if len(norm) <= NGRAM:
+        return frozenset([norm])
+    return frozenset(norm[i:i + NGRAM] for i in range(len(norm) - NGRAM + 1))
+
+class NgramIndex:
+    """Инвертированный индекс триграмм по ключам словаря замен."""
+
+    def __init__(self, keys=()):
+        self._grams = {}
+        self._postings = {}
+        # Номер ключа <-> ключ (на месте удаленных - None) и битовые карты длинных списков
+        self._ids = {}
+        self._keys = []
+        self._bits = {}
+        for key in sorted(keys, key=len):
+            self.add(key)
+        # Номера до этого упорядочены по длине; добавленные позже ключи идут в хвосте
+        self._sorted = len(self._keys)
+        for gram, posting in self._postings.items():
+            if len(posting) > LARGE_POSTING:
+                self._bitmap(gram)
+
+    def __len__(self):
+        return len(self._grams)
+
+    def __contains__(self, key):
+        return key in self._grams
+
+    def add(self, key: str):
+        if key in self._grams:
+            return
+        grams = ngrams(key)
+        self._grams[key] = grams
+        key_id = self._ids[key] = len(self._keys)
+        self._keys.append(key)
+        for gram in grams:
+            self._postings.setdefault(gram, set()).add(key)
+            if gram in self._bits:
+                self._bits[gram] |= 1 << key_id
+
+    def remove(self, key: str):
+        grams = self._grams.pop(key, None)
+        if grams is None:
+            return
+        key_id = self._ids.pop(key)
+        self._keys[key_id] = None
+        for gram in grams:
+            if gram in self._bits:
+                self._bits[gram] &= ~(1 << key_id)
+            posting = self._postings[gram]
+            posting.discard(key)
+            if not posting:
+                del self._postings[gram]
+                self._bits.pop(gram, None)
+
+    def _bitmap(self, gram: str) -> int:
+        bits = self._bits.get(gram)
+        if bits is None:
+            buf = bytearray(len(self._keys) // 8 + 1)
+            for key in self._postings[gram]:
+                key_id = self._ids[key]
+                buf[key_id >> 3] |= 1 << (key_id & 7)
+            bits = self._bits[gram] = int.from_bytes(buf, 'little')
+        return bits
+
+    def _decode(self, bits: int) -> list:
+        """
+        Ключи битовой карты: до MAX_DECODE самых коротких из построенных сразу и до
+        MAX_DECODE добавленных позже (их номера по длине не упорядочены).
+        """
+        flags = format(bits, 'b')[::-1]
+        keys = []
+        for start, end in ((0, self._sorted), (self._sorted, len(flags))):
+            taken = 0
+            pos = flags.find('1', start, end)
+            while pos >= 0 and taken < MAX_DECODE:
+                keys.append(self._keys[pos])
+                taken += 1
+                pos = flags.find('1', pos + 1, end)
+        return keys
+
+    def search(self, text: str, limit: int = 1, min_score: float = MIN_SCORE) -> list:
+        """Лучшие совпадения [(сходство, ключ), ...] по убыванию сходства."""
+        grams = ngrams(text)
+
+        # Триграммы одного слова почти всегда встречаются вместе, так что для сужения
+        # от каждого слова берем один, самый короткий список
+        words = []
+        for word in normalize_text(text).split():
+            known = [g for g in ngrams(word) if g in self._postings]
+            if known:
+                words.append(min(known, key=lambda g: len(self._postings[g])))
+        words.sort(key=lambda g: len(self._postings[g]))
+
+        if words and len(self._postings[words[0]]) > LARGE_POSTING:
+            # Все списки запроса длинные - пересекаем битовые карты
+            candidates = self._narrow_bits(words)
+        else:
+            candidates = self._narrow([self._postings[g] for g in words])
+
+        results = []
+        for key in candidates:
+            other = self._grams[key]
+            score = 2 * len(grams & other) / (len(grams) + len(other))
+            if score >= min_score:
+                results.append((score, key))
+        results.sort(key=lambda r: (-r[0], r[1]))
+        return results[:limit]
+
+    def _narrow_bits(self, words: list) -> set:
+        """Как _narrow, но над битовыми картами."""
+        candidates = set()
+        for seed in words[:SEEDS]:
+            current, skipped = self._bitmap(seed), False
+            for gram in words:
+                narrowed = current & self._bitmap(gram)
+                if narrowed: current = narrowed
+                else: skipped = True
+            candidates.update(heapq.nsmallest(RESCORE_TOP, self._decode(current), key=len))
+            if not skipped:
+                break
+        return candidates
+
+    def _narrow(self, postings: list) -> set:
+        # Сужаем кандидатов пересечением списков от редких слов к частым; список,
+        # с которым пересечение пустеет (опечатка, лишнее слово), пропускаем. Начинаем
+        # с нескольких самых редких - вдруг самое редкое слово само с опечаткой.
+        candidates = set()
+        for seed in postings[:SEEDS]:
+            current, skipped = seed, False
+            for posting in postings:
+                if len(current) <= RESCORE_TOP:
+                    break
+                narrowed = current & posting
+                if narrowed: current = narrowed
+                else: skipped = True
+            # Осталось много - у всех общие слова запроса, и выше сходство у коротких
+            candidates.update(heapq.nsmallest(RESCORE_TOP, current, key=len))
+            if not skipped:
+                break
+        return candidates
+
+# --- ИНДЕКСЫ ПОЛЬЗОВАТЕЛЕЙ ---
+
+_indexes = OrderedDict()
+# Построение индекса - чистый CPU на секунды; свой поток, чтобы не занимать пулы
+# хранилища и разбора страниц и общий пул asyncio.to_thread
+_build_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='suggest-index')
+
+async def get_index(user_id: int, mappings: dict) -> NgramIndex:
+    index = _indexes.get(user_id)
+    # Словарь мог измениться в обход mapping_saved/mapping_deleted - тогда перестраиваем.
+    # На десятках тысяч ключей это секунды - строим в потоке, не держа event loop
+    if index is None or len(index) != len(mappings):
+        loop = asyncio.get_running_loop()
+        index = await loop.run_in_executor(_build_executor, NgramIndex, list(mappings))
+        SUGGEST_INDEX_BUILDS.inc()
+    _indexes[user_id] = index
+    _indexes.move_to_end(user_id)
+    while len(_indexes) > INDEX_CACHE_SIZE:
+        _indexes.popitem(last=False)
+    return index
+
+def mapping_saved(user_id: int, raw: str):
+    index = _indexes.get(user_id)
+    if index is not None:
+        index.add(raw)
+
+def mapping_deleted(user_id: int, raw: str):
+    index = _indexes.get(user_id)
+    if index is not None:
+        index.remove(raw)
+
+async def suggest_all(user_id: int, mappings: dict, unknowns) -> dict:
+    """
+    Подсказки для списка неизвестных строк:
+    {строка: {'key': похожий ключ словаря, 'name': его замена, 'score': сходство}}.
+    """
+    index = await get_index(user_id, mappings)
+    suggestions = {}
+    for raw in unknowns:
+        with SUGGEST_LOOKUP.time():
+            found = index.search(raw)
+        if not found or found[0][1] not in mappings:
+            continue
+        score, key = found[0]
+        suggestions[raw] = {'key': key, 'name': mappings[key], 'score': round(score, 2)}
+    return suggestions
@@ -0,0 +1,182 @@
+import os
+import json
+import hashlib
+import logging
+import threading
+from collections import deque
+from pathlib import Path
+from .utils import Version, parse_version
+
+logger = logging.getLogger(__name__)
+
+def parse_versions_table(soup):
+    """Строки versionsTable в виде [версия, [с каких версий], is_dp] или None, если таблицы нет."""
+    updates_table = soup.find('table', id='versionsTable')
+    if not updates_table:
+        return None
+    rows = []
+    for row in updates_table.find_all('tr')[1:]:
+        cols = row.find_all('td')
+        if len(cols) < 3: continue
+        to_version = cols[0].get_text(strip=True)
+        from_versions = [v.strip() for v in cols[2].get_text(strip=True).split(',')]
+        is_dp = bool(row.find('small', string='ДП'))
+        rows.append([to_version, from_versions, is_dp])
+    return rows
+
+def _parse_all(texts) -> list:
+    """Версии из строк; нераспознанные пропускаются - по ним путь не построить."""
+    return [v for v in map(parse_version, texts) if v is not None]
+
+class DistanceTable:
+    """
+    Результат одного обратного BFS от целевой версии: для каждой версии, из которой
+    цель достижима, хранится (число шагов, следующая версия на кратчайшем пути).
+    Ключи - Version; ответ для любой стартовой версии - поиск в словаре.
+    """
+    __slots__ = ('target', 'table')
+
+    def __init__(self, target: Version, predecessors: dict):
+        self.target = target
+        self.table = {}
+        if target is None:
+            return
+        self.table[target] = (0, None)
+        queue = deque([target])
+        while queue:
+            curr = queue.popleft()
+            steps = self.table[curr][0] + 1
+            for prev in predecessors.get(curr, ()):
+                known = self.table.get(prev)
+                if known is None:
+                    self.table[prev] = (steps, curr)
+                    queue.append(prev)
+                elif known[0] == steps and curr > known[1]:
+                    # При равной длине пути идем через более новую версию, как и раньше
+                    self.table[prev] = (steps, curr)
+
+    def steps(self, start: str):
+        known = self.table.get(parse_version(start))
+        return known[0] if known else None
+
+    def path(self, start: str):
+        """Цепочка версий (строками) от start до цели включительно или None, если цель недостижима."""
+        version = parse_version(start)
+        if version not in self.table:
+            return None
+        chain = [version]
+        while chain[-1] != self.target:
+            chain.append(self.table[chain[-1]][1])
+        return [str(v) for v in chain]
+
+class UpdateGraph:
+    """
+    История обновлений одной конфигурации (ключ - ссылка на ее страницу).
+    Строки только добавляются: при появлении новой версии на сайте в граф
+    дописываются новые строки, уже известные не пересобираются.
+    Граф (predecessors, checked_versions) хранит Version; rows - исходные строки
+    таблицы, в таком виде граф и сохраняется на диск.
+    """
+
+    def __init__(self, href: str, rows=None, checked_versions=None):
+        self.href = href
+        self.rows = []
+        self.predecessors = {}
+        # Версии из снимка /total, под которые граф уже обновлялся. Нужны, чтобы
+        # версия, которой почему-то нет в истории, не вызывала загрузку при каждом запросе.
+        self.checked_versions = set(_parse_all(checked_versions or []))
+        # Растет при каждом изменении графа - по нему сбрасываются производные кэши
+        self.revision = 0
+        self._tables = {}
+        if rows:
+            self.merge(rows)
+
+    def merge(self, rows) -> int:
+        """Дописывает строки с еще неизвестными версиями. Возвращает число добавленных."""
+        added = 0
+        for to_version, from_versions, is_dp in rows:
+            version = parse_version(to_version)
+            if version is None or version in self.predecessors: continue
+            self.rows.append([to_version, from_versions, is_dp])
+            self.predecessors[version] = _parse_all(from_versions)
+            added += 1
+        if added:
+            self.revision += 1
+            self._tables = {}
+        return added
+
+    def distance_table(self, target: str) -> DistanceTable:
+        """Таблица расстояний до target; считается один раз на версию графа."""
+        target = parse_version(target)
+        table = self._tables.get(target)
+        if table is None:
+            table = DistanceTable(target, self.predecessors)
+            tables = dict(self._tables) if len(self._tables) < 16 else {}
+            tables[target] = table
+            self._tables = tables
+        return table
+
+    def is_current(self, site_versions) -> bool:
+        """True, если все версии из снимка /total уже есть в графе (или уже проверялись)."""
+        return all(v in self.predecessors or v in self.checked_versions for v in _parse_all(site_versions))
+
+    def to_dict(self) -> dict:
+        return {'href': self.href, 'rows': self.rows, 'checked_versions': [str(v) for v in sorted(self.checked_versions)]}
+
+    @classmethod
+    def from_dict(cls, data: dict):
+        return cls(data['href'], data.get('rows', []), data.get('checked_versions', []))
+
+class GraphStore:
+    """Графы обновлений в памяти и на диске (по файлу на конфигурацию)."""
+
+    def __init__(self, directory: Path):
+        self.directory = Path(directory)
+        self.lock = threading.Lock()
+        self._graphs = {}
+
+    def _path(self, href: str) -> Path:
+        return self.directory / (hashlib.md5(href.encode()).hexdigest() + '.json')
+
+    def get(self, href: str):
+        with self.lock:
+            graph = self._graphs.get(href)
+            if graph is not None:
+                return graph
+            fpath = self._path(href)
+            if not fpath.exists():
+                return None
+            try:
+                with open(fpath, 'r', encoding='utf-8') as f:
+                    graph = UpdateGraph.from_dict(json.load(f))
+            except Exception as e:
+                logger.error(f"Не удалось прочитать кэш графа обновлений {fpath}: {e}")
+                return None
+            self._graphs[href] = graph
+            return graph
+
+    def update(self, href: str, rows, site_versions):
+        """Вливает свежие строки versionsTable в граф и сохраняет его на диск."""
+        graph = self.get(href) or UpdateGraph(href)
+        with self.lock:
+            added = graph.merge(rows)
+            graph.checked_versions.update(_parse_all(site_versions))
+            self._graphs[href] = graph
+            self._save(graph)
+        if added:
+            logger.info(f"Граф обновлений {href}: добавлено строк - {added}, всего {len(graph.rows)}")
+        return graph
+
+    def _save(self, graph: UpdateGraph):
+        fpath = self._path(graph.href)
+        temp_path = fpath.with_suffix('.tmp')
+        try:
+            self.directory.mkdir(exist_ok=True, parents=True)
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump(graph.to_dict(), f, ensure_ascii=False)
+            os.replace(temp_path, fpath)
+        except Exception as e:
+            logger.error(f"Ошибка записи кэша графа обновлений {fpath}: {e}")
+            if temp_path.exists():
+                try: os.remove(temp_path)
+                except: pass
@@ -0,0 +1,95 @@
+import asyncio
+import weakref
+import functools
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor, ConversationHandler
+
+from . import metrics
+
+LOCK_WAIT = metrics.histogram('update_lock_wait_seconds', 'Ожидание очереди обновлений своего пользователя')
+UPDATE_SECONDS = metrics.histogram('update_seconds', 'Обработка одного обновления целиком')
+HANDLER_SECONDS = metrics.histogram('handler_seconds', 'Время работы обработчика', ['handler'])
+HANDLER_ERRORS = metrics.counter('handler_errors_total', 'Исключения в обработчиках', ['handler'])
+
+# Очередь обновлений пользователя; исчезает, когда ее никто не держит
+_update_locks = weakref.WeakValueDictionary()
+
+def update_lock(user_id: int) -> asyncio.Lock:
+    """
+    Очередь обновлений пользователя: ее держит обработка каждого его обновления целиком.
+    Фоновые задачи обработчиков, которые продолжают диалог (context.user_data), берут
+    ее сами. Данные на диске она не защищает - для них storage_async.user_lock.
+    """
+    lock = _update_locks.get(user_id)
+    if lock is None:
+        lock = _update_locks[user_id] = asyncio.Lock()
+    return lock
+
+class PerUserUpdateProcessor(BaseUpdateProcessor):
+    """
+    Обновления разных пользователей обрабатываются параллельно, а обновления
+    одного пользователя - строго по очереди, в порядке поступления. Так медленный
+    расчет у одного пользователя не задерживает остальных, а обработчики и диалоги
+    (ConversationHandler) одного пользователя не мешают друг другу.
+
+    Очередь своя (update_lock), а не блокировка данных storage_async.user_lock:
+    обработчик может минуту ждать портал, и ежедневная проверка и рассылка
+    в это время не должны стоять.
+    """
+
+    async def do_process_update(self, update, coroutine):
+        user_id = None
+        if isinstance(update, Update):
+            if update.effective_user:
+                user_id = update.effective_user.id
+            elif update.effective_chat:
+                user_id = update.effective_chat.id
+        if user_id is None:
+            with UPDATE_SECONDS.time():
+                await coroutine
+            return
+        lock = update_lock(user_id)
+        with LOCK_WAIT.time():
+            await lock.acquire()
+        try:
+            with UPDATE_SECONDS.time():
+                await coroutine
+        finally:
+            lock.release()
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+def _timed(callback):
+    # functools.partial имени не имеет - берем имя обернутой функции
+    target = getattr(callback, 'func', callback)
+    name = getattr(target, '__name__', type(target).__name__)
+
+    @functools.wraps(callback)
+    async def wrapper(update, context):
+        with HANDLER_SECONDS.time(handler=name):
+            try:
+                return await callback(update, context)
+            except Exception:
+                HANDLER_ERRORS.inc(handler=name)
+                raise
+    return wrapper
+
+def instrument_handlers(application):
+    """Оборачивает колбэки всех зарегистрированных обработчиков (и внутри диалогов) замером времени."""
+    def walk(handler):
+        if isinstance(handler, ConversationHandler):
+            for inner in handler.entry_points + handler.fallbacks:
+                walk(inner)
+            for state_handlers in handler.states.values():
+                for inner in state_handlers:
+                    walk(inner)
+        elif getattr(handler, 'callback', None) is not None:
+            handler.callback = _timed(handler.callback)
+
+    for handlers in application.handlers.values():
+        for handler in handlers:
+            walk(handler)
@@ -1,8 +1,10 @@
 import re
 
+# Спецсимволы MarkdownV2 -> экранированные; str.translate вместо регулярки на каждый вызов
+_MARKDOWN_ESCAPE = str.maketrans({c: '\\' + c for c in '_*[]()~`>#+-=|{}.!'})
+
 def escape_markdown(text: str) -> str:
-    escape_chars = '_*[]()~`>#+-=|{}.!'
-    return re.sub(f'([{re.escape(escape_chars)}])', '\\\\\\1', str(text))
+    return str(text).translate(_MARKDOWN_ESCAPE)
 
 def normalize_text(text):
     """Для поиска конфигураций на сайте (приводит к нижнему регистру)."""
@@ -12,42 +14,164 @@ def clean_whitespace(text):
     """Удаляет переносы строк и лишние пробелы, сохраняя регистр."""
     return re.sub(r'\s+', ' ', text).strip()
 
-def version_tuple(v):
-    """Преобразует строку версии '3.0.123.45' в кортеж (3, 0, 123, 45)."""
+# --- ВЕРСИИ ---
+
+_VERSION_RE = re.compile(r'\d+(?:\.\d+)*')
+# Разобранные строки (и нераспознанные - как None); версий на сайте конечное число,
+# а ввод пользователей ограничиваем, чтобы кэш не рос бесконечно
+_VERSION_CACHE = {}
+VERSION_CACHE_SIZE = 100000
+
+class Version:
+    """
+    Версия конфигурации 1С ('3.0.123.45'): неизменяемая, хешируемая, сравнивается
+    по номерам. Создается через parse_version - одна строка разбирается один раз,
+    дальше возвращается тот же объект.
+    """
+    __slots__ = ('text', 'parts', '_hash')
+
+    def __init__(self, text: str, parts: tuple):
+        self.text = text
+        self.parts = parts
+        # Version - ключ графа обновлений, хеш нужен на каждый поиск в словаре
+        self._hash = hash(parts)
+
+    def __eq__(self, other):
+        if self is other:
+            return True
+        return self.parts == other.parts if isinstance(other, Version) else NotImplemented
+
+    def __lt__(self, other):
+        return self.parts < other.parts if isinstance(other, Version) else NotImplemented
+
+    def __le__(self, other):
+        return self.parts <= other.parts if isinstance(other, Version) else NotImplemented
+
+    def __gt__(self, other):
+        return self.parts > other.parts if isinstance(other, Version) else NotImplemented
+
+    def __ge__(self, other):
+        return self.parts >= other.parts if isinstance(other, Version) else NotImplemented
+
+    def __hash__(self):
+        return self._hash
+
+    def __str__(self):
+        return self.text
+
+    def __repr__(self):
+        return f'Version({self.text!r})'
+
+def parse_version(text):
+    """Version для строки вида '3.0.123.45' или None, если это не версия (пусто, 'н/д', '3.0..1')."""
     try:
-        # Удаляем все нецифровые символы кроме точек
-        clean_v = re.sub(r'[^\d.]', '', str(v))
-        return tuple(map(int, clean_v.split('.')))
-    except ValueError:
-        return (0,)
+        return _VERSION_CACHE[text]
+    except KeyError:
+        pass
+    except TypeError:
+        return None
+    stripped = text.strip() if isinstance(text, str) else ''
+    version = None
+    if _VERSION_RE.fullmatch(stripped):
+        version = Version(stripped, tuple(map(int, stripped.split('.'))))
+    if len(_VERSION_CACHE) >= VERSION_CACHE_SIZE:
+        _VERSION_CACHE.clear()
+    _VERSION_CACHE[text] = version
+    return version
+
+def latest_version(texts):
+    """Самая новая из строк версий (первая при равенстве) или None; нераспознанные пропускаются."""
+    best = None
+    best_text = None
+    for text in texts:
+        version = parse_version(text)
+        if version is not None and (best is None or version > best):
+            best, best_text = version, text
+    return best_text
+
+# --- РАЗБОР ДАННЫХ РЕГИСТРАЦИИ ---
+
+_TENANT_MARK = 'Арендатор:'
+_TENANT_RE = re.compile(r'Арендатор:\s*(?P<name>.*?)\s+Арендатор ИНН:\s*(?P<inn>\d+)', re.DOTALL)
+_NOM_RE = re.compile(r'Номенклатура:\s*(?P<nom>.*?)\s+Регистрационный номер:\s*(?P<reg>\d+)', re.DOTALL)
+_WHITESPACE_RE = re.compile(r'\s+')
+
+class RegistrationStream:
+    """
+    Потоковый разбор выгрузки арендаторов. Части текста (сообщения) подаются
+    в feed() по мере поступления и склеиваются через separator; записи
+    арендатора отдаются, как только начинается следующий блок 'Арендатор:'.
+    В памяти держится только незавершенный блок. Результат совпадает
+    с parse_registration_text для склеенного текста.
+    """
+    def __init__(self, separator: str = '\n'):
+        self.separator = separator
+        self._tail = ''
+        self._started = False
+
+    def feed(self, part: str) -> list:
+        if self._started: part = self.separator + part
+        self._started = True
+        buf = self._tail + part
+        records = []
+        start = 0
+        # Метка могла начаться в хвосте прошлой части - ищем с запасом на ее длину
+        pos = max(1, len(self._tail) - len(_TENANT_MARK) + 1)
+        while True:
+            found = buf.find(_TENANT_MARK, pos)
+            if found < 0: break
+            self._parse_block(buf, start, found, records)
+            start, pos = found, found + 1
+        self._tail = buf[start:]
+        return records
+
+    def close(self) -> list:
+        """Разбирает последний блок и сбрасывает состояние."""
+        records = []
+        self._parse_block(self._tail, 0, len(self._tail), records)
+        self._tail = ''
+        self._started = False
+        return records
+
+    @staticmethod
+    def _parse_block(buf: str, start: int, end: int, records: list):
+        # Блок - buf[start:end]; регулярки работают по границам без копирования строки
+        tenant_match = _TENANT_RE.search(buf, start, end)
+        if not tenant_match: return
 
-def parse_registration_text(text):
-    tenants_data = []
-    chunks = re.split(r'(?=Арендатор:)', text)
-    
-    for chunk in chunks:
-        if not chunk.strip(): continue
-            
-        tenant_match = re.search(r'Арендатор:\s*(?P<name>.*?)\s+Арендатор ИНН:\s*(?P<inn>\d+)', chunk, re.DOTALL)
-        if not tenant_match: continue
-            
         name = tenant_match.group('name').strip()
         inn = tenant_match.group('inn').strip()
-        
-        nom_matches = re.finditer(r'Номенклатура:\s*(?P<nom>.*?)\s+Регистрационный номер:\s*(?P<reg>\d+)', chunk, re.DOTALL)
-        
-        for match in nom_matches:
-            raw_nom = match.group('nom')
-            cleaned_nom = clean_whitespace(raw_nom)
-            
-            tenants_data.append({
+
+        for match in _NOM_RE.finditer(buf, start, end):
+            records.append({
                 'name': name,
                 'inn': inn,
-                'nom_raw': cleaned_nom,
+                'nom_raw': _WHITESPACE_RE.sub(' ', match.group('nom')).strip(),
                 'reg_num': match.group('reg').strip()
             })
-    return tenants_data
-    
+
+def parse_registration_text(text):
+    stream = RegistrationStream()
+    return stream.feed(text) + stream.close()
+
+def parse_batch_lines(text):
+    """
+    Разбирает список строк вида 'Конфигурация; версия' для пакетного расчета.
+    Возвращает (пары, нераспознанные строки).
+    """
+    pairs = []
+    bad_lines = []
+    for line in text.splitlines():
+        if not line.strip(): continue
+        name, sep, version = line.rpartition(';')
+        name = clean_whitespace(name)
+        version = version.strip()
+        if not sep or not name or not is_valid_version(version):
+            bad_lines.append(line.strip())
+            continue
+        pairs.append((name, version))
+    return pairs, bad_lines
+
 def is_valid_version(version_str: str) -> bool:
     """Проверяет, похоже ли строка на версию 1С (например, 3.0.123.45)."""
     # Разрешаем от 2 до 5 групп цифр через точку
@@ -1,22 +1,30 @@
+import re
+import sys
 import logging
 import datetime
 import html
 import json
 import traceback
+from functools import partial
 from zoneinfo import ZoneInfo
 from telegram import Update
 from telegram.constants import ParseMode
 from telegram.ext import (
     Application, CommandHandler, CallbackQueryHandler, 
-    ConversationHandler, MessageHandler, filters, ContextTypes
+    ConversationHandler, MessageHandler, TypeHandler, filters, ContextTypes
 )
 
 from bot.config import (
     setup_logging, TELEGRAM_TOKEN, ADMIN_USER_ID, 
-    TIMEZONE, SCHEDULE_HOUR, SCHEDULE_MINUTE, USER_DATA_DIR,
-    GET_CONFIG_NAME, GET_CONFIG_TYPE, SELECT_CONFIG, GET_MANUAL_CONFIG, GET_CURRENT_VERSION, GET_REG_TEXT
+    TIMEZONE, SCHEDULE_HOUR, SCHEDULE_MINUTE, USER_DATA_DIR, HTML_PARSER,
+    GET_CONFIG_NAME, GET_CONFIG_TYPE, SELECT_CONFIG, GET_MANUAL_CONFIG, GET_CURRENT_VERSION, GET_REG_TEXT,
+    GET_BATCH_TEXT, STORAGE_FLUSH_INTERVAL, UPDATE_CONCURRENCY,
+    UPDATE_MODE, WEBHOOK_LISTEN, WEBHOOK_PORT, WEBHOOK_PATH, WEBHOOK_URL, WEBHOOK_SECRET,
+    METRICS_LISTEN, METRICS_PORT
 )
-from bot import handlers
+from bot import handlers, service_1c_async, delivery, storage_async, metrics, profiling
+from bot.parsing import set_parser
+from bot.update_processor import PerUserUpdateProcessor, instrument_handlers
 
 setup_logging()
 logger = logging.getLogger(__name__)
@@ -50,15 +58,31 @@ async def error_handler(update: object, context: ContextTypes.DEFAULT_TYPE) -> N
         except Exception:
             pass
 
+async def flush_storage(context: ContextTypes.DEFAULT_TYPE) -> None:
+    await storage_async.flush()
+
+async def post_shutdown(application: Application) -> None:
+    await delivery.shutdown()
+    await service_1c_async.close()
+    storage_async.shutdown()
+
 def main():
+    if UPDATE_MODE == 'webhook':
+        check_webhook_secret()
     USER_DATA_DIR.mkdir(exist_ok=True, parents=True)
+    logger.info(f'HTML-парсер: {set_parser(HTML_PARSER)}')
     
+    if METRICS_PORT:
+        metrics.start_http_server(METRICS_LISTEN, METRICS_PORT)
+        logger.info(f'Метрики: http://{METRICS_LISTEN}:{METRICS_PORT}/metrics')
+
     application = (
         Application.builder()
         .token(TELEGRAM_TOKEN)
-        .read_timeout(60)
-        .write_timeout(60)
-        .connect_timeout(60)
+        # Запросы к Bot API с замером времени; long polling (get_updates) не замеряем
+        .request(delivery.InstrumentedRequest(connection_pool_size=256, read_timeout=60, write_timeout=60, connect_timeout=60))
+        .concurrent_updates(PerUserUpdateProcessor(UPDATE_CONCURRENCY))
+        .post_shutdown(post_shutdown)
         .build()
     )
     job_queue = application.job_queue
@@ -85,6 +109,9 @@ def main():
     except Exception as e:
         logger.error(f"Ошибка таймера: {e}")
 
+    if STORAGE_FLUSH_INTERVAL:
+        job_queue.run_repeating(flush_storage, interval=STORAGE_FLUSH_INTERVAL, first=STORAGE_FLUSH_INTERVAL)
+
     # --- HANDLERS ---
     reg_handler = ConversationHandler(
         entry_points=[CallbackQueryHandler(handlers.reg_start, pattern='^reg_start$')],
@@ -92,6 +119,7 @@ def main():
             GET_REG_TEXT: [
                 MessageHandler(filters.TEXT & ~filters.COMMAND, handlers.process_registration_text),
                 CallbackQueryHandler(handlers.reg_start, pattern='^reg_start$'),
+                CallbackQueryHandler(handlers.accept_mapping_suggestion, pattern='^reg_accept_(one|all)$'),
                 CallbackQueryHandler(handlers.get_versions_callback, pattern='^get_versions$')
             ]
         },
@@ -124,16 +152,31 @@ def main():
         fallbacks=[CallbackQueryHandler(handlers.cancel_update_check, pattern='^cancel_update_check$')]
     )
 
+    batch_handler = ConversationHandler(
+        entry_points=[CallbackQueryHandler(handlers.batch_start, pattern='^batch_start$')],
+        states={
+            GET_BATCH_TEXT: [MessageHandler(filters.TEXT & ~filters.COMMAND, handlers.batch_calculate)]
+        },
+        fallbacks=[CallbackQueryHandler(handlers.cancel_update_check, pattern='^cancel_update_check$')]
+    )
+
+    # Раньше всех: любое действие пользователя может изменить меню в обход send_or_edit_message
+    application.add_handler(TypeHandler(Update, handlers.forget_menu_hash), group=-1)
+
     application.add_handler(CommandHandler('start', handlers.start))
     application.add_handler(CommandHandler('help', handlers.help_command))
+    application.add_handler(CommandHandler('stats', handlers.stats_command))
+    application.add_handler(CommandHandler('profile', partial(profiling.profile_command, daily_check=handlers.daily_version_check)))
     application.add_handler(add_handler)
     application.add_handler(update_handler)
+    application.add_handler(batch_handler)
     application.add_handler(reg_handler)
     
     application.add_handler(CallbackQueryHandler(handlers.get_versions_callback, pattern='^get_versions$'))
     application.add_handler(CallbackQueryHandler(handlers.main_menu_callback, pattern='^main_menu$'))
     application.add_handler(CallbackQueryHandler(handlers.acknowledge_all_callback, pattern='^ack_all$'))
     application.add_handler(CallbackQueryHandler(handlers.manage_list_menu_callback, pattern='^manage_list_menu$'))
+    application.add_handler(CallbackQueryHandler(handlers.toggle_digest_callback, pattern='^toggle_digest$'))
     application.add_handler(CallbackQueryHandler(handlers.remove_config_menu, pattern='^remove_config_menu$'))
     application.add_handler(CallbackQueryHandler(handlers.remove_config_callback, pattern='^remove_\\d+$'))
     
@@ -150,9 +193,37 @@ def main():
     application.add_handler(CallbackQueryHandler(handlers.noop_callback, pattern='^noop$'))
     
     application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handlers.delete_stray_text))
+    instrument_handlers(application)
+
+    if UPDATE_MODE == 'webhook':
+        run_webhook(application)
+    else:
+        logger.info('Бот запущен...')
+        application.run_polling(drop_pending_updates=True)
 
-    logger.info('Бот запущен...')
-    application.run_polling(drop_pending_updates=True)
+# Требования Telegram к secret_token: 1-256 символов A-Z, a-z, 0-9, _ и -
+WEBHOOK_SECRET_RE = re.compile(r'[A-Za-z0-9_-]{1,256}')
+
+def check_webhook_secret():
+    # Без секрета любой, кто достучится до порта, может прислать поддельное обновление
+    # от имени любого пользователя (в том числе администратора) - не запускаемся
+    if not WEBHOOK_SECRET_RE.fullmatch(WEBHOOK_SECRET or ''):
+        logger.critical('UPDATE_MODE "webhook" требует WEBHOOK_SECRET: 1-256 символов A-Z, a-z, 0-9, _ и -. '
+                        'Задайте его в settings.json.')
+        sys.exit(1)
+
+def run_webhook(application: Application):
+    # Без внешнего адреса PTB соберет его из WEBHOOK_LISTEN и порта - годится для локальной проверки
+    webhook_url = f"{WEBHOOK_URL.rstrip('/')}/{WEBHOOK_PATH}" if WEBHOOK_URL else None
+    logger.info(f'Бот запущен (webhook http://{WEBHOOK_LISTEN}:{WEBHOOK_PORT}/{WEBHOOK_PATH})...')
+    application.run_webhook(
+        listen=WEBHOOK_LISTEN,
+        port=WEBHOOK_PORT,
+        url_path=WEBHOOK_PATH,
+        webhook_url=webhook_url,
+        secret_token=WEBHOOK_SECRET,
+        drop_pending_updates=True
+    )
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
@@ -0,0 +1,232 @@
+"""
+Локальная замена порталов login.1c.ru и releases.1c.ru для отладки и нагрузочных
+проверок без сети.
+
+    python tools/fake_portal.py --port 8081 --configs 400 --versions 300 --latency 0.2 --error-rate 0.02
+
+Затем в settings.json:
+
+    "LOGIN_BASE_URL": "http://127.0.0.1:8081",
+    "RELEASES_BASE_URL": "http://127.0.0.1:8081"
+
+Что умеет сервер:
+  GET  /login               - форма входа со скрытым полем execution
+  POST /login               - проверка логина/пароля (--username/--password; без них пускает всех)
+                              и токена execution, выдает куку сессии
+  GET  /total               - таблица actualTable на --configs конфигураций (ETag, ответ 304)
+  GET  /project/Config<N>   - страница конфигурации: последние версии и ссылка "все обновления"
+  GET  /project/Config<N>?allUpdates=true - полная таблица versionsTable на --versions версий
+
+Без действующей куки страницы releases перенаправляют на /login, как настоящий
+портал; --session-ttl заставляет сессии истекать, чтобы проверить перелогин.
+--latency/--jitter задают задержку ответа, --error-rate - долю ответов 503.
+Страницы строятся генераторами benchmarks.pages, так что версии в /total и
+в истории конфигураций согласованы.
+"""
+import os
+import sys
+import time
+import random
+import signal
+import hashlib
+import secrets
+import argparse
+import threading
+from collections import Counter
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs, quote
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks import pages
+
+SESSION_COOKIE = 'FAKE1CSESSION'
+
+LOGIN_PAGE = '''<html><head><title>Вход</title></head><body>
+<form id="fm1" action="/login" method="post">
+<input id="username" name="username" type="text"/>
+<input id="password" name="password" type="password"/>
+<input type="hidden" name="execution" value="{execution}"/>
+<input type="hidden" name="_eventId" value="submit"/>
+<input type="submit" value="Войти"/>
+</form></body></html>'''
+
+LOGIN_FAILED_PAGE = '<html><body><div class="errors">Неверный логин или пароль</div></body></html>'
+LOGIN_OK_PAGE = '<html><body>Вход выполнен</body></html>'
+
+class Portal:
+    """Состояние сервера: страницы, токены входа, сессии и счетчики запросов."""
+
+    def __init__(self, args):
+        self.args = args
+        self.lock = threading.Lock()
+        self.executions = set()
+        self.sessions = {}
+        self.requests = Counter()
+        self.total = pages.total_page(args.configs, seed=args.seed, versions=args.versions).encode()
+        self.total_etag = '"' + hashlib.md5(self.total).hexdigest() + '"'
+        self._config_pages = {}
+
+    def new_execution(self) -> str:
+        token = secrets.token_hex(16)
+        with self.lock:
+            self.executions.add(token)
+        return token
+
+    def login(self, form: dict):
+        """Новый идентификатор сессии или None, если вход не удался."""
+        execution = form.get('execution', [''])[0]
+        with self.lock:
+            if execution not in self.executions:
+                return None
+            self.executions.discard(execution)
+        if self.args.username and form.get('username', [''])[0] != self.args.username:
+            return None
+        if self.args.password and form.get('password', [''])[0] != self.args.password:
+            return None
+        session_id = secrets.token_hex(16)
+        with self.lock:
+            self.sessions[session_id] = time.monotonic()
+        return session_id
+
+    def session_valid(self, session_id) -> bool:
+        with self.lock:
+            created = self.sessions.get(session_id)
+        if created is None:
+            return False
+        return not self.args.session_ttl or time.monotonic() - created < self.args.session_ttl
+
+    def config_page(self, index: int, all_updates: bool) -> bytes:
+        key = (index, all_updates)
+        page = self._config_pages.get(key)
+        if page is None:
+            if all_updates:
+                page = pages.versions_page(self.args.versions, seed=index).encode()
+            else:
+                page = pages.versions_page(self.args.versions, seed=index, all_updates_link=True, shown=40).encode()
+            with self.lock:
+                self._config_pages[key] = page
+        return page
+
+class Handler(BaseHTTPRequestHandler):
+    portal = None
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        if self.portal.args.verbose:
+            super().log_message(format, *args)
+
+    def _send(self, status: int, body: bytes = b'', headers=None):
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(body)))
+        if body:
+            self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.end_headers()
+        if body and self.command != 'HEAD':
+            self.wfile.write(body)
+
+    def _simulate_network(self) -> bool:
+        """Задержка и случайные ошибки. False - ответ уже отправлен (ошибка)."""
+        args = self.portal.args
+        delay = args.latency + random.uniform(0, args.jitter)
+        if delay > 0:
+            time.sleep(delay)
+        if args.error_rate and random.random() < args.error_rate:
+            self.portal.requests['error'] += 1
+            self._send(503, b'<html><body>Service Unavailable</body></html>')
+            return False
+        return True
+
+    def _session_id(self):
+        for part in self.headers.get('Cookie', '').split(';'):
+            name, _, value = part.strip().partition('=')
+            if name == SESSION_COOKIE:
+                return value
+        return None
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        self.portal.requests[url.path if not url.path.startswith('/project/') else '/project/*'] += 1
+        if not self._simulate_network():
+            return
+
+        if url.path == '/login':
+            body = LOGIN_PAGE.format(execution=self.portal.new_execution()).encode()
+            return self._send(200, body)
+
+        if not self.portal.session_valid(self._session_id()):
+            service = quote(f'http://{self.headers.get("Host", "")}{self.path}', safe='')
+            return self._send(302, headers={'Location': f'/login?service={service}'})
+
+        if url.path == '/total':
+            if self.headers.get('If-None-Match') == self.portal.total_etag:
+                return self._send(304, headers={'ETag': self.portal.total_etag})
+            return self._send(200, self.portal.total, {'ETag': self.portal.total_etag})
+
+        if url.path.startswith('/project/Config'):
+            try:
+                index = int(url.path[len('/project/Config'):])
+            except ValueError:
+                return self._send(404)
+            if not 0 <= index < self.portal.args.configs:
+                return self._send(404)
+            all_updates = parse_qs(url.query).get('allUpdates') == ['true']
+            return self._send(200, self.portal.config_page(index, all_updates))
+
+        self._send(404)
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        self.portal.requests['POST ' + url.path] += 1
+        if not self._simulate_network():
+            return
+        if url.path != '/login':
+            return self._send(404)
+        length = int(self.headers.get('Content-Length', 0))
+        form = parse_qs(self.rfile.read(length).decode('utf-8'))
+        session_id = self.portal.login(form)
+        if session_id is None:
+            return self._send(200, LOGIN_FAILED_PAGE.encode())
+        self._send(200, LOGIN_OK_PAGE.encode(), {'Set-Cookie': f'{SESSION_COOKIE}={session_id}; Path=/'})
+
+def make_server(args) -> ThreadingHTTPServer:
+    handler = type('PortalHandler', (Handler,), {'portal': Portal(args)})
+    server = ThreadingHTTPServer((args.host, args.port), handler)
+    server.daemon_threads = True
+    return server
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8081)
+    parser.add_argument('--configs', type=int, default=400, help='конфигураций в /total')
+    parser.add_argument('--versions', type=int, default=300, help='версий в истории каждой конфигурации')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--latency', type=float, default=0.0, help='задержка ответа, сек')
+    parser.add_argument('--jitter', type=float, default=0.0, help='случайная добавка к задержке, сек')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='доля ответов 503 (0..1)')
+    parser.add_argument('--session-ttl', type=float, default=0, help='время жизни сессии, сек (0 - бессрочно)')
+    parser.add_argument('--username', default='', help='ожидаемый логин (пусто - любой)')
+    parser.add_argument('--password', default='', help='ожидаемый пароль (пусто - любой)')
+    parser.add_argument('--verbose', action='store_true', help='логировать каждый запрос')
+    return parser.parse_args(argv)
+
+def main():
+    args = parse_args()
+    server = make_server(args)
+    print(f'Фейковый портал 1С: http://{args.host}:{args.port} '
+          f'({args.configs} конфигураций, {args.versions} версий, задержка {args.latency} с, ошибки {args.error_rate:.0%})')
+    # Остановка и по Ctrl+C, и по kill - со сводкой запросов
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    try:
+        server.serve_forever()
+    except (KeyboardInterrupt, SystemExit):
+        pass
+    finally:
+        server.server_close()
+        print('Запросов:', dict(server.RequestHandlerClass.portal.requests))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,40 @@
+"""
+Перенос данных пользователей между бэкендами хранения.
+
+    python tools/migrate_storage.py --to sqlite   # data/user_data/*.json -> data/bot.sqlite3
+    python tools/migrate_storage.py --to json     # обратно
+
+Перенос идемпотентный: повторный запуск перезаписывает документы целиком.
+После переноса выставьте STORAGE_BACKEND в settings.json и перезапустите бота.
+"""
+import os
+import sys
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bot.config import STORAGE_DB_FILE
+from bot.storage import DOCUMENTS, JsonBackend, SqliteBackend
+
+def migrate(source, target) -> int:
+    user_ids = source.user_ids()
+    for user_id in user_ids:
+        for doc in DOCUMENTS:
+            target.save(user_id, doc, source.load(user_id, doc))
+    return len(user_ids)
+
+def main():
+    parser = argparse.ArgumentParser(description='Перенос данных пользователей между JSON и SQLite')
+    parser.add_argument('--to', choices=['sqlite', 'json'], default='sqlite', help='куда переносить')
+    parser.add_argument('--db', default=str(STORAGE_DB_FILE), help='путь к базе SQLite')
+    args = parser.parse_args()
+
+    json_backend, sqlite_backend = JsonBackend(), SqliteBackend(args.db)
+    if args.to == 'sqlite':
+        count = migrate(json_backend, sqlite_backend)
+    else:
+        count = migrate(sqlite_backend, json_backend)
+    print(f'Перенесено пользователей: {count} ({args.to})')
+
+if __name__ == '__main__':
+    main()
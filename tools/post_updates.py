@@ -0,0 +1,98 @@
+"""
+Отправка записанных Update (JSON) на вебхук бота - для проверки режима webhook
+без Telegram.
+
+    python tools/post_updates.py tools/updates/*.json
+    python tools/post_updates.py tools/updates/main_menu.json --users 50 --repeat 10
+
+Адрес, путь и секрет по умолчанию берутся из settings.json. Файл может содержать
+один Update или список. С --users N каждое обновление отправляется от имени N
+разных пользователей (id, начиная с --first-user), update_id уникальны.
+"""
+import os
+import sys
+import copy
+import json
+import time
+import argparse
+import itertools
+from concurrent.futures import ThreadPoolExecutor
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bot.config import WEBHOOK_PORT, WEBHOOK_PATH, WEBHOOK_SECRET
+
+def load_updates(paths) -> list:
+    updates = []
+    for path in paths:
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        updates.extend(data if isinstance(data, list) else [data])
+    return updates
+
+def _set_user(obj, user_id: int):
+    """Подменяет id пользователя и приватного чата во всем Update."""
+    if isinstance(obj, dict):
+        for key, value in obj.items():
+            if key in ('from', 'chat') and isinstance(value, dict) and not value.get('is_bot'):
+                value['id'] = user_id
+            else:
+                _set_user(value, user_id)
+    elif isinstance(obj, list):
+        for item in obj:
+            _set_user(item, user_id)
+
+def expand(updates, users: int, first_user: int, repeat: int) -> list:
+    if users <= 0:
+        return [u for _ in range(repeat) for u in updates]
+    update_ids = itertools.count(int(time.time()))
+    result = []
+    for _ in range(repeat):
+        for update in updates:
+            for user_id in range(first_user, first_user + users):
+                item = copy.deepcopy(update)
+                _set_user(item, user_id)
+                item['update_id'] = next(update_ids)
+                result.append(item)
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description='POST записанных Update на вебхук бота')
+    parser.add_argument('files', nargs='+', help='JSON-файлы с Update')
+    parser.add_argument('--url', default=f'http://127.0.0.1:{WEBHOOK_PORT}/{WEBHOOK_PATH}')
+    parser.add_argument('--secret', default=WEBHOOK_SECRET, help='значение X-Telegram-Bot-Api-Secret-Token')
+    parser.add_argument('--users', type=int, default=0, help='отправить от имени N разных пользователей')
+    parser.add_argument('--first-user', type=int, default=100000)
+    parser.add_argument('--repeat', type=int, default=1)
+    parser.add_argument('--parallel', type=int, default=8, help='одновременных запросов')
+    args = parser.parse_args()
+
+    updates = expand(load_updates(args.files), args.users, args.first_user, args.repeat)
+    headers = {'X-Telegram-Bot-Api-Secret-Token': args.secret} if args.secret else {}
+    session = requests.Session()
+
+    def post(update):
+        started = time.perf_counter()
+        try:
+            status = session.post(args.url, json=update, headers=headers, timeout=30).status_code
+        except requests.RequestException as e:
+            status = type(e).__name__
+        return status, time.perf_counter() - started
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.parallel) as pool:
+        results = list(pool.map(post, updates))
+    total = time.perf_counter() - started
+
+    statuses = {}
+    for status, _ in results:
+        statuses[status] = statuses.get(status, 0) + 1
+    latencies = sorted(latency for _, latency in results)
+    print(f'Отправлено {len(results)} за {total:.2f} с ({len(results) / total:.0f} в секунду), ответы: {statuses}')
+    if latencies:
+        print(f'Время ответа: p50 {latencies[len(latencies) // 2] * 1000:.1f} мс, '
+              f'p95 {latencies[int(len(latencies) * 0.95)] * 1000:.1f} мс')
+
+if __name__ == '__main__':
+    main()